@@ -328,7 +328,7 @@ export const onRenderLog = (listener: (line: string) => void): (() => void) => {
   return getBridge().onRenderLog(listener);
 };
 
-export const onRenderProgress = (listener: (data: { outTimeMs?: number; totalMs?: number }) => void): (() => void) => {
+export const onRenderProgress = (listener: (data: { outTimeMs?: number; totalMs?: number; fraction?: number; stage?: string; etaSeconds?: number | null }) => void): (() => void) => {
   return getBridge().onRenderProgress(listener);
 };
 
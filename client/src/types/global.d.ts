@@ -36,7 +36,7 @@ export interface ElectronAPI {
   onMenuAction(listener: (action: string) => void): () => void;
   setLayerMoveEnabled(payload: { up: boolean; down: boolean }): void;
   onRenderLog(listener: (line: string) => void): () => void;
-  onRenderProgress(listener: (data: { outTimeMs?: number; totalMs?: number }) => void): () => void;
+  onRenderProgress(listener: (data: { outTimeMs?: number; totalMs?: number; fraction?: number; stage?: string; etaSeconds?: number | null }) => void): () => void;
   onRenderDone(listener: () => void): () => void;
   onRenderError(listener: (message: string) => void): () => void;
   onRenderCancelled(listener: () => void): () => void;
@@ -358,6 +358,7 @@ ipcMain.handle('render:start', async (_event, projectJsonPath: string): Promise<
   const cmd = isPy ? pythonOverride : rendererPath;
   const args = isPy ? [rendererPath, projectJsonPath] : [projectJsonPath];
   const childEnv: NodeJS.ProcessEnv = { ...process.env };
+  if (!childEnv.vizmatic_PROBE_CACHE) childEnv.vizmatic_PROBE_CACHE = probeCacheDir();
   // Prefer redist folder inside Electron resources for ffmpeg/ffprobe
   const redistDir = path.join(process.resourcesPath, 'redist');
   const ffName = process.platform === 'win32' ? 'ffmpeg.exe' : 'ffmpeg';
@@ -435,16 +436,25 @@ ipcMain.handle('render:start', async (_event, projectJsonPath: string): Promise<
         } else {
           console.log(`[renderer] ${msg}`);
         }
+        // Structured events from the renderer: stage/progress/ffmpeg/summary JSON.
+        if (msg.startsWith('[event] ')) {
+          try {
+            const ev = JSON.parse(msg.slice('[event] '.length));
+            if (typeof ev.fraction === 'number' && Number.isFinite(ev.fraction)) {
+              // Global fraction covers every stage, so the bar no longer restarts per ffmpeg run.
+              mainWindow?.webContents.send('render:progress', {
+                outTimeMs: Math.round(ev.fraction * totalMs),
+                totalMs,
+                fraction: ev.fraction,
+                stage: ev.stage,
+                etaSeconds: ev.etaSeconds ?? null,
+              });
+            }
+          } catch {}
+          continue;
+        }
         // Emit log event to renderer
         mainWindow?.webContents.send('render:log', msg);
-        // Very basic progress parsing
-        const mOut = msg.match(/^out_time_ms=(\d+)/);
-        if (mOut) {
-          const ms = Number(mOut[1]);
-          if (Number.isFinite(ms)) {
-            mainWindow?.webContents.send('render:progress', { outTimeMs: ms, totalMs });
-          }
-        }
         const mTot = msg.match(/^total_duration_ms=(\d+)/);
         if (mTot) {
           const t = Number(mTot[1]);
@@ -1132,6 +1142,59 @@ ipcMain.handle('render:prepareProject', async (_event, projectJsonPath: string,
 });
 
 const mediaLibraryPath = () => path.join(app.getPath('userData'), 'library.json');
+// Shared with the Python renderer (vizmatic_PROBE_CACHE); keep the entry format in sync with summarize_probe().
+const probeCacheDir = () => path.join(app.getPath('userData'), 'probe-cache');
+const PROBE_CACHE_VERSION = 1;
+
+const probeCacheKey = async (filePath: string): Promise<{ key: string; resolved: string; size: number; mtimeNs: string }> => {
+  const resolved = path.resolve(filePath);
+  const st = await fs.stat(resolved, { bigint: true });
+  const keyPath = process.platform === 'win32' ? resolved.toLowerCase() : resolved;
+  const key = crypto.createHash('sha256').update(`${keyPath}|${st.size}|${st.mtimeNs}`).digest('hex');
+  return { key, resolved: keyPath, size: Number(st.size), mtimeNs: String(st.mtimeNs) };
+};
+
+const parseRate = (value: unknown): number | undefined => {
+  const [num, den] = String(value ?? '').split('/');
+  const rate = Number(num) / Number(den || 1);
+  return Number.isFinite(rate) && rate > 0 ? rate : undefined;
+};
+
+const summarizeProbe = (data: any): Record<string, unknown> => {
+  const fmt = data?.format ?? {};
+  const streams = Array.isArray(data?.streams) ? data.streams : [];
+  const v = streams.find((s: any) => s.codec_type === 'video');
+  const a = streams.find((s: any) => s.codec_type === 'audio');
+  const durationSource = [fmt, v ?? {}, a ?? {}].find((s: any) => s?.duration !== undefined && Number.isFinite(Number(s.duration)));
+  const info: Record<string, unknown> = { duration: durationSource ? Number(durationSource.duration) : null };
+  if (v) {
+    Object.assign(info, {
+      width: v.width,
+      height: v.height,
+      fps: parseRate(v.avg_frame_rate) ?? parseRate(v.r_frame_rate),
+      videoCodec: v.codec_name,
+      pixFmt: v.pix_fmt,
+      profile: v.profile,
+      timeBase: v.time_base,
+    });
+    const packets = Array.isArray(data?.packets) ? data.packets : [];
+    const keyframes = packets
+      .filter((p: any) => p.stream_index === v.index && String(p.flags ?? '').includes('K'))
+      .map((p: any) => Number(p.pts_time))
+      .filter((t: number) => Number.isFinite(t));
+    if (keyframes.length >= 2) {
+      info.keyframeInterval = (keyframes[keyframes.length - 1] - keyframes[0]) / (keyframes.length - 1);
+    }
+  }
+  if (a) {
+    Object.assign(info, {
+      audioCodec: a.codec_name,
+      audioChannels: a.channels,
+      sampleRate: /^\d+$/.test(String(a.sample_rate ?? '')) ? Number(a.sample_rate) : null,
+    });
+  }
+  return info;
+};
 
 ipcMain.handle('mediaLibrary:load', async (): Promise<MediaLibraryItem[]> => {
   try {
@@ -1178,7 +1241,10 @@ ipcMain.handle('mediaLibrary:probe', async (_event, filePath: string): Promise<P
   })();
 
   const runProbe = () => new Promise<any>((resolve, reject) => {
-    const args = ['-v', 'quiet', '-print_format', 'json', '-show_streams', '-show_format', filePath];
+    const args = [
+      '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams',
+      '-show_entries', 'packet=stream_index,pts_time,flags', '-read_intervals', '%+10', filePath,
+    ];
     const proc = spawn(ffprobePath, args, { stdio: ['ignore', 'pipe', 'pipe'] });
     let out = '';
     proc.stdout.on('data', (d) => { out += String(d); });
@@ -1193,19 +1259,35 @@ ipcMain.handle('mediaLibrary:probe', async (_event, filePath: string): Promise<P
     proc.on('error', reject);
   });
 
+  const loadOrProbe = async (): Promise<any> => {
+    let cachePath: string | undefined;
+    let ident: Awaited<ReturnType<typeof probeCacheKey>> | undefined;
+    try {
+      ident = await probeCacheKey(filePath);
+      cachePath = path.join(probeCacheDir(), `${ident.key}.json`);
+      const cached = JSON.parse(await fs.readFile(cachePath, 'utf-8'));
+      if (cached?.version === PROBE_CACHE_VERSION) return cached;
+    } catch {}
+    const info = summarizeProbe(await runProbe());
+    if (cachePath && ident) {
+      Object.assign(info, { version: PROBE_CACHE_VERSION, path: ident.resolved, size: ident.size, mtimeNs: Number(ident.mtimeNs) });
+      try {
+        await fs.mkdir(probeCacheDir(), { recursive: true });
+        await writeJsonAtomic(cachePath, info);
+      } catch {}
+    }
+    return info;
+  };
+
   try {
-    const data = await runProbe();
-    const fmt = data?.format ?? {};
-    const streams = Array.isArray(data?.streams) ? data.streams : [];
-    const v = streams.find((s: any) => s.codec_type === 'video');
-    const a = streams.find((s: any) => s.codec_type === 'audio');
+    const info = await loadOrProbe();
     return {
-      duration: fmt?.duration ? Number(fmt.duration) : undefined,
-      videoCodec: v?.codec_name,
-      audioCodec: a?.codec_name,
-      audioChannels: a?.channels ? Number(a.channels) : undefined,
-      width: v?.width ? Number(v.width) : undefined,
-      height: v?.height ? Number(v.height) : undefined,
+      duration: info?.duration != null ? Number(info.duration) : undefined,
+      videoCodec: info?.videoCodec ?? undefined,
+      audioCodec: info?.audioCodec ?? undefined,
+      audioChannels: info?.audioChannels ? Number(info.audioChannels) : undefined,
+      width: info?.width ? Number(info.width) : undefined,
+      height: info?.height ? Number(info.height) : undefined,
     };
   } catch {
     return {};
@@ -45,7 +45,7 @@ export interface ElectronBridge {
   onMediaLibraryAddPath: (listener: (path: string) => void) => () => void;
   setLayerMoveEnabled: (payload: { up: boolean; down: boolean }) => void;
   onRenderLog: (listener: (line: string) => void) => () => void;
-  onRenderProgress: (listener: (data: { outTimeMs?: number; totalMs?: number }) => void) => () => void;
+  onRenderProgress: (listener: (data: { outTimeMs?: number; totalMs?: number; fraction?: number; stage?: string; etaSeconds?: number | null }) => void) => () => void;
   onRenderDone: (listener: () => void) => () => void;
   onRenderError: (listener: (message: string) => void) => () => void;
   onRenderCancelled: (listener: () => void) => () => void;
@@ -116,7 +116,7 @@ const bridge: ElectronBridge = {
   },
   onRenderProgress: (listener) => {
     const channel = 'render:progress';
-    const handler = (_e: Electron.IpcRendererEvent, data: { outTimeMs?: number; totalMs?: number }) => listener(data);
+    const handler = (_e: Electron.IpcRendererEvent, data: { outTimeMs?: number; totalMs?: number; fraction?: number; stage?: string; etaSeconds?: number | null }) => listener(data);
     ipcRenderer.on(channel, handler);
     return () => ipcRenderer.removeListener(channel, handler);
   },
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+vizmatic renderer benchmarks
+
+Generates synthetic projects and media (lavfi test sources, tone audio), renders
+each scenario through main.py with a cold cache and records wall time, per-stage
+wall/CPU time from the renderer's [event] lines, peak RSS and output fps.
+
+Results are written as JSON; pass --baseline to compare against a stored run
+and exit non-zero when a scenario is slower than the allowed threshold.
+
+Usage:
+  python renderer/python/bench.py [--out bench.json] [--baseline base.json]
+                                  [--scenario NAME ...] [--duration SECONDS]
+                                  [--threshold 0.15] [--work DIR] [--keep]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MAIN = os.path.join(HERE, "main.py")
+RESULTS_VERSION = 1
+CANVAS = {"width": 1280, "height": 720, "fps": 30}
+
+
+def eprint(*args: Any) -> None:
+    print(*args, file=sys.stderr)
+
+
+def ffmpeg_exe() -> str:
+    return os.environ.get("vizmatic_FFMPEG") or "ffmpeg"
+
+
+def run_quiet(args: List[str]) -> None:
+    subprocess.run([ffmpeg_exe(), "-hide_banner", "-v", "error", "-y"] + args, check=True)
+
+
+def ffmpeg_has_filter(name: str) -> bool:
+    try:
+        out = subprocess.run([ffmpeg_exe(), "-hide_banner", "-filters"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout
+    except OSError:
+        return False
+    return any(line.split()[1:2] == [name] for line in out.splitlines() if line.strip())
+
+
+def ffmpeg_version() -> str:
+    try:
+        out = subprocess.run([ffmpeg_exe(), "-hide_banner", "-version"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout
+    except OSError:
+        return "unknown"
+    return (out.splitlines() or ["unknown"])[0]
+
+
+def make_media(media_dir: str, duration: float) -> Dict[str, str]:
+    """Create (once) the synthetic sources every scenario draws from."""
+    os.makedirs(media_dir, exist_ok=True)
+    specs: Dict[str, Tuple[List[str], str]] = {
+        "clip_a": (["-f", "lavfi", "-i", "testsrc2=size=1280x720:rate=30:duration=6"], "mp4"),
+        "clip_b": (["-f", "lavfi", "-i", "testsrc=size=1920x1080:rate=25:duration=4"], "mp4"),
+        "clip_c": (["-f", "lavfi", "-i", "mandelbrot=size=640x480:rate=30", "-t", "5"], "mp4"),
+        "clip_d": (["-f", "lavfi", "-i", "smptehdbars=size=960x540:rate=24:duration=3"], "mp4"),
+        # Two tones with a sweeping third so every band sees energy changes.
+        "audio": ([
+            "-f",
+            "lavfi",
+            "-i",
+            f"aevalsrc=0.4*sin(220*2*PI*t)+0.3*sin(1760*2*PI*t)*mod(t\\,1)+0.2*sin((200+400*t)*2*PI*t):s=48000:d={duration + 1:g}",
+        ], "wav"),
+        "image": (["-f", "lavfi", "-i", "testsrc2=size=320x180:rate=1", "-frames:v", "1"], "png"),
+    }
+    paths: Dict[str, str] = {}
+    for name, (args, ext) in specs.items():
+        path = os.path.join(media_dir, f"{name}_{duration:g}.{ext}" if name == "audio" else f"{name}.{ext}")
+        if not os.path.isfile(path):
+            codec = ["-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p"] if ext == "mp4" else []
+            run_quiet(args + codec + [path])
+        paths[name] = path
+    return paths
+
+
+def project(media: Dict[str, str], clips: List[Dict[str, Any]], layers: List[Dict[str, Any]], render: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        "version": "1.0",
+        "audio": {"path": media["audio"]},
+        "clips": [dict(c, index=i) for i, c in enumerate(clips)],
+        "layers": layers,
+        "metadata": {"canvas": dict(CANVAS), "render": dict(render or {})},
+    }
+
+
+def tiled_clips(media: Dict[str, str], duration: float, length: float, gap: float = 0.0, fills: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Clips of `length` seconds (plus optional gaps) covering duration."""
+    sources = ["clip_a", "clip_b", "clip_c", "clip_d"]
+    fills = fills or ["loop"]
+    clips: List[Dict[str, Any]] = []
+    t = 0.0
+    n = 0
+    while t < duration - 0.01:
+        seg = min(length, duration - t)
+        fill = fills[n % len(fills)]
+        clips.append({
+            "path": media[sources[n % len(sources)]],
+            "start": round(t, 3),
+            "trimStart": 0.5,
+            # Trim shorter than the slot so loop/pingpong/stretch actually fill.
+            "trimEnd": round(0.5 + max(0.5, seg * 0.6), 3),
+            "duration": round(seg, 3),
+            "fillMethod": fill,
+            "hue": 15 * n if n % 3 == 0 else None,
+            "flipH": n % 4 == 1,
+        })
+        t += seg + gap
+        n += 1
+    return clips
+
+
+def spectrograph(lid: str, path_mode: str, mode: str, x: float, y: float, size: Tuple[int, int], **extra: Any) -> Dict[str, Any]:
+    layer = {
+        "id": lid,
+        "type": "spectrograph",
+        "mode": mode,
+        "pathMode": path_mode,
+        "x": x,
+        "y": y,
+        "width": size[0],
+        "height": size[1],
+        "color": "#39c0ff",
+        "opacity": 0.9,
+    }
+    layer.update(extra)
+    return layer
+
+
+def heavy_layers(media: Dict[str, str], with_text: bool) -> List[Dict[str, Any]]:
+    layers: List[Dict[str, Any]] = [
+        {"id": "bg-particles", "type": "particles", "particleCount": 4000, "x": 0, "y": 0, "width": 1280, "height": 720, "speed": 90, "direction": -90, "color": "#ffcc00", "sizeMin": 2, "sizeMax": 5},
+        spectrograph("bars", "straight", "bar", 0.05, 0.6, (1150, 240), glowAmount=12, outlineWidth=2, shadowDistance=6),
+        spectrograph("line", "straight", "line", 0.05, 0.1, (1150, 200), reverse=True, mirror=True),
+        spectrograph("dots", "straight", "dots", 0.3, 0.35, (500, 160), rotate=15),
+        spectrograph("ring", "circular", "bar", 0.7, 0.05, (320, 320), opacity=0.8),
+        {"id": "logo", "type": "image", "imagePath": media["image"], "x": 0.02, "y": 0.02, "width": 320, "height": 180, "opacity": 0.7},
+    ]
+    if with_text:
+        layers.append({"id": "title", "type": "text", "text": "vizmatic bench", "x": 0.4, "y": 0.9, "fontSize": 48, "color": "#ffffff", "outlineWidth": 2, "shadowDistance": 3})
+    return layers
+
+
+def build_scenarios(media: Dict[str, str], duration: float, with_text: bool) -> Dict[str, Dict[str, Any]]:
+    many = tiled_clips(media, duration, 0.8, gap=0.2)
+    fills = tiled_clips(media, duration, 4.0, fills=["loop", "pingpong", "stretch"])
+    plain = tiled_clips(media, duration, 5.0)
+    circular = [
+        spectrograph(f"ring{n}", "circular", mode, 0.05 + 0.32 * n, 0.25, (380, 380), color=color)
+        for n, (mode, color) in enumerate([("bar", "#ff3366"), ("line", "#33ff99"), ("dots", "#ffee33")])
+    ]
+    heavy = heavy_layers(media, with_text)
+    return {
+        "many-clips": project(media, many, []),
+        "fills": project(media, fills, []),
+        "layer-stack": project(media, plain, heavy),
+        "layer-stack-filters": project(media, plain, heavy, {"rasterLayers": False}),
+        "circular": project(media, plain, circular),
+        "circular-filters": project(media, plain, circular, {"rasterLayers": False}),
+        "single-pass": project(media, fills, heavy, {"singlePass": True}),
+        "draft": project(media, fills, heavy, {"draft": True}),
+    }
+
+
+def render_once(project_path: str, cache_dir: str, extra_env: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Run main.py on project_path and summarize its events and resource use."""
+    env = dict(os.environ, vizmatic_CACHE_DIR=cache_dir)
+    env.pop("vizmatic_PROBE_CACHE", None)
+    env.update(extra_env or {})
+    stages: Dict[str, Dict[str, float]] = {}
+    ffmpeg_runs = 0
+    summary: Dict[str, Any] = {}
+    total_ms = 0
+    tail: List[str] = []
+    started = time.monotonic()
+    proc = subprocess.Popen([sys.executable, MAIN, project_path], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, env=env)
+    assert proc.stdout is not None
+    for line in proc.stdout:
+        line = line.rstrip()
+        tail = (tail + [line])[-20:]
+        if line.startswith("total_duration_ms="):
+            total_ms = int(line.split("=", 1)[1] or 0)
+        if not line.startswith("[event] "):
+            continue
+        try:
+            ev = json.loads(line[len("[event] "):])
+        except ValueError:
+            continue
+        if ev.get("type") == "stage" and ev.get("state") == "end":
+            stages[ev["stage"]] = {"wallSeconds": ev.get("wallSeconds"), "cpuSeconds": ev.get("cpuSeconds")}
+        elif ev.get("type") == "ffmpeg":
+            ffmpeg_runs += 1
+        elif ev.get("type") == "summary":
+            summary = ev
+    peak_rss_mb: Optional[float] = None
+    if hasattr(os, "wait4"):
+        # Covers main.py and the ffmpeg children it waited for.
+        _pid, status, usage = os.wait4(proc.pid, 0)
+        code = os.waitstatus_to_exitcode(status)
+        # ru_maxrss is KiB on Linux, bytes on macOS.
+        peak_rss_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    else:
+        code = proc.wait()
+    wall = time.monotonic() - started
+    result: Dict[str, Any] = {
+        "code": code,
+        "wallSeconds": round(wall, 3),
+        "cpuSeconds": summary.get("cpuSeconds"),
+        "stages": stages,
+        "ffmpegRuns": ffmpeg_runs,
+        "peakRssMb": round(peak_rss_mb, 1) if peak_rss_mb is not None else None,
+        "outputSeconds": total_ms / 1000.0,
+        "outputFps": round(total_ms / 1000.0 * CANVAS["fps"] / wall, 2) if wall > 0 else None,
+    }
+    if code != 0:
+        result["log"] = tail
+    return result
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Scenarios whose wall time grew by more than threshold over the baseline."""
+    regressions: List[str] = []
+    print(f"{'scenario':<22}{'base s':>9}{'now s':>9}{'ratio':>8}")
+    for name, now in results["scenarios"].items():
+        base = (baseline.get("scenarios") or {}).get(name)
+        if not base or base.get("code") != 0 or now.get("code") != 0:
+            print(f"{name:<22}{'-':>9}{now.get('wallSeconds', 0):>9.2f}{'-':>8}")
+            continue
+        ratio = now["wallSeconds"] / max(1e-6, base["wallSeconds"])
+        flag = "  REGRESSION" if ratio > 1 + threshold else ""
+        print(f"{name:<22}{base['wallSeconds']:>9.2f}{now['wallSeconds']:>9.2f}{ratio:>8.2f}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog="vizmatic-bench", description="Benchmark the vizmatic renderer on synthetic projects.")
+    parser.add_argument("--out", default="bench_results.json", help="results JSON path")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--scenario", action="append", help="run only these scenarios (repeatable)")
+    parser.add_argument("--duration", type=float, default=20.0, help="timeline seconds per scenario")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed wall-time growth before flagging")
+    parser.add_argument("--work", help="directory for media, projects and caches (default: a temp dir)")
+    parser.add_argument("--keep", action="store_true", help="keep the work directory")
+    parser.add_argument("--warm", action="store_true", help="also time a second, warm-cache render")
+    cli = parser.parse_args(argv[1:])
+
+    if not shutil.which(ffmpeg_exe()):
+        eprint("[bench] ffmpeg not found; set vizmatic_FFMPEG.")
+        return 2
+    work = os.path.abspath(cli.work or tempfile.mkdtemp(prefix="vizmatic-bench-"))
+    os.makedirs(work, exist_ok=True)
+    with_text = ffmpeg_has_filter("drawtext")
+    if not with_text:
+        print("[bench] ffmpeg lacks drawtext; text layers are left out")
+    try:
+        media = make_media(os.path.join(work, "media"), cli.duration)
+        scenarios = build_scenarios(media, cli.duration, with_text)
+        names = cli.scenario or list(scenarios)
+        unknown = [n for n in names if n not in scenarios]
+        if unknown:
+            eprint(f"[bench] Unknown scenario(s): {', '.join(unknown)}; choose from {', '.join(scenarios)}")
+            return 2
+        results: Dict[str, Any] = {
+            "version": RESULTS_VERSION,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count(), "ffmpeg": ffmpeg_version()},
+            "duration": cli.duration,
+            "textLayers": with_text,
+            "scenarios": {},
+        }
+        for name in names:
+            proj = scenarios[name]
+            proj_dir = os.path.join(work, name)
+            os.makedirs(proj_dir, exist_ok=True)
+            proj["output"] = {"path": os.path.join(proj_dir, "out.mp4")}
+            proj_path = os.path.join(proj_dir, "project.json")
+            with open(proj_path, "w", encoding="utf-8") as f:
+                json.dump(proj, f, indent=2)
+            cache_dir = os.path.join(proj_dir, "cache")
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            print(f"[bench] {name}: rendering")
+            result = render_once(proj_path, cache_dir)
+            if cli.warm and result["code"] == 0:
+                result["warm"] = render_once(proj_path, cache_dir)
+            results["scenarios"][name] = result
+            status = "ok" if result["code"] == 0 else f"failed ({result['code']})"
+            print(f"[bench] {name}: {status} in {result['wallSeconds']:.2f}s, {result['outputFps']} fps, peak RSS {result['peakRssMb']} MB")
+        with open(cli.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"[bench] Results written to {cli.out}")
+        if cli.baseline:
+            with open(cli.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+            regressions = compare(results, baseline, cli.threshold)
+            if regressions:
+                eprint(f"[bench] Regressions: {', '.join(regressions)}")
+                return 1
+        return 0 if all(r["code"] == 0 for r in results["scenarios"].values()) else 1
+    finally:
+        if not cli.keep and not cli.work:
+            shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -9,6 +9,10 @@ function Info($m){ Write-Host "[render-build] $m" -ForegroundColor Cyan }
 if (-not (Get-Command pyinstaller -ErrorAction SilentlyContinue)) {
   Write-Warning "pyinstaller not found on PATH. Install with: pip install pyinstaller"
 }
+python -c "import numpy" 2>$null
+if ($LASTEXITCODE -ne 0) {
+  Write-Warning "numpy not found; the build would fall back to ffmpeg-only analysis. Install with: pip install -r requirements.txt"
+}
 
 $root = Split-Path -Parent $MyInvocation.MyCommand.Path
 $entry = Join-Path $root 'main.py'
@@ -17,7 +21,7 @@ $distDir = Join-Path $root 'dist'
 Info "Entry: $entry"
 Info "Output: $distDir"
 
-$args = @('--noconfirm', '--name', $Name, '--distpath', $distDir, '--workpath', (Join-Path $root 'build'), '--specpath', $root)
+$args = @('--noconfirm', '--name', $Name, '--distpath', $distDir, '--workpath', (Join-Path $root 'build'), '--specpath', $root, '--hidden-import', 'numpy')
 if ($OneFile) { $args += '--onefile' }
 
 # Optionally bundle ffmpeg/ffprobe if env vars point to local binaries
@@ -9,6 +9,9 @@ info() { printf "[render-build] %s\n" "$1"; }
 if ! command -v pyinstaller >/dev/null 2>&1; then
   echo "pyinstaller not found. Install with: pip install pyinstaller" >&2
 fi
+if ! python -c "import numpy" >/dev/null 2>&1; then
+  echo "numpy not found; the build would fall back to ffmpeg-only analysis. Install with: pip install -r requirements.txt" >&2
+fi
 
 ROOT_DIR=$(cd "$(dirname "$0")" && pwd)
 ENTRY="$ROOT_DIR/main.py"
@@ -17,7 +20,7 @@ DIST_DIR="$ROOT_DIR/dist"
 info "Entry: $ENTRY"
 info "Output: $DIST_DIR"
 
-ARGS=(--noconfirm --name "$NAME" --distpath "$DIST_DIR" --workpath "$ROOT_DIR/build" --specpath "$ROOT_DIR")
+ARGS=(--noconfirm --name "$NAME" --distpath "$DIST_DIR" --workpath "$ROOT_DIR/build" --specpath "$ROOT_DIR" --hidden-import numpy)
 if [[ "$ONEFILE" == "1" ]]; then ARGS+=(--onefile); fi
 [[ -n "${FFMPEG_BIN:-}" ]] && ARGS+=(--add-binary "$FFMPEG_BIN:.")
 [[ -n "${FFPROBE_BIN:-}" ]] && ARGS+=(--add-binary "$FFPROBE_BIN:.")
@@ -7,24 +7,178 @@ MVP pipeline:
   1) Concatenate the listed video clips to a temporary H.264/YUV420p MP4 (video only)
   2) If an audio file is provided, mux it with the concatenated video (shortest wins)
 
+Spectrograph layers are analysed and rasterized with NumPy when it is installed
+and streamed to the mux as a rawvideo overlay; otherwise ffmpeg filters draw them.
+
+Progress is reported as `[event] {json}` lines: stage start/end (with wall and
+CPU seconds), progress (global fraction, fps, speed, ETA), one ffmpeg line per
+invocation and a final summary. total_duration_ms is the output length.
+
 Environment overrides:
-  vizmatic_FFMPEG  -> absolute path to ffmpeg binary (default: ffmpeg on PATH)
+  vizmatic_FFMPEG        -> absolute path to ffmpeg binary (default: ffmpeg on PATH)
+  vizmatic_CACHE_DIR     -> persistent cache root (default: <project>/.vizmatic/cache)
+  vizmatic_WORK_DIR      -> scratch dir for intermediate files (default: <project>/.vizmatic/vizmatic;
+                            batch gives each render its own)
+  vizmatic_CACHE_MAX_MB  -> size bound for the rendered segment cache (default: 10240)
+  vizmatic_JOBS          -> concurrent ffmpeg segment workers (default: cpu_count // 4)
+  vizmatic_CPUS          -> CPU budget for workers and encoder threads (default: cpu_count;
+                            batch sets each render's share)
+  vizmatic_PROBE_CACHE   -> ffprobe summary cache shared with the media library
+                            (default: <cache root>/probe)
+  vizmatic_PINGPONG_MEM_MB -> frame memory a pingpong reversal or loop may buffer (default: 512)
+  vizmatic_STREAM_BUFFER_MB -> raw frames streamed clips may decode ahead (default: 256)
+
+Draft renders (--draft or metadata.render.draft) scale the canvas by draftScale
+(default 0.5), cap the frame rate at draftFps (default 15), encode ultrafast and
+read low-res proxies of each source cached under <cache root>/proxies.
+
+Renders are resumable: finished segments, the joined timeline and composite
+chunks are journaled per output under <cache root>/manifests, so a rerun after a
+cancel or crash validates and reuses them; metadata.render.resume=false turns
+this off. With metadata.render.resumeChunks, layered renders longer than
+1.5 x resumeChunkSeconds (default 60) also composite in cached chunks, so the
+composite itself resumes mid-way; as in incremental renders, animated image
+layers then restart at each chunk boundary.
+
+Streamed renders (--stream or metadata.render.stream) skip the segment and
+concat files: clips decode in timeline order straight into the composite as
+raw frames over loopback sockets, buffering at most streamBufferMB ahead.
 
 Usage:
-  python renderer/python/main.py <path/to/project.json>
+  python renderer/python/main.py <path/to/project.json> [--jobs N] [--chunks N] [--draft] [--incremental] [--stream]
+  python renderer/python/main.py analyze <path/to/project.json>
+  python renderer/python/main.py serve      (JSON-lines jobs on stdin, events on stdout)
+  python renderer/python/main.py batch <project.json|dir>... [--parallel N] [--mem-mb MB] [--report PATH]
+  python renderer/python/main.py peaks <audio>... [--cache-dir DIR] [--samples-per-peak N]
+  python renderer/python/main.py thumbs <video>... [--cache-dir DIR] [--count N] [--height PX]
 """
 
 from __future__ import annotations
 
+import argparse
+import array
+import hashlib
 import json
+import math
 import os
+import queue
+import shutil
+import socket
+import struct
 import subprocess
 import sys
-from typing import Any, Dict, List, Optional, Tuple
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # analysis and rasterized layers fall back to ffmpeg filters
+    np = None  # type: ignore[assignment]
+
+
+# Bump when segment rendering changes in a way that invalidates cached output.
+SEGMENT_CACHE_VERSION = 3
+DEFAULT_CACHE_MAX_MB = 10240
+PROBE_CACHE_VERSION = 1
+DEFAULT_FPS = 30.0
+# Shared MP4 timescale so normalized segments can be joined with -c copy.
+SEGMENT_TIMESCALE = 90000
+# Length of the canonical all-keyframe black segment that gaps are cut from.
+BLACK_SEGMENT_SECONDS = 2.0
+DEFAULT_PINGPONG_MEM_MB = 512
+ANALYSIS_CACHE_VERSION = 1
+# Spectrum analysis mirrors the preview's WebAudio AnalyserNode defaults.
+ANALYSIS_SAMPLE_RATE = 48000
+FFT_SIZES = (256, 512, 1024, 2048, 4096, 8192)
+DEFAULT_FFT_SIZE = 2048
+DEFAULT_SMOOTHING = 0.78
+DEFAULT_BAND_COUNT = 96
+# Analysis arrays kept mapped between renders of a long-lived (serve) process.
+ANALYSIS_MEMO_MAX = 16
+PROXY_CACHE_VERSION = 1
+CHUNK_CACHE_VERSION = 1
+RESUME_JOURNAL_VERSION = 1
+# Long layered renders composite in cached chunks of this length so a rerun resumes.
+DEFAULT_RESUME_CHUNK_SECONDS = 60.0
+STATIC_CACHE_VERSION = 1
+# Waveform peaks: int8 min/max pairs, each pyramid level PEAKS_LEVEL_FACTOR times coarser.
+PEAKS_VERSION = 1
+DEFAULT_PEAKS_SAMPLES = 1024
+PEAKS_LEVEL_FACTOR = 4
+PEAKS_MIN_COUNT = 256
+THUMBS_VERSION = 1
+DEFAULT_THUMB_COUNT = 10
+DEFAULT_THUMB_HEIGHT = 90
+TEXT_CACHE_VERSION = 1
+FONT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "client", "public", "fonts"))
+FONT_EXTS = (".ttf", ".otf", ".ttc")
+# Image layers with these extensions are one frame; others (gif, video) may animate.
+STILL_IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".webp", ".tif", ".tiff")
+# Incremental renders cut the composite on a fixed grid so unchanged spans keep their keys.
+DEFAULT_INCREMENTAL_CHUNK_SECONDS = 10.0
+# Streamed renders hand raw canvas frames between stages; producers may buffer this much ahead.
+DEFAULT_STREAM_BUFFER_MB = 256
+# Draft renders scale the canvas, cap the frame rate and encode from proxies.
+DEFAULT_DRAFT_SCALE = 0.5
+DEFAULT_DRAFT_FPS = 15.0
+# Layer keys measured in canvas pixels, rescaled with a draft canvas.
+LAYER_PIXEL_KEYS = (
+    "width",
+    "height",
+    "fontSize",
+    "outlineWidth",
+    "glowAmount",
+    "glowBlur",
+    "shadowDistance",
+    "shadowBlur",
+    "sizeMin",
+    "sizeMax",
+    "speed",
+)
+
+# Concat list entry: (path, outpoint seconds or None for the whole file).
+ConcatEntry = Tuple[str, Optional[float]]
+
+DEFAULT_ENCODE: Dict[str, Any] = {
+    "codec": "libx264",
+    "preset": "veryfast",
+    "crf": 20,
+    "pix_fmt": "yuv420p",
+}
+
+DRAFT_ENCODE: Dict[str, Any] = dict(DEFAULT_ENCODE, preset="ultrafast", crf=28)
+
+# Deliverable container (by extension) -> (video codec or None for audio-only, audio codec).
+DELIVERABLE_CODECS: Dict[str, Tuple[Optional[str], str]] = {
+    ".mp4": ("libx264", "aac"),
+    ".m4v": ("libx264", "aac"),
+    ".mov": ("libx264", "aac"),
+    ".mkv": ("libx264", "aac"),
+    ".webm": ("libvpx-vp9", "libopus"),
+    ".m4a": (None, "aac"),
+    ".mp3": (None, "libmp3lame"),
+    ".wav": (None, "pcm_s16le"),
+}
+
+
+# Serializes output lines from concurrent ffmpeg workers.
+_output_lock = threading.Lock()
+
+# Running ffmpeg children, so a service-mode cancel can stop the current job.
+_ffmpeg_procs: "set[subprocess.Popen[str]]" = set()
+_ffmpeg_lock = threading.Lock()
+_cancel_event = threading.Event()
+# Raw pingpong cycles spilled by this process; removed when its render ends.
+_pingpong_spills: "set[str]" = set()
+_spill_lock = threading.Lock()
 
 
 def eprint(*args: Any) -> None:
-    print(*args, file=sys.stderr)
+    with _output_lock:
+        print(*args, file=sys.stderr)
 
 
 def load_project(path: str) -> Dict[str, Any]:
@@ -81,18 +235,234 @@ def check_ffmpeg() -> bool:
         return False
 
 
-def run_ffmpeg(args: List[str], with_progress: bool = True) -> int:
+def emit_event(payload: Dict[str, Any]) -> None:
+    """Print one machine-readable `[event] {json}` line for the host to parse."""
+    line = "[event] " + json.dumps(payload, separators=(",", ":"))
+    with _output_lock:
+        print(line, flush=True)
+
+
+class RenderProgress:
+    """Weighted stage plan for one render, reported as [event] lines.
+
+    Stage weights are estimated seconds of encoded media, so the global
+    fraction only moves forward; a stage's own total is set when it begins
+    (cache hits shrink it). ffmpeg runs report their out_time into the
+    current stage and their wall/CPU time when they exit.
+    """
+
+    def __init__(self, stages: List[Tuple[str, float]]) -> None:
+        self.stages = [(name, max(0.0, weight)) for name, weight in stages]
+        self.total_weight = sum(w for _, w in self.stages) or 1.0
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.cpu_started = time.process_time()
+        self.child_cpu = 0.0
+        self.index = -1
+        self.done_weight = 0.0
+        self.stage_total = 0.0
+        self.stage_done = 0.0
+        self.live: Dict[int, float] = {}
+        self.stage_started = self.started
+        self.stage_cpu_started = self.cpu_started
+        self.stage_child_cpu = 0.0
+
+    def weight(self, index: int) -> float:
+        return self.stages[index][1] if 0 <= index < len(self.stages) else 0.0
+
+    def begin(self, name: str, media_seconds: float = 0.0) -> None:
+        self.end()
+        with self.lock:
+            index = next((i for i, (n, _) in enumerate(self.stages) if n == name), -1)
+            # Stages skipped by the pipeline count as done.
+            self.done_weight = sum(w for _, w in self.stages[:index]) if index >= 0 else self.done_weight
+            self.index = index
+            self.stage_total = max(0.0, media_seconds)
+            self.stage_done = 0.0
+            self.live = {}
+            self.stage_started = time.monotonic()
+            self.stage_cpu_started = time.process_time()
+            self.stage_child_cpu = 0.0
+            payload = {"type": "stage", "state": "start", "stage": name, "index": index, "count": len(self.stages)}
+            payload["fraction"] = round(self.fraction(), 4)
+        emit_event(payload)
+
+    def end(self) -> None:
+        with self.lock:
+            if self.index < 0:
+                return
+            name = self.stages[self.index][0]
+            self.done_weight += self.weight(self.index)
+            payload = {
+                "type": "stage",
+                "state": "end",
+                "stage": name,
+                "index": self.index,
+                "count": len(self.stages),
+                "fraction": round(self.done_weight / self.total_weight, 4),
+                "wallSeconds": round(time.monotonic() - self.stage_started, 3),
+                "cpuSeconds": round(time.process_time() - self.stage_cpu_started + self.stage_child_cpu, 3),
+            }
+            self.index = -1
+        emit_event(payload)
+
+    def stage_fraction(self) -> float:
+        if self.stage_total <= 0:
+            return 0.0
+        return min(1.0, (self.stage_done + sum(self.live.values())) / self.stage_total)
+
+    def fraction(self) -> float:
+        return min(1.0, (self.done_weight + self.weight(self.index) * self.stage_fraction()) / self.total_weight)
+
+    def ffmpeg_progress(self, run: int, seconds: float, fps: Optional[float], speed: Optional[float]) -> None:
+        with self.lock:
+            if self.index < 0:
+                return
+            self.live[run] = max(0.0, seconds)
+            fraction = self.fraction()
+            elapsed = time.monotonic() - self.started
+            payload: Dict[str, Any] = {
+                "type": "progress",
+                "stage": self.stages[self.index][0],
+                "index": self.index,
+                "count": len(self.stages),
+                "stageFraction": round(self.stage_fraction(), 4),
+                "fraction": round(fraction, 4),
+                "fps": fps,
+                "speed": speed,
+                "etaSeconds": round(elapsed * (1 - fraction) / fraction, 1) if fraction > 0.001 else None,
+            }
+        emit_event(payload)
+
+    def ffmpeg_done(self, run: int, wall: float, cpu: Optional[float], code: int) -> None:
+        with self.lock:
+            self.stage_done += self.live.pop(run, 0.0)
+            self.child_cpu += cpu or 0.0
+            self.stage_child_cpu += cpu or 0.0
+            stage = self.stages[self.index][0] if self.index >= 0 else None
+        emit_event({
+            "type": "ffmpeg",
+            "stage": stage,
+            "code": code,
+            "wallSeconds": round(wall, 3),
+            "cpuSeconds": round(cpu, 3) if cpu is not None else None,
+        })
+
+    def finish(self) -> None:
+        self.end()
+        emit_event({
+            "type": "summary",
+            "wallSeconds": round(time.monotonic() - self.started, 3),
+            "cpuSeconds": round(time.process_time() - self.cpu_started + self.child_cpu, 3),
+        })
+
+
+# Progress plan of the render in flight, fed by run_ffmpeg.
+_progress: Optional[RenderProgress] = None
+
+
+def parse_progress_number(value: str) -> Optional[float]:
+    try:
+        return float(value.strip().rstrip("x"))
+    except ValueError:
+        return None
+
+
+def wait_with_usage(proc: "subprocess.Popen[str]") -> Tuple[int, Optional[float]]:
+    """Wait for proc; also return its CPU seconds where the OS reports them."""
+    if not hasattr(os, "wait4"):
+        return proc.wait(), None
+    try:
+        _pid, status, usage = os.wait4(proc.pid, 0)
+    except ChildProcessError:
+        return proc.wait(), None  # already reaped by Popen (e.g. terminate() polls)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return proc.returncode, usage.ru_utime + usage.ru_stime
+
+
+def run_ffmpeg(args: List[str], with_progress: bool = True, feed: Optional[Callable[[Any], None]] = None) -> int:
+    """Run ffmpeg, echoing its output; feed(stream), if given, writes its stdin from a thread."""
     cmd = [ffmpeg_exe()] + args
-    print("[ffmpeg] ", " ".join(f'"{a}"' if " " in a else a for a in cmd))
+    with _output_lock:
+        print("[ffmpeg] ", " ".join(f'"{a}"' if " " in a else a for a in cmd))
+    if _cancel_event.is_set():
+        return 255
+    stdin_r: Optional[int] = None
+    stdin_w: Optional[int] = None
+    if feed:
+        # A raw pipe keeps stdin binary while stdout stays in text mode.
+        stdin_r, stdin_w = os.pipe()
     try:
-        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        proc = subprocess.Popen(cmd, stdin=stdin_r, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
     except FileNotFoundError:
         eprint("[renderer] ffmpeg not found. Set vizmatic_FFMPEG.")
+        if stdin_w is not None:
+            os.close(stdin_r)  # type: ignore[arg-type]
+            os.close(stdin_w)
         return 127
+    with _ffmpeg_lock:
+        _ffmpeg_procs.add(proc)
+    feed_error: List[BaseException] = []
+    writer: Optional[threading.Thread] = None
+    if feed and stdin_w is not None:
+        os.close(stdin_r)  # type: ignore[arg-type]
+
+        def pump() -> None:
+            try:
+                with os.fdopen(stdin_w, "wb") as stream:
+                    feed(stream)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # ffmpeg stopped reading; its exit code tells why
+            except Exception as exc:
+                feed_error.append(exc)
+
+        writer = threading.Thread(target=pump, daemon=True)
+        writer.start()
     assert proc.stdout is not None
+    started = time.monotonic()
+    tracker = _progress if with_progress else None
+    report: Dict[str, str] = {}
     for line in proc.stdout:
-        print(line.rstrip())
-    return proc.wait()
+        line = line.rstrip()
+        with _output_lock:
+            print(line)
+        key, sep, value = line.partition("=")
+        if not (tracker and sep):
+            continue
+        report[key] = value
+        if key == "progress":
+            # One -progress block is complete; out_time_us/_ms are both microseconds.
+            out_us = parse_progress_number(report.get("out_time_us") or report.get("out_time_ms") or "")
+            if out_us is not None:
+                tracker.ffmpeg_progress(
+                    proc.pid,
+                    out_us / 1_000_000,
+                    parse_progress_number(report.get("fps") or ""),
+                    parse_progress_number(report.get("speed") or ""),
+                )
+    code, cpu = wait_with_usage(proc)
+    if tracker:
+        tracker.ffmpeg_done(proc.pid, time.monotonic() - started, cpu, code)
+    with _ffmpeg_lock:
+        _ffmpeg_procs.discard(proc)
+    if writer:
+        writer.join()
+    if feed_error:
+        eprint(f"[renderer] ffmpeg input stream failed: {feed_error[0]}")
+        return code or 1
+    return code
+
+
+def cancel_ffmpeg() -> None:
+    """Stop running ffmpeg children and refuse new ones until the flag is cleared."""
+    _cancel_event.set()
+    with _ffmpeg_lock:
+        procs = list(_ffmpeg_procs)
+    for proc in procs:
+        try:
+            proc.terminate()
+        except OSError:
+            pass
 
 
 def ensure_tmp_dir(base: str) -> str:
@@ -101,19 +471,486 @@ def ensure_tmp_dir(base: str) -> str:
     return d
 
 
-def write_concat_list(path_list: List[str], dest_file: str) -> None:
+def render_options(project: Dict[str, Any]) -> Dict[str, Any]:
+    """Renderer tuning knobs stored under metadata.render in the project JSON."""
+    metadata = project.get("metadata") or {}
+    opts = metadata.get("render") if isinstance(metadata, dict) else None
+    return dict(opts) if isinstance(opts, dict) else {}
+
+
+def env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name) or default)
+    except ValueError:
+        return default
+
+
+def encode_args(encode: Optional[Dict[str, Any]] = None) -> List[str]:
+    enc = encode or DEFAULT_ENCODE
+    args = [
+        "-c:v",
+        str(enc["codec"]),
+        "-preset",
+        str(enc["preset"]),
+        "-crf",
+        str(enc["crf"]),
+        "-pix_fmt",
+        str(enc["pix_fmt"]),
+    ]
+    if enc.get("threads"):
+        args += ["-threads", str(enc["threads"])]
+    return args
+
+
+def segment_output_args(encode: Optional[Dict[str, Any]], out_path: str) -> List[str]:
+    return encode_args(encode) + ["-video_track_timescale", str(SEGMENT_TIMESCALE), out_path]
+
+
+def normalize_filter(canvas: Tuple[int, int], fps: float) -> str:
+    """Scale/pad to the canvas and resample to the project frame rate."""
+    cw, ch = canvas
+    return (
+        f"scale=w={cw}:h={ch}:force_original_aspect_ratio=decrease,"
+        f"pad=w={cw}:h={ch}:x=(ow-iw)/2:y=(oh-ih)/2:color=black,setsar=1,fps={fps:g}"
+    )
+
+
+def encode_identity(encode: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Encoder settings that affect the bitstream (thread count does not)."""
+    return {k: v for k, v in (encode or DEFAULT_ENCODE).items() if k != "threads"}
+
+
+def worker_budget(jobs: Optional[int]) -> Tuple[int, int]:
+    """Return (workers, threads_per_worker) so workers * threads ~= cpu count."""
+    cpus = env_int("vizmatic_CPUS", 0) or os.cpu_count() or 1
+    if not jobs or jobs <= 0:
+        jobs = max(1, cpus // 4)
+    return jobs, max(1, cpus // jobs)
+
+
+def render_segments(units: List[Tuple[str, Callable[[], str]]], jobs: int) -> List[str]:
+    """Run (key, produce) units on a bounded worker pool.
+
+    Results are returned in the order of units; units sharing a key are
+    rendered once, which also keeps identical gaps from racing on one file.
+    """
+    unique: Dict[str, Callable[[], str]] = {}
+    for key, produce in units:
+        unique.setdefault(key, produce)
+    results: Dict[str, str] = {}
+    if jobs <= 1 or len(unique) <= 1:
+        for key, produce in unique.items():
+            results[key] = produce()
+    else:
+        with ThreadPoolExecutor(max_workers=min(jobs, len(unique))) as pool:
+            futures = {key: pool.submit(produce) for key, produce in unique.items()}
+            try:
+                for key, fut in futures.items():
+                    results[key] = fut.result()
+            except Exception:
+                for fut in futures.values():
+                    fut.cancel()
+                raise
+    return [results[key] for key, _ in units]
+
+
+def cache_root(work_dir: str) -> str:
+    root = os.environ.get("vizmatic_CACHE_DIR") or os.path.join(work_dir, "cache")
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def file_identity(path: str) -> Dict[str, Any]:
+    st = os.stat(path)
+    return {
+        "path": os.path.normcase(os.path.abspath(path)),
+        "size": st.st_size,
+        "mtime": st.st_mtime_ns,
+    }
+
+
+def hash_key(payload: Any) -> str:
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def clip_cache_key(
+    clip: Dict[str, Any],
+    canvas: Tuple[int, int],
+    fps: float,
+    encode: Optional[Dict[str, Any]] = None,
+    cut: Optional[Tuple[float, float]] = None,
+) -> str:
+    return hash_key({
+        "kind": "clip",
+        "version": SEGMENT_CACHE_VERSION,
+        # Proxy files are touched on every cache hit, so key them by their source.
+        "source": file_identity(clip.get("proxyOf") or clip["path"]),
+        "proxy": bool(clip.get("proxyOf")),
+        "trimStart": clip.get("trimStart"),
+        "trimEnd": clip.get("trimEnd"),
+        "duration": clip.get("duration"),
+        "fillMethod": str(clip.get("fillMethod") or "loop").lower(),
+        "filters": build_clip_filter_chain(clip),
+        "canvas": list(canvas),
+        "fps": fps,
+        "encode": encode_identity(encode),
+        "smartCut": list(cut) if cut else None,
+    })
+
+
+def black_cache_key(canvas: Tuple[int, int], fps: float, encode: Optional[Dict[str, Any]] = None) -> str:
+    return hash_key({
+        "kind": "black",
+        "version": SEGMENT_CACHE_VERSION,
+        "duration_ms": int(BLACK_SEGMENT_SECONDS * 1000),
+        "canvas": list(canvas),
+        "fps": fps,
+        "encode": encode_identity(encode),
+    })
+
+
+def move_into_cache(src: str, dest: str) -> None:
+    try:
+        os.replace(src, dest)
+    except OSError:
+        # Cache root may live on another volume; copy then publish atomically
+        # (under a name no other render or worker thread copies to).
+        tmp = f"{dest}.{os.getpid()}.{threading.get_ident()}.part"
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dest)
+        os.remove(src)
+
+
+def media_duration_ok(path: str, seconds: float) -> bool:
+    """Stream check for a rendered artifact: a video stream of about the expected length."""
+    info = probe_media(path)
+    duration = info.get("duration") if info else None
+    if not info or not info.get("width") or duration is None:
+        return False
+    return abs(duration - seconds) <= max(0.1, 0.02 * seconds)
+
+
+class RenderJournal:
+    """Append-only JSON-lines record of the units a render has finished.
+
+    Each line is {"key", "size"}; a torn last line from a crash is ignored.
+    Units in the journal are trusted on a rerun, while other cached files
+    are validated with media_duration_ok before they are reused.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            lines = []
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(entry, dict) and entry.get("version") == RESUME_JOURNAL_VERSION and entry.get("key"):
+                self.entries[entry["key"]] = entry
+
+    def record(self, key: str, path: str, **extra: Any) -> None:
+        entry = dict(extra, version=RESUME_JOURNAL_VERSION, key=key, size=os.path.getsize(path))
+        with self.lock:
+            self.entries[key] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def done(self, key: str, path: str) -> bool:
+        entry = self.entries.get(key)
+        if not entry or not os.path.isfile(path):
+            return False
+        st = os.stat(path)
+        # Files outside the content-addressed caches also pin their mtime.
+        return st.st_size == entry["size"] and entry.get("mtime") in (None, st.st_mtime_ns)
+
+    def verify(self, key: str, path: str, seconds: Optional[float]) -> bool:
+        """True when path is the finished unit key; unjournaled files get a stream check."""
+        if self.done(key, path):
+            return True
+        if seconds is not None and not media_duration_ok(path, seconds):
+            return False
+        self.record(key, path)
+        return True
+
+    def compact(self, keys: List[str]) -> None:
+        """Rewrite the journal with only keys, once the render they belong to finished."""
+        with self.lock:
+            kept = [self.entries[k] for k in dict.fromkeys(keys) if k in self.entries]
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(entry) + "\n" for entry in kept)
+            os.replace(tmp, self.path)
+            self.entries = {entry["key"]: entry for entry in kept}
+
+
+def render_journal_path(work_dir: str, output_path: str) -> str:
+    d = os.path.join(cache_root(work_dir), "manifests")
+    os.makedirs(d, exist_ok=True)
+    return os.path.join(d, hash_key({"output": os.path.normcase(os.path.abspath(output_path))}) + ".journal")
+
+
+def cached_segment(
+    seg_dir: Optional[str],
+    key: str,
+    label: str,
+    produce: Callable[[], str],
+    journal: Optional[RenderJournal] = None,
+    seconds: Optional[float] = None,
+) -> str:
+    """Return the cached segment for key, rendering it via produce() on a miss.
+
+    Hits refresh the file mtime, which doubles as the LRU clock for pruning.
+    With a journal, hits must pass its check (else they are re-rendered) and
+    new segments are recorded as finished.
+    """
+    if not seg_dir:
+        return produce()
+    cached = os.path.join(seg_dir, f"{key}.mp4")
+    if os.path.isfile(cached) and os.path.getsize(cached) > 0:
+        if journal and not journal.verify(key, cached, seconds):
+            eprint(f"[renderer] Cached {label} failed validation; rendering it again ({key[:12]})")
+            os.remove(cached)
+        else:
+            os.utime(cached, None)
+            with _output_lock:
+                print(f"[renderer] Segment cache hit: {label} ({key[:12]})")
+            return cached
+    move_into_cache(produce(), cached)
+    if journal:
+        journal.record(key, cached)
+    return cached
+
+
+def prune_segment_cache(seg_dir: str, max_bytes: int, keep: List[str]) -> None:
+    """Evict least recently used segments until the cache fits in max_bytes."""
+    keep_set = {os.path.abspath(p) for p in keep}
+    entries: List[Tuple[float, int, str]] = []
+    total = 0
+    for name in os.listdir(seg_dir):
+        path = os.path.join(seg_dir, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if not os.path.isfile(path):
+            continue
+        total += st.st_size
+        entries.append((st.st_mtime, st.st_size, path))
+    entries.sort()
+    for _mtime, size, path in entries:
+        if total <= max_bytes:
+            break
+        if os.path.abspath(path) in keep_set:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+            with _output_lock:
+                print(f"[renderer] Segment cache evicted: {os.path.basename(path)}")
+        except OSError:
+            pass
+
+
+def proxy_cache_dir(work_dir: str) -> str:
+    d = os.path.join(cache_root(work_dir), "proxies")
+    os.makedirs(d, exist_ok=True)
+    return d
+
+
+def proxy_cache_key(path: str, size: Tuple[int, int], fps: float) -> str:
+    return hash_key({
+        "kind": "proxy",
+        "version": PROXY_CACHE_VERSION,
+        "source": file_identity(path),
+        "size": list(size),
+        "fps": fps,
+    })
+
+
+def render_proxy(work_dir: str, path: str, idx: int, size: Tuple[int, int], fps: float, threads: int = 0) -> str:
+    """Encode a low-res, short-GOP copy of a source that fits within size.
+
+    The proxy keeps the source duration and aspect ratio, so trims and fills
+    apply to it unchanged; the one-second GOP keeps trimmed seeks cheap.
+    """
+    pw, ph = size
+    out_path = os.path.join(work_dir, f"proxy_{idx:04d}.mp4")
+    args = [
+        "-hide_banner",
+        "-y",
+        "-nostats",
+        "-progress",
+        "pipe:1",
+        "-i",
+        path,
+        "-an",
+        "-vf",
+        f"scale=w={pw}:h={ph}:force_original_aspect_ratio=decrease:force_divisible_by=2,fps={fps:g}",
+        "-g",
+        str(max(1, int(round(fps)))),
+    ]
+    args += encode_args(dict(DRAFT_ENCODE, threads=threads))
+    args.append(out_path)
+    code = run_ffmpeg(args)
+    if code != 0:
+        raise RuntimeError(f"Proxy render failed ({code})")
+    return out_path
+
+
+def ensure_proxies(
+    work_dir: str,
+    paths: List[str],
+    size: Tuple[int, int],
+    fps: float,
+    jobs: int,
+    threads: int,
+) -> Dict[str, str]:
+    """Map each source path to its cached proxy, encoding missing ones once."""
+    proxy_dir = proxy_cache_dir(work_dir)
+    sources = list(dict.fromkeys(paths))
+    units: List[Tuple[str, Callable[[], str]]] = []
+    for idx, path in enumerate(sources):
+        key = proxy_cache_key(path, size, fps)
+        units.append((key, lambda key=key, path=path, idx=idx: cached_segment(
+            proxy_dir,
+            key,
+            f"proxy {idx}",
+            lambda: render_proxy(work_dir, path, idx, size, fps, threads),
+        )))
+    proxies = render_segments(units, jobs)
+    prune_segment_cache(proxy_dir, env_int("vizmatic_CACHE_MAX_MB", DEFAULT_CACHE_MAX_MB) * 1024 * 1024, proxies)
+    return dict(zip(sources, proxies))
+
+
+def draft_settings(
+    canvas: Tuple[int, int],
+    fps: float,
+    options: Dict[str, Any],
+) -> Tuple[Tuple[int, int], float, float]:
+    """Return (draft canvas, draft fps, scale) from metadata.render draft knobs."""
+    try:
+        scale = float(options.get("draftScale") or DEFAULT_DRAFT_SCALE)
+    except (TypeError, ValueError):
+        scale = DEFAULT_DRAFT_SCALE
+    scale = min(1.0, max(0.1, scale))
+    try:
+        max_fps = float(options.get("draftFps") or DEFAULT_DRAFT_FPS)
+    except (TypeError, ValueError):
+        max_fps = DEFAULT_DRAFT_FPS
+    cw, ch = canvas
+    # libx264 with yuv420p needs even dimensions.
+    size = (max(2, int(round(cw * scale / 2)) * 2), max(2, int(round(ch * scale / 2)) * 2))
+    return size, min(fps, max(1.0, max_fps)), size[0] / cw
+
+
+def scale_layers(layers: List[Dict[str, Any]], scale: float) -> List[Dict[str, Any]]:
+    """Copies of layers with pixel-measured keys scaled; positions are canvas fractions."""
+    scaled: List[Dict[str, Any]] = []
+    for layer in layers:
+        layer = dict(layer)
+        for key in LAYER_PIXEL_KEYS:
+            value = layer.get(key)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                layer[key] = value * scale
+        scaled.append(layer)
+    return scaled
+
+
+def write_concat_list(entries: List[ConcatEntry], dest_file: str) -> None:
     # ffmpeg concat demuxer expects: file '<path>' per line; use -safe 0
     with open(dest_file, "w", encoding="utf-8") as f:
-        for p in path_list:
+        for p, outpoint in entries:
             # Escape single quotes
             q = p.replace("'", "'\\''")
             f.write(f"file '{q}'\n")
+            if outpoint is not None:
+                f.write(f"outpoint {outpoint:.6f}\n")
+
+
+def gap_concat_entries(black_path: str, duration: float, fps: float) -> List[ConcatEntry]:
+    """Cover a gap by repeating the canonical black segment, cutting the last copy.
+
+    The black segment is all keyframes, so any outpoint is a clean stream-copy cut.
+    """
+    half_frame = 0.5 / fps
+    full = int((duration + half_frame) // BLACK_SEGMENT_SECONDS)
+    entries: List[ConcatEntry] = [(black_path, None)] * full
+    rest = duration - full * BLACK_SEGMENT_SECONDS
+    if rest > half_frame:
+        entries.append((black_path, rest))
+    return entries
+
+
+# Stream parameters that must match for the concat demuxer to join with -c copy.
+CONCAT_COPY_KEYS = (
+    "codec_name",
+    "profile",
+    "level",
+    "pix_fmt",
+    "width",
+    "height",
+    "sample_aspect_ratio",
+    "r_frame_rate",
+    "time_base",
+    "extradata_hash",
+)
+
+
+def probe_video_stream(path: str) -> Optional[Dict[str, Any]]:
+    exe = ffprobe_exe()
+    try:
+        proc = subprocess.run([
+            exe,
+            "-v",
+            "error",
+            "-select_streams",
+            "v:0",
+            "-show_data_hash",
+            "sha256",
+            "-show_entries",
+            "stream=" + ",".join(CONCAT_COPY_KEYS + ("start_time",)),
+            "-of",
+            "json",
+            path,
+        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+        streams = json.loads(proc.stdout or "{}").get("streams") or []
+        return streams[0] if streams else None
+    except Exception:
+        return None
+
 
+def segments_compatible(paths: List[str]) -> bool:
+    """True when every segment shares codec, pix_fmt, geometry, rate and timebase."""
+    reference: Optional[Dict[str, Any]] = None
+    for path in dict.fromkeys(paths):
+        info = probe_video_stream(path)
+        if not info:
+            return False
+        params = {k: info.get(k) for k in CONCAT_COPY_KEYS}
+        if reference is None:
+            reference = params
+        elif params != reference:
+            eprint(f"[renderer] Segment parameters differ ({os.path.basename(path)}); concat will re-encode")
+            return False
+    return reference is not None
 
-def concat_videos_to_h264(work_dir: str, clips: List[str]) -> Tuple[int, str]:
-    """Produces a temporary MP4 with H.264 video only. Returns (code, path)."""
-    list_path = os.path.join(work_dir, "concat.txt")
-    out_path = os.path.join(work_dir, "concat_video.mp4")
+
+def concat_videos_to_h264(work_dir: str, clips: List[ConcatEntry], name: str = "concat") -> Tuple[int, str]:
+    """Produces a temporary MP4 with H.264 video only. Returns (code, path).
+
+    Compatible segments are joined with stream copy; otherwise the timeline is
+    re-encoded as before.
+    """
+    list_path = os.path.join(work_dir, f"{name}.txt")
+    out_path = os.path.join(work_dir, f"{name}_video.mp4")
     write_concat_list(clips, list_path)
     args = [
         "-hide_banner",
@@ -128,16 +965,22 @@ def concat_videos_to_h264(work_dir: str, clips: List[str]) -> Tuple[int, str]:
         "-i",
         list_path,
         "-an",
-        "-c:v",
-        "libx264",
-        "-preset",
-        "veryfast",
-        "-crf",
-        "20",
-        "-pix_fmt",
-        "yuv420p",
-        out_path,
     ]
+    if segments_compatible([p for p, _ in clips]):
+        print("[renderer] Segments compatible; joining with stream copy")
+        args += ["-c", "copy"]
+    else:
+        args += [
+            "-c:v",
+            "libx264",
+            "-preset",
+            "veryfast",
+            "-crf",
+            "20",
+            "-pix_fmt",
+            "yuv420p",
+        ]
+    args.append(out_path)
     code = run_ffmpeg(args)
     return code, out_path
 
@@ -182,9 +1025,168 @@ def build_clip_filter_chain(clip: Dict[str, Any]) -> Optional[str]:
     return ",".join(parts)
 
 
-def render_blank_clip(work_dir: str, duration: float, size: Tuple[int, int]) -> str:
-    out_path = os.path.join(work_dir, f"gap_{int(duration * 1000)}ms.mp4")
+def pingpong_frame_budget(canvas: Tuple[int, int]) -> int:
+    """Canvas frames that fit in vizmatic_PINGPONG_MEM_MB."""
+    budget = env_int("vizmatic_PINGPONG_MEM_MB", DEFAULT_PINGPONG_MEM_MB) * 1024 * 1024
+    return max(1, budget // raw_frame_bytes(canvas))
+
+
+def pingpong_chunks(trim_start: float, seg_len: float, canvas: Tuple[int, int], fps: float) -> List[Tuple[float, float]]:
+    """Split [trim_start, trim_start + seg_len) into (start, length) chunks small
+    enough that reversing one buffers at most vizmatic_PINGPONG_MEM_MB of frames."""
+    chunk = pingpong_frame_budget(canvas) / fps
+    count = max(1, math.ceil(seg_len / chunk - 1e-9))
+    step = seg_len / count
+    return [(trim_start + i * step, step) for i in range(count)]
+
+
+def pingpong_piece_graph(
+    path: str,
+    pieces: List[Tuple[float, float, bool]],
+    chain: Optional[str],
+    canvas: Tuple[int, int],
+    fps: float,
+    duration: float,
+    first_input: int,
+    tag: str,
+    out_label: str,
+) -> Tuple[List[str], List[str]]:
+    """Concatenate (start, length, reversed) pieces of path, each its own seeked input."""
+    prefix = f"{chain}," if chain else ""
+    normalize = normalize_filter(canvas, fps)
+    input_args: List[str] = []
+    parts: List[str] = []
+    labels: List[str] = []
+    for n, (start, length, reverse) in enumerate(pieces):
+        input_args += ["-ss", f"{start:.3f}", "-t", f"{length:.3f}", "-i", path]
+        label = f"[{tag}{n}]"
+        steps = f"setpts=PTS-STARTPTS,{prefix}{normalize}"
+        if reverse:
+            steps += ",reverse,setpts=PTS-STARTPTS"
+        parts.append(f"[{first_input + n}:v]{steps}{label}")
+        labels.append(label)
+    parts.append(
+        "".join(labels)
+        # concat leaves the frame rate unset, which encoders would read as 25 fps.
+        + f"concat=n={len(labels)}:v=1:a=0,trim=duration={duration:.3f},setpts=PTS-STARTPTS,fps={fps:g}{out_label}"
+    )
+    return input_args, parts
+
+
+def pingpong_spill(
+    scratch_dir: str,
+    clip: Dict[str, Any],
+    canvas: Tuple[int, int],
+    fps: float,
+    cycle: List[Tuple[float, float, bool]],
+) -> str:
+    """Decode one forward + reversed pass of a pingpong clip to raw frames in scratch_dir.
+
+    Only cycles too large to loop in memory spill; the file is read back with
+    -stream_loop, so nothing is encoded twice, and it is removed when the
+    render ends (remove_pingpong_spills).
+    """
+    path = str(clip["path"])
+    chain = build_clip_filter_chain(clip)
+    key = hash_key({
+        "kind": "pingpong",
+        "source": file_identity(path),
+        "cycle": [[round(start, 3), round(length, 3), reverse] for start, length, reverse in cycle],
+        "filters": chain,
+        "canvas": list(canvas),
+        "fps": fps,
+    })
+    out_path = os.path.join(scratch_dir, f"pingpong_{key}.yuv")
+    with _spill_lock:
+        _pingpong_spills.add(out_path)
+    if os.path.isfile(out_path):
+        return out_path
+    seconds = sum(length for _start, length, _reverse in cycle)
+    input_args, parts = pingpong_piece_graph(path, cycle, chain, canvas, fps, seconds, 0, "pc", "[v]")
+    tmp_path = f"{out_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    args = ["-hide_banner", "-y", "-nostats"] + input_args
+    args += ["-filter_complex", ";".join(parts), "-map", "[v]", "-an", "-f", "rawvideo", "-pix_fmt", "yuv420p", tmp_path]
+    code = run_ffmpeg(args, with_progress=False)
+    if code != 0:
+        raise RuntimeError(f"Pingpong spill failed ({code})")
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def remove_pingpong_spills() -> None:
+    with _spill_lock:
+        spills = list(_pingpong_spills)
+        _pingpong_spills.clear()
+    for path in spills:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def build_pingpong_graph(
+    clip: Dict[str, Any],
+    canvas: Tuple[int, int],
+    fps: float,
+    first_input: int,
+    tag: str,
+    out_label: str,
+    scratch_dir: str,
+) -> Tuple[List[str], List[str]]:
+    """Return (input_args, filter_parts) producing the looped pingpong clip.
+
+    One cycle is the forward pass plus each reversed chunk, every piece its
+    own seeked input, so only one chunk of (canvas-sized) frames is ever held
+    by reverse. A slot longer than one cycle repeats it with the loop filter
+    when the cycle fits vizmatic_PINGPONG_MEM_MB, else stream-loops its raw
+    frames spilled to scratch_dir; either way the input count never grows
+    with the slot length and the clip is encoded once, downstream.
+    """
+    path = str(clip["path"])
+    trim_start = float(clip.get("trimStart") or 0)
+    seg_len = max(0.0, float(clip["trimEnd"]) - trim_start)
+    duration = float(clip.get("duration") or 0)
+    if duration <= 0:
+        duration = seg_len * 2.0
+    chunks = pingpong_chunks(trim_start, seg_len, canvas, fps)
+    cycle = [(trim_start, seg_len, False)] + [(start, length, True) for start, length in reversed(chunks)]
+    chain = build_clip_filter_chain(clip)
+    if duration > 2 * seg_len + 1e-6:
+        # One frame of slack: loop repeats whatever the cycle produced once its input ends.
+        cycle_frames = int(math.ceil(2 * seg_len * fps)) + 1
+        repeats = int(math.ceil(duration / (2 * seg_len)))
+        if cycle_frames <= pingpong_frame_budget(canvas):
+            input_args, parts = pingpong_piece_graph(
+                path, cycle, chain, canvas, fps, 2 * seg_len, first_input, tag, f"[{tag}cycle]"
+            )
+            parts.append(
+                f"[{tag}cycle]loop=loop={repeats - 1}:size={cycle_frames},"
+                f"trim=duration={duration:.3f},setpts=PTS-STARTPTS,fps={fps:g}{out_label}"
+            )
+            return input_args, parts
+        width, height = canvas
+        spill = pingpong_spill(scratch_dir, clip, canvas, fps, cycle)
+        input_args = ["-stream_loop", "-1", "-f", "rawvideo", "-pix_fmt", "yuv420p"]
+        input_args += ["-s", f"{width}x{height}", "-framerate", f"{fps:g}", "-i", spill]
+        return input_args, [f"[{first_input}:v]trim=duration={duration:.3f},setpts=PTS-STARTPTS,fps={fps:g}{out_label}"]
+    pieces: List[Tuple[float, float, bool]] = []
+    covered = 0.0
+    for piece in cycle:
+        if covered >= duration - 1e-6:
+            break
+        pieces.append(piece)
+        covered += piece[1]
+    return pingpong_piece_graph(path, pieces, chain, canvas, fps, duration, first_input, tag, out_label)
+
+
+def render_blank_clip(work_dir: str, duration: float, size: Tuple[int, int], fps: float = DEFAULT_FPS, encode: Optional[Dict[str, Any]] = None) -> str:
+    """Encode black frames with every frame a keyframe so copies can be cut anywhere.
+
+    Forcing keyframes leaves the x264 settings (and so the SPS/PPS) identical to
+    the clip segments, which keeps stream-copy concat possible.
+    """
     width, height = size
+    out_path = os.path.join(work_dir, f"black_{width}x{height}_{int(duration * 1000)}ms.mp4")
     args = [
         "-hide_banner",
         "-y",
@@ -194,25 +1196,25 @@ def render_blank_clip(work_dir: str, duration: float, size: Tuple[int, int]) ->
         "-f",
         "lavfi",
         "-i",
-        f"color=c=black:s={width}x{height}:d={duration}",
+        f"color=c=black:s={width}x{height}:r={fps:g}:d={duration}",
         "-an",
-        "-c:v",
-        "libx264",
-        "-preset",
-        "veryfast",
-        "-crf",
-        "20",
-        "-pix_fmt",
-        "yuv420p",
-        out_path,
+        "-vf",
+        "setsar=1",
+        "-force_key_frames",
+        "expr:1",
     ]
+    args += segment_output_args(encode, out_path)
     code = run_ffmpeg(args)
     if code != 0:
         raise RuntimeError(f"Failed to render blank clip ({code})")
     return out_path
 
 
-def render_clip_segment(work_dir: str, clip: Dict[str, Any], idx: int) -> str:
+def clip_source_args(clip: Dict[str, Any], canvas: Tuple[int, int], fps: float, scratch_dir: str) -> List[str]:
+    """Input and filter options that turn a clip into canvas-sized video (output options excluded).
+
+    scratch_dir (the work dir) receives pingpong cycles too large to loop in memory.
+    """
     path = clip.get("path")
     if not path:
         raise ValueError("Missing clip path")
@@ -225,79 +1227,17 @@ def render_clip_segment(work_dir: str, clip: Dict[str, Any], idx: int) -> str:
     if trim_end_val is not None:
         seg_len = max(0.0, trim_end_val - trim_start)
     loop = bool(seg_len and duration > seg_len + 0.01 and fill_method == "loop")
-    out_path = os.path.join(work_dir, f"clip_{idx:04d}.mp4")
 
     if fill_method == "pingpong" and seg_len:
-        cycle_path = os.path.join(work_dir, f"clip_{idx:04d}_pp.mp4")
-        chain = build_clip_filter_chain(clip)
-        trim_expr = f"trim=start={trim_start:.3f}:end={trim_end_val:.3f}"
-        base_chain = f"{trim_expr},setpts=PTS-STARTPTS"
-        if chain:
-            base_chain = f"{base_chain},{chain}"
-        filter_complex = f"[0:v]{base_chain}[f];[f]reverse,setpts=PTS-STARTPTS[r];[f][r]concat=n=2:v=1:a=0[v]"
-        args = [
-            "-hide_banner",
-            "-y",
-            "-nostats",
-            "-progress",
-            "pipe:1",
-            "-i",
-            path,
+        input_args, parts = build_pingpong_graph(clip, canvas, fps, 0, "pp", "[v]", scratch_dir)
+        return input_args + [
             "-filter_complex",
-            filter_complex,
+            ";".join(parts),
             "-map",
             "[v]",
             "-an",
-            "-c:v",
-            "libx264",
-            "-preset",
-            "veryfast",
-            "-crf",
-            "20",
-            "-pix_fmt",
-            "yuv420p",
-            cycle_path,
-        ]
-        code = run_ffmpeg(args)
-        if code != 0:
-            raise RuntimeError(f"Clip render failed ({code})")
-
-        cycle_len = seg_len * 2.0
-        args = [
-            "-hide_banner",
-            "-y",
-            "-nostats",
-            "-progress",
-            "pipe:1",
-        ]
-        if duration > cycle_len + 0.01:
-            args += ["-stream_loop", "-1"]
-        args += ["-i", cycle_path]
-        if duration > 0:
-            args += ["-t", f"{duration:.3f}"]
-        args += [
-            "-an",
-            "-c:v",
-            "libx264",
-            "-preset",
-            "veryfast",
-            "-crf",
-            "20",
-            "-pix_fmt",
-            "yuv420p",
-            out_path,
         ]
-        code = run_ffmpeg(args)
-        if code != 0:
-            raise RuntimeError(f"Clip render failed ({code})")
-        return out_path
-    args = [
-        "-hide_banner",
-        "-y",
-        "-nostats",
-        "-progress",
-        "pipe:1",
-    ]
+    args: List[str] = []
     if loop:
         args += ["-stream_loop", "-1"]
     if trim_start > 0:
@@ -316,52 +1256,811 @@ def render_clip_segment(work_dir: str, clip: Dict[str, Any], idx: int) -> str:
             chain = f"{chain},{stretch}" if chain else stretch
         except Exception:
             pass
-    if chain:
-        args += ["-vf", chain]
-    args += [
-        "-c:v",
-        "libx264",
-        "-preset",
-        "veryfast",
-        "-crf",
-        "20",
-        "-pix_fmt",
-        "yuv420p",
-        out_path,
+    normalize = normalize_filter(canvas, fps)
+    chain = f"{chain},{normalize}" if chain else normalize
+    args += ["-vf", chain]
+    return args
+
+
+def render_clip_segment(
+    work_dir: str,
+    clip: Dict[str, Any],
+    idx: int,
+    canvas: Tuple[int, int],
+    fps: float = DEFAULT_FPS,
+    encode: Optional[Dict[str, Any]] = None,
+) -> str:
+    out_path = os.path.join(work_dir, f"clip_{idx:04d}.mp4")
+    args = [
+        "-hide_banner",
+        "-y",
+        "-nostats",
+        "-progress",
+        "pipe:1",
     ]
+    args += clip_source_args(clip, canvas, fps, work_dir)
+    args += segment_output_args(encode, out_path)
     code = run_ffmpeg(args)
     if code != 0:
         raise RuntimeError(f"Clip render failed ({code})")
     return out_path
 
-def mux_audio_video(temp_video: str, audio_path: Optional[str], output_path: str, layers: List[Dict[str, Any]], canvas: Optional[Tuple[int, int]] = None) -> int:
-    has_audio = bool(audio_path)
-    filter_complex, vlabel = build_layer_filters(layers, has_audio=has_audio, canvas=canvas)
+
+def edge_stream_params(
+    path: str,
+    canvas: Tuple[int, int],
+    fps: float,
+    encode: Optional[Dict[str, Any]],
+    scratch_dir: str,
+) -> Optional[Dict[str, Any]]:
+    """Concat parameters of one frame of path encoded as a smart-cut edge would be."""
+    out_path = os.path.join(scratch_dir, f"edge.{os.getpid()}.{threading.get_ident()}.mp4")
+    args = ["-hide_banner", "-y", "-nostats", "-progress", "pipe:1", "-i", path, "-an", "-frames:v", "1"]
+    args += ["-vf", normalize_filter(canvas, fps)]
+    args += segment_output_args(encode, out_path)
+    try:
+        info = probe_video_stream(out_path) if run_ffmpeg(args, with_progress=False) == 0 else None
+    finally:
+        try:
+            os.remove(out_path)
+        except OSError:
+            pass
+    return {k: info.get(k) for k in CONCAT_COPY_KEYS} if info else None
+
+
+def smart_cut_plan(
+    clip: Dict[str, Any],
+    canvas: Tuple[int, int],
+    fps: float,
+    cache_dir: Optional[str] = None,
+    encode: Optional[Dict[str, Any]] = None,
+) -> Optional[Tuple[float, float]]:
+    """Return the (first, last) source keyframe bounding the span a clip may stream-copy.
+
+    Only untouched clips qualify: no filters or fill, and an H.264 yuv420p
+    source already at the canvas size, square pixels and the project frame
+    rate. Frames before the first and after the last keyframe are re-encoded,
+    and an avc1 track carries one set of SPS/PPS, so the source must also
+    have exactly the parameter sets the segment encoder produces. That is
+    checked once per source against a one-frame encode; it, the stream
+    parameters and the keyframes of the trimmed range are kept in the probe
+    cache (cache_dir).
+    """
+    path = clip.get("path")
+    if not path or build_clip_filter_chain(clip):
+        return None
+    fill_method = str(clip.get("fillMethod") or "loop").lower()
+    trim_start = float(clip.get("trimStart") or 0)
+    duration = float(clip.get("duration") or 0)
+    trim_end = clip.get("trimEnd")
+    if fill_method == "pingpong" or duration <= 0:
+        return None
+    if trim_end is not None and float(trim_end) - trim_start < duration - 0.01:
+        return None  # loop or stretch fills the slot
+    info = probe_cached(path, cache_dir, "stream", lambda: probe_video_stream(path))
+    if not info:
+        return None
+    rate = parse_rate(info.get("r_frame_rate"))
+    if (
+        info.get("codec_name") != "h264"
+        or info.get("pix_fmt") != "yuv420p"
+        or (info.get("width"), info.get("height")) != tuple(canvas)
+        or info.get("sample_aspect_ratio") not in ("1:1", None)
+        or not rate
+        or abs(rate - fps) > 0.001
+    ):
+        return None
+    end = trim_start + duration
+    half_frame = 0.5 / fps
+    try:
+        origin = float(info.get("start_time") or 0.0)
+    except (TypeError, ValueError):
+        origin = 0.0
+    # Only packets around the trimmed range are read; times are made relative
+    # to the stream start, which is where -ss 0 lands.
+    span = (max(0.0, origin + trim_start - 1.0), origin + end + 1.0)
+
+    def scan_keyframes() -> Optional[Dict[str, Any]]:
+        times, source_duration = video_keyframes(path, span)
+        return {"times": times, "duration": source_duration} if source_duration is not None else None
+
+    scan = probe_cached(path, cache_dir, f"keyframes-{span[0]:.3f}-{span[1]:.3f}", scan_keyframes)
+    if not scan:
+        return None
+    keyframes = [t - origin for t in scan["times"]]
+    source_duration = scan["duration"]
+    if source_duration is None or end > source_duration + half_frame:
+        return None  # the source runs out and loop fill takes over
+    inside = [t for t in keyframes if trim_start - half_frame <= t <= end + half_frame]
+    # Worth it only when at least a second of whole GOPs can be copied.
+    if len(inside) < 2 or inside[-1] - inside[0] < 1.0:
+        return None
+    source_params = {k: info.get(k) for k in CONCAT_COPY_KEYS}
+    if not source_params.get("extradata_hash"):
+        return None
+    edge_kind = "edge-" + hash_key({"canvas": list(canvas), "fps": fps, "encode": encode_identity(encode)})[:16]
+    edge_params = probe_cached(
+        path, cache_dir, edge_kind, lambda: edge_stream_params(path, canvas, fps, encode, cache_dir or tempfile.gettempdir())
+    )
+    if edge_params != source_params:
+        return None  # other encoder or settings: the edges could not be joined
+    return inside[0], inside[-1]
+
+
+def render_smart_cut_segment(
+    work_dir: str,
+    clip: Dict[str, Any],
+    idx: int,
+    cut: Tuple[float, float],
+    canvas: Tuple[int, int],
+    fps: float = DEFAULT_FPS,
+    encode: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Encode the partial GOPs at a clip's edges and stream-copy the keyframe-aligned middle.
+
+    cut comes from smart_cut_plan, which only admits sources whose parameter
+    sets match the encoded edges, so the pieces join with stream copy.
+    """
+    path = str(clip["path"])
+    trim_start = float(clip.get("trimStart") or 0)
+    end = trim_start + float(clip.get("duration") or 0)
+    first, last = cut
+    pieces: List[Tuple[str, float, int]] = [
+        ("head", trim_start, int(round((first - trim_start) * fps))),
+        ("body", first, int(round((last - first) * fps))),
+        ("tail", last, int(round((end - last) * fps))),
+    ]
+    entries: List[ConcatEntry] = []
+    for name, start, frames in pieces:
+        if frames <= 0:
+            continue
+        piece_path = os.path.join(work_dir, f"clip_{idx:04d}_{name}.mp4")
+        args = ["-hide_banner", "-y", "-nostats", "-progress", "pipe:1"]
+        if start > 0:
+            args += ["-ss", f"{start:.6f}"]
+        args += ["-i", path, "-an", "-frames:v", str(frames)]
+        if name == "body":
+            # Whole GOPs in decode order: the copy stops right before the next keyframe.
+            args += ["-c:v", "copy", "-video_track_timescale", str(SEGMENT_TIMESCALE), piece_path]
+        else:
+            args += ["-vf", normalize_filter(canvas, fps)]
+            args += segment_output_args(encode, piece_path)
+        code = run_ffmpeg(args)
+        if code != 0:
+            raise RuntimeError(f"Smart-cut {name} of clip {idx} failed ({code})")
+        entries.append((piece_path, None))
+    list_path = os.path.join(work_dir, f"clip_{idx:04d}_cut.txt")
+    out_path = os.path.join(work_dir, f"clip_{idx:04d}.mp4")
+    write_concat_list(entries, list_path)
     args = [
         "-hide_banner",
         "-y",
         "-nostats",
         "-progress",
         "pipe:1",
+        "-safe",
+        "0",
+        "-f",
+        "concat",
         "-i",
-        temp_video,
+        list_path,
+        "-c",
+        "copy",
+        "-video_track_timescale",
+        str(SEGMENT_TIMESCALE),
+        out_path,
+    ]
+    code = run_ffmpeg(args)
+    if code != 0:
+        raise RuntimeError(f"Smart-cut join of clip {idx} failed ({code})")
+    return out_path
+
+
+def timeline_units(clip_jobs: List[Dict[str, Any]]) -> List[Tuple[str, float, int]]:
+    """Expand clip jobs into ("gap", seconds, -1) / ("clip", seconds, idx) in timeline order."""
+    units: List[Tuple[str, float, int]] = []
+    current = 0.0
+    for idx, clip in enumerate(clip_jobs):
+        start_val = float(clip.get("start") or 0)
+        if start_val > current + 0.001:
+            gap = start_val - current
+            units.append(("gap", gap, -1))
+            current += gap
+        duration = float(clip.get("duration") or 0)
+        units.append(("clip", duration, idx))
+        current += duration
+    return units
+
+
+def build_timeline_graph(
+    clip_jobs: List[Dict[str, Any]],
+    canvas: Tuple[int, int],
+    fps: float,
+    scratch_dir: str,
+    out_label: str = "[tl]",
+) -> Tuple[List[str], List[str]]:
+    """Compile the whole timeline into (input_args, filter_parts).
+
+    Clips become inputs in timeline order (trim/loop handled by input options
+    as in render_clip_segment, pingpong via build_pingpong_graph, which may
+    spill a long cycle to scratch_dir); gaps are synthesized in-graph from a
+    color source.
+    """
+    width, height = canvas
+    normalize = normalize_filter(canvas, fps)
+    input_args: List[str] = []
+    parts: List[str] = []
+    labels: List[str] = []
+    input_idx = 0
+    for n, (kind, duration, idx) in enumerate(timeline_units(clip_jobs)):
+        label = f"[tl{n}]"
+        labels.append(label)
+        if kind == "gap":
+            parts.append(f"color=c=black:s={width}x{height}:r={fps:g}:d={duration:.3f},setsar=1{label}")
+            continue
+        clip = clip_jobs[idx]
+        trim_start = float(clip.get("trimStart") or 0)
+        trim_end = clip.get("trimEnd")
+        trim_end_val = float(trim_end) if trim_end is not None else None
+        fill_method = str(clip.get("fillMethod") or "loop").lower()
+        seg_len = None
+        if trim_end_val is not None:
+            seg_len = max(0.0, trim_end_val - trim_start)
+        chain = build_clip_filter_chain(clip)
+        src = f"[{input_idx}:v]"
+        if fill_method == "pingpong" and seg_len:
+            pp_inputs, pp_parts = build_pingpong_graph(clip, canvas, fps, input_idx, f"pp{n}_", label, scratch_dir)
+            input_args += pp_inputs
+            parts += pp_parts
+            input_idx += pp_inputs.count("-i")
+            continue
+        loop = bool(seg_len and duration > seg_len + 0.01 and fill_method == "loop")
+        if loop:
+            input_args += ["-stream_loop", "-1"]
+        if trim_start > 0:
+            input_args += ["-ss", f"{trim_start:.3f}"]
+        if trim_end_val is not None and trim_end_val > trim_start:
+            input_args += ["-to", f"{trim_end_val:.3f}"]
+        input_args += ["-i", str(clip["path"])]
+        steps = [chain] if chain else []
+        if fill_method == "stretch" and seg_len and duration > 0:
+            steps.append(f"setpts=PTS*{max(0.05, duration / seg_len):.6f}")
+        steps += ["setpts=PTS-STARTPTS", f"trim=duration={duration:.3f}", normalize, "setpts=PTS-STARTPTS"]
+        parts.append(f"{src}{','.join(steps)}{label}")
+        input_idx += 1
+    parts.append("".join(labels) + f"concat=n={len(labels)}:v=1:a=0{out_label}")
+    return input_args, parts
+
+
+def render_single_pass(
+    work_dir: str,
+    clip_jobs: List[Dict[str, Any]],
+    audio_path: Optional[str],
+    output_path: str,
+    layers: List[Dict[str, Any]],
+    canvas: Tuple[int, int],
+    fps: float,
+    encode: Optional[Dict[str, Any]] = None,
+    raster: Optional[Dict[str, Any]] = None,
+    deliverables: Optional[List[Dict[str, Any]]] = None,
+) -> int:
+    """Render trims, fills, gaps, clip filters and layers in one ffmpeg run.
+
+    Nothing is written to the work dir except the filtergraph script (and the
+    raw frames of pingpong cycles too large to loop in memory), and the output
+    is encoded exactly once. Deliverables are further outputs of the same run.
+    """
+    input_args, parts = build_timeline_graph(clip_jobs, canvas, fps, work_dir)
+    clip_inputs = input_args.count("-i")
+    has_audio = bool(audio_path)
+    streamed = bool(raster and raster["runs"])
+    layer_graph, vlabel = build_layer_filters(
+        layers,
+        has_audio=has_audio,
+        video_in="[tl]",
+        audio_in=f"[{clip_inputs}:a]",
+        asset_dir=cache_root(work_dir),
+        raster=raster,
+        raster_in=f"[{clip_inputs + (1 if has_audio else 0)}:v]",
+    )
+    if layer_graph:
+        parts.append(layer_graph)
+    delivery: List[str] = []
+    if deliverables:
+        split, labels = deliverable_split(vlabel, deliverables, "[vmain]")
+        parts += split
+        vlabel = labels.pop()  # type: ignore[assignment]
+        for item, label in zip(deliverables, labels):
+            delivery += deliverable_args(item, label, f"{clip_inputs}:a" if has_audio else None)
+    script_path = os.path.join(work_dir, "single_pass.filtergraph")
+    with open(script_path, "w", encoding="utf-8") as f:
+        f.write(";\n".join(parts))
+    args = [
+        "-hide_banner",
+        "-y",
+        "-nostats",
+        "-progress",
+        "pipe:1",
+    ]
+    args += input_args
+    if has_audio:
+        args += ["-i", str(audio_path)]
+    if streamed:
+        args += raster_input_args(raster, fps)  # type: ignore[arg-type]
+    args += ["-filter_complex_script", script_path, "-map", vlabel]
+    if has_audio:
+        args += ["-map", f"{clip_inputs}:a"]
+    args += encode_args(encode)
+    if has_audio:
+        args += [
+            "-c:a",
+            "aac",
+            "-b:a",
+            "192k",
+            "-shortest",
+        ]
+    args.append(output_path)
+    args += delivery
+    return run_ffmpeg(args, feed=raster["feed"] if streamed else None)  # type: ignore[index]
+
+
+def raw_frame_bytes(canvas: Tuple[int, int]) -> int:
+    """Size of one yuv420p frame of the canvas."""
+    width, height = canvas
+    return width * height + 2 * ((width + 1) // 2) * ((height + 1) // 2)
+
+
+def accept_stream(server: socket.socket, stop: threading.Event, finished: Optional[threading.Event] = None) -> Optional[socket.socket]:
+    """Wait for ffmpeg to connect to server; None once stop is set or the peer exited without connecting."""
+    while not stop.is_set():
+        # A peer that finished before this accept started has already queued its connection.
+        gone = bool(finished and finished.is_set())
+        try:
+            conn, _addr = server.accept()
+        except socket.timeout:
+            if gone:
+                return None
+            continue
+        conn.settimeout(None)
+        return conn
+    return None
+
+
+def put_frame(q: "queue.Queue[Any]", item: Any, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def get_frame(q: "queue.Queue[Any]", stop: threading.Event) -> Any:
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+    return None
+
+
+class TimelineStream:
+    """Serve the timeline to one ffmpeg input as raw canvas frames, without segment files.
+
+    Each clip is decoded by its own ffmpeg (at most `workers` at a time, in
+    timeline order) that sends yuv420p frames over a loopback socket into a
+    bounded queue; a full queue stops reading the socket, which blocks that
+    ffmpeg until the composite catches up. Gaps are black frames made here.
+    The composite reads the concatenated frames from another loopback socket,
+    leaving its stdin to the raster overlay; sockets, unlike named pipes,
+    also work on Windows. Every unit delivers exactly its frame count, so a
+    producer that ends a frame early or late cannot shift later clips.
+    """
+
+    def __init__(
+        self,
+        sources: List[Tuple[int, Optional[List[str]]]],
+        canvas: Tuple[int, int],
+        fps: float,
+        workers: int,
+        buffer_mb: int,
+    ) -> None:
+        # sources: (frames, ffmpeg input args, or None for black) in timeline order.
+        self.sources = sources
+        self.canvas = canvas
+        self.fps = fps
+        self.workers = max(1, workers)
+        self.frame_size = raw_frame_bytes(canvas)
+        self.depth = max(2, buffer_mb * 1024 * 1024 // (self.frame_size * (self.workers + 1)))
+        self.stop = threading.Event()
+        self.errors: List[BaseException] = []
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.server.settimeout(0.5)
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"tcp://127.0.0.1:{self.server.getsockname()[1]}"
+
+    def input_format(self) -> List[str]:
+        width, height = self.canvas
+        return ["-f", "rawvideo", "-pix_fmt", "yuv420p", "-s", f"{width}x{height}", "-framerate", f"{self.fps:g}"]
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def close(self) -> Optional[BaseException]:
+        """Stop producers and return the first error that cut the stream short."""
+        self.stop.set()
+        if self.thread:
+            self.thread.join()
+        self.server.close()
+        return self.errors[0] if self.errors else None
+
+    def produce(self, args: List[str], q: "queue.Queue[Any]", consumed: threading.Event) -> None:
+        if self.stop.is_set():
+            return
+        server = socket.create_server(("127.0.0.1", 0))
+        server.settimeout(0.5)
+        port = server.getsockname()[1]
+        finished = threading.Event()
+
+        def drain() -> None:
+            conn = accept_stream(server, self.stop, finished)
+            # Closing the listener resets a connection left unaccepted, so ffmpeg cannot block on it.
+            server.close()
+            if conn is None:
+                return
+            with conn, conn.makefile("rb") as src:
+                while True:
+                    frame = src.read(self.frame_size)
+                    if len(frame) < self.frame_size or not put_frame(q, frame, self.stop):
+                        break
+
+        reader = threading.Thread(target=drain, daemon=True)
+        reader.start()
+        try:
+            code = run_ffmpeg(
+                ["-hide_banner", "-nostats", "-loglevel", "error"]
+                + args
+                + ["-f", "rawvideo", "-pix_fmt", "yuv420p", f"tcp://127.0.0.1:{port}"],
+                with_progress=False,
+            )
+        finally:
+            finished.set()
+            reader.join()
+        put_frame(q, None if code == 0 else RuntimeError(f"Clip stream failed ({code})"), self.stop)
+        # Hold the worker until the unit is sent so finished queues cannot pile up past the buffer.
+        while not (consumed.wait(0.5) or self.stop.is_set()):
+            pass
+
+    def serve(self) -> None:
+        conn = accept_stream(self.server, self.stop)
+        if conn is None:
+            return
+        width, height = self.canvas
+        black = b"\x10" * (width * height) + b"\x80" * (self.frame_size - width * height)
+        units: List[Tuple[int, Optional["queue.Queue[Any]"], threading.Event]] = []
+        try:
+            with conn, ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for frames, args in self.sources:
+                    consumed = threading.Event()
+                    q: Optional["queue.Queue[Any]"] = None
+                    if args is not None:
+                        q = queue.Queue(maxsize=self.depth)
+                        pool.submit(self.produce, args, q, consumed)
+                    units.append((frames, q, consumed))
+                try:
+                    for frames, q, consumed in units:
+                        sent = 0
+                        last = black
+                        while q is not None:
+                            frame = get_frame(q, self.stop)
+                            if isinstance(frame, BaseException):
+                                raise frame
+                            if frame is None:
+                                break
+                            if sent < frames:
+                                conn.sendall(frame)
+                                last = frame
+                                sent += 1
+                        if self.stop.is_set():
+                            break
+                        for _ in range(frames - sent):
+                            conn.sendall(last)
+                        consumed.set()
+                except (BrokenPipeError, ConnectionError):
+                    pass  # the composite stopped reading (-shortest); its exit code tells why
+                finally:
+                    self.stop.set()
+        except Exception as exc:
+            self.errors.append(exc)
+            self.stop.set()
+
+
+def render_streamed(
+    work_dir: str,
+    clip_jobs: List[Dict[str, Any]],
+    audio_path: Optional[str],
+    output_path: str,
+    layers: List[Dict[str, Any]],
+    canvas: Tuple[int, int],
+    fps: float,
+    jobs: int,
+    buffer_mb: int,
+    seg_dir: Optional[str] = None,
+    encode: Optional[Dict[str, Any]] = None,
+    raster: Optional[Dict[str, Any]] = None,
+    final_encode: Optional[Dict[str, Any]] = None,
+    deliverables: Optional[List[Dict[str, Any]]] = None,
+) -> int:
+    """Composite the timeline as it is decoded, streamed through TimelineStream.
+
+    Clips with a cached segment (keyed by encode) decode that instead of the
+    source; nothing new is written to the segment cache or the work dir.
+    """
+    sources: List[Tuple[int, Optional[List[str]]]] = []
+    for kind, duration, idx in timeline_units(clip_jobs):
+        frames = max(1, int(round(duration * fps)))
+        if kind == "gap":
+            sources.append((frames, None))
+            continue
+        clip = clip_jobs[idx]
+        cached = os.path.join(seg_dir, f"{clip_cache_key(clip, canvas, fps, encode)}.mp4") if seg_dir else ""
+        if cached and os.path.isfile(cached):
+            sources.append((frames, ["-i", cached, "-an"]))
+        else:
+            sources.append((frames, clip_source_args(clip, canvas, fps, work_dir)))
+    stream = TimelineStream(sources, canvas, fps, jobs, buffer_mb)
+    stream.start()
+    code = 1
+    try:
+        code = mux_audio_video(
+            stream.url,
+            audio_path,
+            output_path,
+            layers,
+            asset_dir=cache_root(work_dir),
+            raster=raster,
+            fps=fps,
+            encode=final_encode,
+            deliverables=deliverables,
+            video_format=stream.input_format(),
+        )
+    finally:
+        error = stream.close()
+    if code == 0 and error is not None:
+        eprint(f"[renderer] Timeline stream failed: {error}")
+        return 1
+    return code
+
+
+def project_deliverables(project: Dict[str, Any], output_path: str, seconds: float) -> List[Dict[str, Any]]:
+    """Normalize output.deliverables: extra targets encoded from the same composite.
+
+    Each entry may give path (or name, making <output>_<name>.mp4), width
+    and/or height, crop ("1:1", "9:16", ... centred, or {x, y, width, height}
+    in canvas fractions), fps, crf or bitrate, preset, audioBitrate and
+    video/audio flags. The container, and so the codecs, follow the path's
+    extension; .m4a/.mp3/.wav are audio-only, which a project without audio
+    cannot produce (ValueError).
+    """
+    out = project.get("output")
+    items = out.get("deliverables") if isinstance(out, dict) else None
+    root, _ = os.path.splitext(output_path)
+    deliverables: List[Dict[str, Any]] = []
+    for n, item in enumerate(items if isinstance(items, list) else []):
+        if not isinstance(item, dict):
+            continue
+        name = str(item.get("name") or f"deliverable{n + 1}")
+        path = str(item.get("path") or f"{root}_{name}.mp4")
+        vcodec, acodec = DELIVERABLE_CODECS.get(os.path.splitext(path)[1].lower(), ("libx264", "aac"))
+        if item.get("video") is False:
+            vcodec = None
+        if not vcodec and not (project.get("audio") or {}).get("path"):
+            raise ValueError(f"Deliverable {name} is audio-only but the project has no audio")
+        deliverables.append(dict(item, name=name, path=path, videoCodec=vcodec, audioCodec=acodec, seconds=seconds))
+    return deliverables
+
+
+def deliverable_filter(item: Dict[str, Any]) -> str:
+    """Crop, scale and frame-rate chain for one deliverable (null when it matches the canvas)."""
+    chain: List[str] = []
+    crop = item.get("crop")
+    if isinstance(crop, str) and ":" in crop:
+        try:
+            aspect = float(crop.split(":")[0]) / float(crop.split(":")[1])
+        except (ValueError, ZeroDivisionError):
+            aspect = 0.0
+        if aspect > 0:
+            chain.append(f"crop=w='trunc(min(iw,ih*{aspect:.6f})/2)*2':h='trunc(min(ih,iw/{aspect:.6f})/2)*2'")
+    elif isinstance(crop, dict):
+        cx = float(crop.get("x") or 0)
+        cy = float(crop.get("y") or 0)
+        cw = float(crop.get("width") or 1)
+        ch = float(crop.get("height") or 1)
+        chain.append(f"crop=w='trunc(iw*{cw}/2)*2':h='trunc(ih*{ch}/2)*2':x='iw*{cx}':y='ih*{cy}'")
+    width = int(item.get("width") or 0)
+    height = int(item.get("height") or 0)
+    if width or height:
+        chain.append(f"scale=w={width or -2}:h={height or -2}:flags=lanczos")
+    if item.get("fps"):
+        chain.append(f"fps={float(item['fps']):g}")
+    return ",".join(chain) or "null"
+
+
+def deliverable_args(
+    item: Dict[str, Any],
+    video_label: Optional[str],
+    audio_map: Optional[str],
+    copy_video: bool = False,
+) -> List[str]:
+    """Per-output options (maps, codecs, rate control) followed by the deliverable's path.
+
+    copy_video maps video_label (already encoded for this deliverable) as is.
+    """
+    args: List[str] = []
+    vcodec = item["videoCodec"] if video_label else None
+    if vcodec and copy_video:
+        args += ["-map", video_label, "-c:v", "copy"]  # type: ignore[list-item]
+    elif vcodec:
+        args += ["-map", video_label, "-c:v", vcodec]  # type: ignore[list-item]
+        if vcodec == "libx264":
+            args += ["-preset", str(item.get("preset") or "medium")]
+        if item.get("bitrate"):
+            args += ["-b:v", str(item["bitrate"])]
+        else:
+            args += ["-crf", str(item.get("crf") or 23)]
+            if vcodec == "libvpx-vp9":
+                args += ["-b:v", "0"]  # constant quality mode
+        args += ["-pix_fmt", "yuv420p"]
+    else:
+        args += ["-vn"]
+    if audio_map and item.get("audio", True):
+        args += ["-map", audio_map, "-c:a", item["audioCodec"]]
+        if item["audioCodec"] != "pcm_s16le":
+            args += ["-b:a", str(item.get("audioBitrate") or "192k")]
+        args += ["-shortest"] if vcodec else ["-t", f"{item['seconds']:.3f}"]
+    else:
+        args += ["-an"]
+    args.append(item["path"])
+    return args
+
+
+def deliverable_split(source: str, deliverables: List[Dict[str, Any]], keep: Optional[str] = None) -> Tuple[List[str], List[Optional[str]]]:
+    """Fan source out to the video deliverables (and keep, if given, for the main output).
+
+    Returns (filter parts, video label per deliverable, then keep's label last).
+    """
+    wanted = [n for n, d in enumerate(deliverables) if d["videoCodec"]]
+    labels: List[Optional[str]] = [None] * len(deliverables)
+    outs = [f"[dv{n}]" for n in wanted] + ([keep] if keep else [])
+    if not outs:
+        return [], labels + ([None] if keep else [])
+    parts = [f"{source}split={len(outs)}" + "".join(outs) if len(outs) > 1 else f"{source}null{outs[0]}"]
+    for n in wanted:
+        parts.append(f"[dv{n}]{deliverable_filter(deliverables[n])}[do{n}]")
+        labels[n] = f"[do{n}]"
+    return parts, labels + ([keep] if keep else [])
+
+
+def deliverable_identity(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Settings that shape a deliverable's picture and codec (not where it is written)."""
+    ident = {k: v for k, v in item.items() if k not in ("name", "path", "seconds")}
+    ident["ext"] = os.path.splitext(str(item["path"]))[1].lower()
+    return ident
+
+
+def stitch_deliverables(
+    work_dir: str,
+    chunk_paths: Dict[int, List[str]],
+    audio_path: Optional[str],
+    deliverables: List[Dict[str, Any]],
+) -> int:
+    """Join each video deliverable's composited chunks by copy and add the source audio.
+
+    chunk_paths maps a deliverable's index to its chunks in order; audio-only
+    deliverables are encoded from audio_path itself, so nothing is decoded
+    from the main output.
+    """
+    if not deliverables:
+        return 0
+    args = ["-hide_banner", "-y", "-nostats", "-progress", "pipe:1"]
+    inputs: Dict[int, int] = {}
+    for n, paths in sorted(chunk_paths.items()):
+        list_path = os.path.join(work_dir, f"deliverable_{n}.txt")
+        write_concat_list([(p, None) for p in paths], list_path)
+        inputs[n] = len(inputs)
+        args += ["-safe", "0", "-f", "concat", "-i", list_path]
+    if audio_path:
+        args += ["-i", audio_path]
+    audio_map = f"{len(inputs)}:a" if audio_path else None
+    for n, item in enumerate(deliverables):
+        video = f"{inputs[n]}:v" if n in inputs else None
+        args += deliverable_args(item, video, audio_map, copy_video=True)
+    print(f"[renderer] Writing {len(deliverables)} deliverable(s) from the composited chunks")
+    return run_ffmpeg(args)
+
+
+def mux_audio_video(
+    temp_video: str,
+    audio_path: Optional[str],
+    output_path: str,
+    layers: List[Dict[str, Any]],
+    canvas: Optional[Tuple[int, int]] = None,
+    asset_dir: Optional[str] = None,
+    raster: Optional[Dict[str, Any]] = None,
+    fps: float = DEFAULT_FPS,
+    encode: Optional[Dict[str, Any]] = None,
+    deliverables: Optional[List[Dict[str, Any]]] = None,
+    video_format: Optional[List[str]] = None,
+) -> int:
+    """Composite layers over temp_video and add the audio.
+
+    encode overrides the layer re-encode settings (draft renders); by default
+    libx264 runs at its own preset. deliverables (from project_deliverables)
+    are split off the same composite and encoded as extra outputs of this run.
+    video_format gives demuxer options for a raw temp_video stream, which is
+    always encoded.
+    """
+    has_audio = bool(audio_path)
+    streamed = bool(raster and raster["runs"])
+    raster_in = f"[{2 if has_audio else 1}:v]"
+    filter_complex, vlabel = build_layer_filters(
+        layers,
+        has_audio=has_audio,
+        canvas=canvas,
+        asset_dir=asset_dir,
+        raster=raster,
+        raster_in=raster_in,
+    )
+    args = [
+        "-hide_banner",
+        "-y",
+        "-nostats",
+        "-progress",
+        "pipe:1",
     ]
+    args += video_format or []
+    args += ["-i", temp_video]
     if has_audio:
         args += ["-i", audio_path]
-    if filter_complex:
+    if streamed:
+        args += raster_input_args(raster, fps)  # type: ignore[arg-type]
+    delivery: List[str] = []
+    if deliverables:
+        # The main output keeps a split branch only when it is composited.
+        parts, labels = deliverable_split(vlabel if filter_complex else "[0:v]", deliverables, "[vmain]" if filter_complex else None)
+        if filter_complex:
+            vlabel = labels.pop()
+        filter_complex = ";".join(([filter_complex] if filter_complex else []) + parts) or None
+        for item, label in zip(deliverables, labels):
+            delivery += deliverable_args(item, label, "1:a" if has_audio else None)
+    if filter_complex and vlabel != "[0:v]":
         args += ["-filter_complex", filter_complex, "-map", vlabel]
         if has_audio:
             args += ["-map", "1:a"]
     else:
+        if filter_complex:
+            args += ["-filter_complex", filter_complex]
         args += ["-map", "0:v"]
         if has_audio:
             args += ["-map", "1:a"]
-    args += [
-        "-c:v",
-        "libx264",
-        "-pix_fmt",
-        "yuv420p",
-    ]
+    composited = vlabel != "[0:v]" or bool(video_format)
+    if composited and encode:
+        args += encode_args(encode)
+    elif composited:
+        args += [
+            "-c:v",
+            "libx264",
+            "-pix_fmt",
+            "yuv420p",
+        ]
+    else:
+        # Segments are already normalized to the canvas; nothing to composite.
+        args += ["-c:v", "copy"]
     if has_audio:
         args += [
             "-c:a",
@@ -371,293 +2070,2719 @@ def mux_audio_video(temp_video: str, audio_path: Optional[str], output_path: str
             "-shortest",
         ]
     args.append(output_path)
-    return run_ffmpeg(args)
-
+    args += delivery
+    return run_ffmpeg(args, feed=raster["feed"] if streamed else None)  # type: ignore[index]
 
-def hex_to_rgb(color: str) -> str:
-    if not color:
-        return "0xFFFFFF"
-    c = color.strip()
-    if c.startswith("#"):
-        c = c[1:]
-    if len(c) == 3:
-        c = "".join([ch * 2 for ch in c])
-    if len(c) != 6:
-        return "0xFFFFFF"
-    return "0x" + c.upper()
 
+def video_keyframes(path: str, span: Optional[Tuple[float, float]] = None) -> Tuple[List[float], Optional[float]]:
+    """Return (keyframe times, duration) of the first video stream, from packet flags.
 
-def parse_hex_color(color: str) -> Tuple[int, int, int]:
-    if not color:
-        return (255, 255, 255)
-    c = color.strip()
-    if c.startswith("#"):
-        c = c[1:]
-    if len(c) == 3:
-        c = "".join([ch * 2 for ch in c])
-    if len(c) != 6:
-        return (255, 255, 255)
+    span limits the packet scan to (start, end) seconds of the file.
+    """
+    exe = ffprobe_exe()
+    interval = ["-read_intervals", f"{span[0]:.3f}%{span[1]:.3f}"] if span else []
     try:
-        r = int(c[0:2], 16)
-        g = int(c[2:4], 16)
-        b = int(c[4:6], 16)
-        return (r, g, b)
+        proc = subprocess.run([
+            exe,
+            "-v",
+            "error",
+            "-select_streams",
+            "v:0",
+        ] + interval + [
+            "-show_entries",
+            "packet=pts_time,flags:format=duration",
+            "-of",
+            "json",
+            path,
+        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+        data = json.loads(proc.stdout or "{}")
     except Exception:
-        return (255, 255, 255)
+        return [], None
+    times: List[float] = []
+    for pkt in data.get("packets") or []:
+        if "K" not in str(pkt.get("flags") or ""):
+            continue
+        try:
+            times.append(float(pkt["pts_time"]))
+        except (KeyError, TypeError, ValueError):
+            continue
+    try:
+        duration: Optional[float] = float((data.get("format") or {})["duration"])
+    except (KeyError, TypeError, ValueError):
+        duration = None
+    return sorted(times), duration
+
+
+def plan_chunks(keyframes: List[float], total: float, count: int, fps: float) -> List[Tuple[float, float]]:
+    """Split [0, total) into at most count (start, end) spans that begin on keyframes.
+
+    Boundaries are snapped to the frame grid, so chunks butt together exactly
+    and each can start decoding at its own keyframe.
+    """
+    frame_total = int(round(total * fps))
+    starts = [0]
+    key_frames = sorted({int(round(t * fps)) for t in keyframes if 0 < t * fps < frame_total})
+    for n in range(1, count):
+        target = n * frame_total / count
+        later = [k for k in key_frames if k > starts[-1]]
+        if not later:
+            break
+        starts.append(min(later, key=lambda k: abs(k - target)))
+    starts = sorted(set(starts))
+    bounds = starts + [frame_total]
+    return [(a / fps, b / fps) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+def render_layer_chunk(
+    work_dir: str,
+    video: str,
+    audio_path: Optional[str],
+    layers: List[Dict[str, Any]],
+    span: Tuple[float, float],
+    idx: int,
+    fps: float,
+    raster: Optional[Dict[str, Any]] = None,
+    threads: int = 0,
+    encode: Optional[Dict[str, Any]] = None,
+    deliverables: Optional[List[Dict[str, Any]]] = None,
+    main: bool = True,
+) -> str:
+    """Composite layers over one time span of the canvas video (no audio out).
+
+    The audio input is seeked with the video so filter-drawn spectrographs
+    see the same samples, and the raster stream starts at the span's frame.
+    The video deliverables given (with path set to their chunk file) are
+    split off the same composite; main=False skips the main chunk and
+    returns "".
+    """
+    start, end = span
+    out_path = os.path.join(work_dir, f"chunk_{idx:04d}.mp4")
+    has_audio = bool(audio_path)
+    streamed = bool(raster and raster["runs"])
+    filter_complex, vlabel = build_layer_filters(
+        layers,
+        has_audio=has_audio,
+        asset_dir=cache_root(work_dir),
+        raster=raster,
+        raster_in=f"[{2 if has_audio else 1}:v]",
+    )
+    seek = ["-ss", f"{start:.6f}", "-t", f"{end - start:.6f}"]
+    args = [
+        "-hide_banner",
+        "-y",
+        "-nostats",
+        "-progress",
+        "pipe:1",
+    ]
+    args += seek + ["-i", video]
+    if has_audio:
+        args += seek + ["-i", str(audio_path)]
+    if streamed:
+        args += raster_input_args(raster, fps)  # type: ignore[arg-type]
+    main_map = vlabel if filter_complex else "0:v"
+    delivery: List[str] = []
+    if deliverables:
+        keep = "[vmain]" if filter_complex and main else None
+        parts, labels = deliverable_split(vlabel if filter_complex else "[0:v]", deliverables, keep)
+        if keep:
+            main_map = labels.pop()  # type: ignore[assignment]
+        filter_complex = ";".join(([filter_complex] if filter_complex else []) + parts)
+        for item, label in zip(deliverables, labels):
+            if label:
+                delivery += deliverable_args(dict(item, audio=False), label, None)
+    if filter_complex:
+        args += ["-filter_complex", filter_complex]
+    if main:
+        args += ["-map", main_map, "-an"]
+        # Same encoder settings as the single-process mux, plus a thread budget.
+        if encode:
+            args += encode_args(dict(encode, threads=threads))
+        else:
+            args += ["-c:v", "libx264", "-pix_fmt", "yuv420p"]
+            if threads:
+                args += ["-threads", str(threads)]
+        args += ["-video_track_timescale", str(SEGMENT_TIMESCALE), out_path]
+    args += delivery
+    feed = None
+    if streamed:
+        first = int(round(start * fps))
+        frames = int(round((end - start) * fps))
+        feed = lambda stream: raster["feed"](stream, first, frames)  # type: ignore[index]
+    code = run_ffmpeg(args, feed=feed)
+    if code != 0:
+        raise RuntimeError(f"chunk {idx} failed with code {code}")
+    return out_path if main else ""
+
+
+def render_chunked(
+    work_dir: str,
+    video: str,
+    audio_path: Optional[str],
+    output_path: str,
+    layers: List[Dict[str, Any]],
+    fps: float,
+    chunks: int,
+    jobs: int,
+    threads: int,
+    raster: Optional[Dict[str, Any]] = None,
+    encode: Optional[Dict[str, Any]] = None,
+    deliverables: Optional[List[Dict[str, Any]]] = None,
+) -> int:
+    """Time-parallel layer mux: composite keyframe-aligned chunks concurrently,
+    stitch them with stream copy, then mux the audio once.
+
+    Video deliverables are split off each chunk's composite and stitched the
+    same way (stitch_deliverables).
+    """
+    keyframes, total = video_keyframes(video)
+    if not total:
+        eprint("[renderer] Could not read the timeline duration; chunked render unavailable")
+        return mux_audio_video(
+            video,
+            audio_path,
+            output_path,
+            layers,
+            asset_dir=cache_root(work_dir),
+            raster=raster,
+            fps=fps,
+            encode=encode,
+            deliverables=deliverables,
+        )
+    if audio_path:
+        # The mux keeps the shortest stream, so nothing past the audio is needed.
+        info = probe_media(audio_path, probe_cache_dir(work_dir))
+        if info and info.get("duration"):
+            total = min(total, float(info["duration"]))
+    spans = plan_chunks(keyframes, total, chunks, fps)
+    print(f"[renderer] Chunked render: {len(spans)} chunk(s), {jobs} worker(s) x {threads} threads")
+    deliverables = deliverables or []
+    wanted = [n for n, item in enumerate(deliverables) if item["videoCodec"]]
+
+    def chunk_outputs(idx: int) -> List[Dict[str, Any]]:
+        return [
+            dict(deliverables[n], path=os.path.join(work_dir, f"chunk_{idx:04d}_d{n}{os.path.splitext(deliverables[n]['path'])[1]}"))
+            for n in wanted
+        ]
+
+    units: List[Tuple[str, Callable[[], str]]] = [
+        (f"chunk{n}", lambda n=n, span=span: render_layer_chunk(
+            work_dir, video, audio_path, layers, span, n, fps, raster, threads, encode, chunk_outputs(n)
+        ))
+        for n, span in enumerate(spans)
+    ]
+    try:
+        paths = render_segments(units, jobs)
+    except RuntimeError as exc:
+        eprint(f"[renderer] Chunked render failed: {exc}")
+        return 1
+    code, stitched = concat_videos_to_h264(work_dir, [(p, None) for p in paths], name="chunks")
+    if code != 0:
+        return code
+    if not audio_path:
+        os.replace(stitched, output_path)
+    else:
+        code = mux_audio_video(stitched, audio_path, output_path, [])
+        if code != 0:
+            return code
+    outputs = [chunk_outputs(idx) for idx in range(len(spans))]
+    return stitch_deliverables(
+        work_dir, {n: [chunk[m]["path"] for chunk in outputs] for m, n in enumerate(wanted)}, audio_path, deliverables
+    )
+
+
+def layers_identity(layers: List[Dict[str, Any]]) -> List[Any]:
+    """Layer settings plus the identity of files they read (images, fonts)."""
+    ident: List[Any] = []
+    for layer in layers:
+        files = {}
+        image = layer.get("imagePath")
+        if isinstance(image, str) and os.path.isfile(image):
+            files["imagePath"] = file_identity(image)
+        font = font_path(str(layer.get("font") or ""))
+        if font:
+            files["font"] = file_identity(font)
+        ident.append({"layer": layer, "files": files})
+    return ident
+
+
+def layers_read_audio(layers: List[Dict[str, Any]]) -> bool:
+    return any(
+        l.get("type") == "spectrograph" or (l.get("type") == "particles" and l.get("audioResponsive", True))
+        for l in layers
+    )
+
+
+def chunk_grid(total: float, fps: float, chunk_seconds: float) -> List[Tuple[float, float]]:
+    """Fixed frame-aligned spans over [0, total); edits elsewhere never move them."""
+    frame_total = int(round(total * fps))
+    step = max(1, int(round(chunk_seconds * fps)))
+    return [(a / fps, min(a + step, frame_total) / fps) for a in range(0, frame_total, step)]
+
+
+def chunk_cache_key(
+    span: Tuple[float, float],
+    placed: List[Tuple[str, float, float]],
+    context: Dict[str, Any],
+) -> str:
+    """Key of one composited span: the segments under it and everything layered on top."""
+    start, end = span
+    under = [(key, round(at, 6), round(length, 6)) for key, at, length in placed if at < end and at + length > start]
+    return hash_key({
+        "kind": "chunk",
+        "version": CHUNK_CACHE_VERSION,
+        "span": [round(start, 6), round(end, 6)],
+        "segments": under,
+        "context": context,
+    })
+
+
+def render_manifest_path(work_dir: str, output_path: str) -> str:
+    d = os.path.join(cache_root(work_dir), "manifests")
+    os.makedirs(d, exist_ok=True)
+    return os.path.join(d, hash_key({"output": os.path.normcase(os.path.abspath(output_path))}) + ".json")
+
+
+def load_render_manifest(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) and manifest.get("version") == CHUNK_CACHE_VERSION else {}
+
+
+def merge_spans(spans: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    merged: List[Tuple[float, float]] = []
+    for start, end in spans:
+        if merged and abs(merged[-1][1] - start) < 1e-6:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def render_incremental(
+    work_dir: str,
+    audio_path: Optional[str],
+    output_path: str,
+    layers: List[Dict[str, Any]],
+    fps: float,
+    total: float,
+    placed: List[Tuple[str, float, float]],
+    context: Dict[str, Any],
+    canvas_video: Callable[[], Tuple[int, str]],
+    jobs: int,
+    threads: int,
+    chunk_seconds: float = DEFAULT_INCREMENTAL_CHUNK_SECONDS,
+    raster: Optional[Dict[str, Any]] = None,
+    encode: Optional[Dict[str, Any]] = None,
+    journal: Optional[RenderJournal] = None,
+    label: str = "Incremental render",
+    deliverables: Optional[List[Dict[str, Any]]] = None,
+) -> int:
+    """Composite only the grid chunks whose inputs changed, splice the rest by copy.
+
+    placed lists (segment key, timeline start, seconds) for the canvas timeline
+    and context holds everything else a chunk depends on. Chunks are cached by
+    key under <cache root>/chunks; the manifest of the previous render of this
+    output is only used to report which ranges are dirty. canvas_video()
+    builds the segment timeline and is skipped when every chunk is reused.
+    Video deliverables are split off the same composites and cached per chunk
+    beside them.
+    """
+    chunk_dir = os.path.join(cache_root(work_dir), "chunks")
+    os.makedirs(chunk_dir, exist_ok=True)
+    spans = chunk_grid(total, fps, chunk_seconds)
+    keys = [chunk_cache_key(span, placed, context) for span in spans]
+    deliverables = deliverables or []
+    wanted = [m for m, item in enumerate(deliverables) if item["videoCodec"]]
+    dkeys = [
+        [hash_key({"kind": "deliverable-chunk", "chunk": key, "deliverable": deliverable_identity(deliverables[m])}) for m in wanted]
+        for key in keys
+    ]
+    dpaths = [
+        [os.path.join(chunk_dir, dkey + os.path.splitext(deliverables[m]["path"])[1].lower()) for dkey, m in zip(row, wanted)]
+        for row in dkeys
+    ]
+
+    def chunk_ready(path: str, key: str, seconds: float) -> bool:
+        if not os.path.isfile(path) or os.path.getsize(path) == 0:
+            return False
+        return not journal or journal.verify(key, path, seconds)
+
+    def composite(n: int) -> str:
+        seconds = spans[n][1] - spans[n][0]
+        main_path = os.path.join(chunk_dir, f"{keys[n]}.mp4")
+        todo = [i for i in range(len(wanted)) if not chunk_ready(dpaths[n][i], dkeys[n][i], seconds)]
+        if not todo:
+            for path in dpaths[n]:
+                os.utime(path, None)
+            return cached_segment(
+                chunk_dir,
+                keys[n],
+                f"chunk {n}",
+                lambda: render_layer_chunk(work_dir, video, audio_path, layers, spans[n], n, fps, raster, threads, encode),
+                journal,
+                seconds,
+            )
+        need_main = not chunk_ready(main_path, keys[n], seconds)
+        outputs = [
+            dict(deliverables[wanted[i]], path=os.path.join(work_dir, f"chunk_{n:04d}_d{wanted[i]}{os.path.splitext(dpaths[n][i])[1]}"))
+            for i in todo
+        ]
+        produced = render_layer_chunk(work_dir, video, audio_path, layers, spans[n], n, fps, raster, threads, encode, outputs, need_main)
+        for i, item in zip(todo, outputs):
+            move_into_cache(item["path"], dpaths[n][i])
+            if journal:
+                journal.record(dkeys[n][i], dpaths[n][i])
+        if need_main:
+            move_into_cache(produced, main_path)
+            if journal:
+                journal.record(keys[n], main_path)
+        else:
+            os.utime(main_path, None)
+        return main_path
+
+    manifest_path = render_manifest_path(work_dir, output_path)
+    previous = {c.get("key") for c in load_render_manifest(manifest_path).get("chunks") or []}
+    missing = [
+        n
+        for n, key in enumerate(keys)
+        if not chunk_ready(os.path.join(chunk_dir, f"{key}.mp4"), key, spans[n][1] - spans[n][0])
+        or not all(chunk_ready(path, dkey, spans[n][1] - spans[n][0]) for path, dkey in zip(dpaths[n], dkeys[n]))
+    ]
+    changed = [spans[n] for n, key in enumerate(keys) if key not in previous]
+    if previous:
+        ranges = ", ".join(f"{a:.2f}-{b:.2f}s" for a, b in merge_spans(changed)) or "none"
+        print(f"[renderer] Changed since last render: {ranges}")
+    print(f"[renderer] {label}: {len(missing)} of {len(spans)} chunk(s) to composite")
+    video = ""
+    if missing:
+        code, video = canvas_video()
+        if code != 0:
+            return code
+    units: List[Tuple[str, Callable[[], str]]] = [(key, lambda n=n: composite(n)) for n, key in enumerate(keys)]
+    try:
+        paths = render_segments(units, jobs)
+    except RuntimeError as exc:
+        eprint(f"[renderer] Incremental render failed: {exc}")
+        return 1
+    prune_segment_cache(
+        chunk_dir,
+        env_int("vizmatic_CACHE_MAX_MB", DEFAULT_CACHE_MAX_MB) * 1024 * 1024,
+        paths + [path for row in dpaths for path in row],
+    )
+    code, stitched = concat_videos_to_h264(work_dir, [(p, None) for p in paths], name="chunks")
+    if code != 0:
+        return code
+    if audio_path:
+        code = mux_audio_video(stitched, audio_path, output_path, [])
+    else:
+        os.replace(stitched, output_path)
+    if code == 0:
+        chunk_paths = {m: [row[i] for row in dpaths] for i, m in enumerate(wanted)}
+        code = stitch_deliverables(work_dir, chunk_paths, audio_path, deliverables)
+    if code == 0 and journal:
+        journal.compact([k for k, _at, _length in placed] + keys + [dkey for row in dkeys for dkey in row])
+    if code == 0:
+        manifest = {
+            "version": CHUNK_CACHE_VERSION,
+            "output": os.path.abspath(output_path),
+            "chunks": [{"start": a, "end": b, "key": key} for (a, b), key in zip(spans, keys)],
+        }
+        tmp = f"{manifest_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, manifest_path)
+    return code
+
+
+def hex_to_rgb(color: str) -> str:
+    if not color:
+        return "0xFFFFFF"
+    c = color.strip()
+    if c.startswith("#"):
+        c = c[1:]
+    if len(c) == 3:
+        c = "".join([ch * 2 for ch in c])
+    if len(c) != 6:
+        return "0xFFFFFF"
+    return "0x" + c.upper()
+
+
+def parse_hex_color(color: str) -> Tuple[int, int, int]:
+    if not color:
+        return (255, 255, 255)
+    c = color.strip()
+    if c.startswith("#"):
+        c = c[1:]
+    if len(c) == 3:
+        c = "".join([ch * 2 for ch in c])
+    if len(c) != 6:
+        return (255, 255, 255)
+    try:
+        r = int(c[0:2], 16)
+        g = int(c[2:4], 16)
+        b = int(c[4:6], 16)
+        return (r, g, b)
+    except Exception:
+        return (255, 255, 255)
+
+
+def escape_text(txt: str) -> str:
+    return txt.replace("\\", "\\\\").replace(":", "\\:").replace("'", "\\'")
+
+
+def font_key(name: str) -> str:
+    return "".join(ch for ch in name.lower() if ch.isalnum())
+
+
+# Normalized font name -> file under FONT_DIR, scanned once per process.
+_font_index: Optional[Dict[str, str]] = None
+
+
+def font_index() -> Dict[str, str]:
+    global _font_index
+    if _font_index is None:
+        index: Dict[str, str] = {}
+        try:
+            names = sorted(os.listdir(FONT_DIR))
+        except OSError:
+            names = []
+        for name in names:
+            stem, ext = os.path.splitext(name)
+            if ext.lower() in FONT_EXTS:
+                index.setdefault(font_key(stem), os.path.join(FONT_DIR, name))
+        _font_index = index
+    return _font_index
+
+
+def font_path(font: str) -> Optional[str]:
+    """Bundled font file for a layer's font name ("Bowhouse Bold" -> Bowhouse-Bold.otf)."""
+    if not font:
+        return None
+    return font_index().get(font_key(font))
+
+
+def resolve_font_file(font: str) -> Optional[str]:
+    path = font_path(font)
+    if not path:
+        return None
+    normalized = path.replace("\\", "/")
+    return normalized.replace(":", r"\:")
+
+
+def escape_filter_path(path: str) -> str:
+    normalized = path.replace("\\", "/")
+    normalized = normalized.replace(":", r"\:")
+    normalized = normalized.replace("'", r"\'")
+    return normalized
+
+
+def escape_geq_expr(expr: str) -> str:
+    return expr.replace("\\", "\\\\").replace(":", "\\:").replace(",", "\\,")
+
+
+def write_pgm16(path: str, width: int, height: int, values: Any) -> None:
+    """Write 16-bit samples (an array.array or, with NumPy, an ndarray) as a binary PGM."""
+    if np is not None and isinstance(values, np.ndarray):
+        payload = values.astype(">u2").tobytes()  # PGM samples above 255 are big-endian
+    else:
+        data = array.array("H", values)
+        if sys.byteorder == "little":
+            data.byteswap()
+        payload = data.tobytes()
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(f"P5\n{width} {height}\n65535\n".encode("ascii"))
+        f.write(payload)
+    os.replace(tmp, path)
+
+
+def polar_remap_maps(asset_dir: str, width: int, height: int) -> Tuple[str, str]:
+    """Return (xmap, ymap) PGM paths wrapping a WxH strip around a circle.
+
+    Same mapping the geq fallback evaluates per pixel: angle selects the source
+    column, radius the source row; pixels outside the circle point off-image
+    so remap fills them with black.
+    """
+    map_dir = os.path.join(asset_dir, "remap")
+    os.makedirs(map_dir, exist_ok=True)
+    xmap_path = os.path.join(map_dir, f"polar_{width}x{height}_x.pgm")
+    ymap_path = os.path.join(map_dir, f"polar_{width}x{height}_y.pgm")
+    if os.path.isfile(xmap_path) and os.path.isfile(ymap_path):
+        return xmap_path, ymap_path
+    cx, cy = width / 2.0, height / 2.0
+    radius = min(width, height) / 2.0
+    if np is not None:
+        dy, dx = np.mgrid[0:height, 0:width].astype(np.float64)
+        dx -= cx
+        dy -= cy
+        rad = np.hypot(dx, dy)
+        inside = rad <= radius
+        cols = ((np.arctan2(dy, dx) + np.pi) / (2 * np.pi) * width).astype(np.int64)
+        rows = (rad / radius * height).astype(np.int64)
+        write_pgm16(xmap_path, width, height, np.where(inside, np.minimum(width - 1, cols), width))
+        write_pgm16(ymap_path, width, height, np.where(inside, np.minimum(height - 1, rows), height))
+        return xmap_path, ymap_path
+    xs: "array.array[int]" = array.array("H")
+    ys: "array.array[int]" = array.array("H")
+    for py in range(height):
+        dy = py - cy
+        for px in range(width):
+            dx = px - cx
+            rad = math.hypot(dx, dy)
+            if rad <= radius:
+                ang = (math.atan2(dy, dx) + math.pi) / (2 * math.pi) * width
+                xs.append(min(width - 1, int(ang)))
+                ys.append(min(height - 1, int(rad / radius * height)))
+            else:
+                xs.append(width)
+                ys.append(height)
+    write_pgm16(xmap_path, width, height, xs)
+    write_pgm16(ymap_path, width, height, ys)
+    return xmap_path, ymap_path
+
+
+def build_layer_filters(
+    layers: List[Dict[str, Any]],
+    has_audio: bool,
+    canvas: Optional[Tuple[int, int]] = None,
+    video_in: str = "[0:v]",
+    audio_in: str = "[1:a]",
+    asset_dir: Optional[str] = None,
+    raster: Optional[Dict[str, Any]] = None,
+    raster_in: str = "",
+) -> Tuple[Optional[str], str]:
+    """Return (filter_complex, video_label)
+
+    asset_dir holds derived per-geometry assets (e.g. circular remap tables);
+    without it the equivalent per-pixel expressions are used instead.
+    raster (from prepare_raster_layers) replaces the filter chains of the
+    layers it drew with overlays of its runs cropped from raster_in.
+    """
+    if not layers and not canvas:
+        return None, video_in
+
+    filter_parts: List[str] = []
+    current_v = video_in
+    if canvas:
+        cw, ch = canvas
+        filter_parts.append(
+            f"{current_v}scale=w={cw}:h={ch}:force_original_aspect_ratio=decrease,"
+            f"pad=w={cw}:h={ch}:x=(ow-iw)/2:y=(oh-ih)/2:color=black[v0]"
+        )
+        current_v = "[v0]"
+
+    rastered = raster["skip"] if raster else set()
+    run_at: Dict[int, Tuple[int, Dict[str, Any]]] = {}
+    if raster and raster["runs"]:
+        runs = raster["runs"]
+        sources = [raster_in]
+        if len(runs) > 1:
+            sources = [f"[rs{n}]" for n in range(len(runs))]
+            filter_parts.append(f"{raster_in}split={len(runs)}" + "".join(sources))
+        stream_w, stream_h = raster["size"]
+        for n, run in enumerate(runs):
+            if (run["w"], run["h"]) != (stream_w, stream_h):
+                filter_parts.append(f"{sources[n]}crop=w={run['w']}:h={run['h']}:x=0:y={run['offset']}[rl{n}]")
+                sources[n] = f"[rl{n}]"
+            run_at[run["layers"][0]] = (n, dict(run, source=sources[n]))
+
+    spec_layers = [l for i, l in enumerate(layers) if l.get("type") == "spectrograph" and i not in rastered]
+    if spec_layers and has_audio:
+        split = f"{audio_in}asplit={len(spec_layers)}" + "".join([f"[as{idx}]" for idx in range(len(spec_layers))])
+        filter_parts.append(split)
+
+    # Decode chains of image layers -> the labels consuming them; identical
+    # images decode once and split, and every effect gets its own copy.
+    image_uses: Dict[str, List[str]] = {}
+    spec_idx = 0
+    for idx, layer in enumerate(layers):
+        lid = idx + 1
+        if idx in run_at:
+            n, run = run_at[idx]
+            filter_parts.append(
+                f"{current_v}{run['source']}overlay=x={run['x']}:y={run['y']}:format=auto:eof_action=pass[v{lid}]"
+            )
+            current_v = f"[v{lid}]"
+            continue
+        if idx in rastered:
+            continue
+        if layer.get("type") == "spectrograph":
+            if not has_audio:
+                continue
+            mode = layer.get("mode") or "bar"
+            path_mode = layer.get("pathMode") or "straight"
+            x = float(layer.get("x", 0) or 0)
+            y = float(layer.get("y", 0) or 0)
+            spec_tag = f"[spec{idx}]"
+            w = int(layer.get("width") or 640)
+            h = int(layer.get("height") or 200)
+            opacity = float(layer.get("opacity") or 1.0)
+            invert = bool(layer.get("invert"))
+            base_w = w
+            try:
+                if mode == "dots":
+                    base_w = int(layer.get("dotCount") or w)
+                elif mode == "solid":
+                    base_w = int(layer.get("solidPointCount") or w)
+                else:
+                    base_w = int(layer.get("barCount") or w)
+            except Exception:
+                base_w = w
+            if base_w <= 0:
+                base_w = w
+            color_value = layer.get("color") or ""
+            tint = parse_hex_color(color_value) if color_value else None
+            if mode == "line":
+                spec_chain = f"[as{spec_idx}]showfreqs=mode=line:ascale=log:win_size=2048:size={base_w}x{h}"
+            elif mode == "dots":
+                spec_chain = f"[as{spec_idx}]showfreqs=mode=dot:ascale=log:win_size=2048:size={base_w}x{h}"
+            elif mode == "solid":
+                spec_chain = f"[as{spec_idx}]showspectrum=s={base_w}x{h}:mode=combined:color=intensity:scale=log:win_func=hann"
+            else:
+                spec_chain = f"[as{spec_idx}]showfreqs=mode=bar:ascale=log:win_size=2048:size={base_w}x{h}"
+            if base_w != w:
+                spec_chain += f",scale=w={w}:h={h}:flags=neighbor"
+            if mode == "bar":
+                try:
+                    bar_width = float(layer.get("barWidthPct") or 0)
+                except Exception:
+                    bar_width = 0
+                if bar_width and bar_width < 1.0:
+                    narrow_w = max(1, int(w * bar_width))
+                    spec_chain += f",scale=w={narrow_w}:h={h}:flags=neighbor,pad=w={w}:h={h}:x=(ow-iw)/2:y=0:color=black@0"
+            if tint:
+                r, g, b = tint
+                spec_chain += f",format=gray,format=rgb24,lutrgb=r='val*{r}/255':g='val*{g}/255':b='val*{b}/255'"
+            if invert:
+                spec_chain += ",vflip"
+            if opacity < 1.0:
+                spec_chain += f",format=rgba,colorchannelmixer=aa={opacity}"
+            if path_mode == "circular" and asset_dir:
+                xmap, ymap = polar_remap_maps(asset_dir, w, h)
+                pre_tag = f"[specflat{idx}]"
+                filter_parts.append(f"{spec_chain}{pre_tag}")
+                filter_parts.append(f"movie='{escape_filter_path(xmap)}',format=gray16[specmx{idx}]")
+                filter_parts.append(f"movie='{escape_filter_path(ymap)}',format=gray16[specmy{idx}]")
+                spec_chain = f"{pre_tag}[specmx{idx}][specmy{idx}]remap"
+            elif path_mode == "circular":
+                rad = "hypot(X-W/2,Y-H/2)"
+                ang = "(atan2(Y-H/2,X-W/2)+PI)/(2*PI)*W"
+                ry = f"{rad}/(min(W,H)/2)*H"
+                expr = f"if(lte({rad},min(W,H)/2),p({ang},{ry}),0)"
+                expr = escape_geq_expr(expr)
+                spec_chain += f",geq=r='{expr}':g='{expr}':b='{expr}'"
+            filter_parts.append(f"{spec_chain}{spec_tag}")
+            filter_parts.append(
+                f"{current_v}{spec_tag}overlay=x=W*{x}:y=H*{y}:format=auto[v{lid}]"
+            )
+            current_v = f"[v{lid}]"
+            spec_idx += 1
+        elif layer.get("type") == "image":
+            path = layer.get("imagePath")
+            if not path:
+                continue
+            x = float(layer.get("x", 0) or 0)
+            y = float(layer.get("y", 0) or 0)
+            width = int(layer.get("width") or 100)
+            height = int(layer.get("height") or 100)
+            opacity = float(layer.get("opacity") or 1.0)
+            rotate = float(layer.get("rotate") or 0)
+            reverse = bool(layer.get("reverse"))
+            invert = bool(layer.get("invert"))
+            outline_w = int(layer.get("outlineWidth") or 0)
+            outline_color = hex_to_rgb(layer.get("outlineColor") or "#000000")
+            glow_amount = int(layer.get("glowAmount") or 0)
+            glow_opacity = float(layer.get("glowOpacity") or 0.4)
+            glow_color = hex_to_rgb(layer.get("glowColor") or "#000000")
+            shadow_distance = int(layer.get("shadowDistance") or 0)
+            shadow_color = hex_to_rgb(layer.get("shadowColor") or "#000000")
+            step = 0
+            img_path = escape_filter_path(path)
+            # Stills decode once and the overlays repeat their last frame.
+            loop = "" if path.lower().endswith(STILL_IMAGE_EXTS) else ":loop=0"
+            img_chain = f"movie='{img_path}'{loop},scale=w={width}:h={height}:flags=lanczos,format=rgba"
+            if rotate:
+                radians = rotate * 3.14159265 / 180.0
+                img_chain += f",rotate={radians}:fillcolor=black@0"
+            if reverse:
+                img_chain += ",hflip"
+            if invert:
+                img_chain += ",negate"
+            if opacity < 1.0:
+                img_chain += f",colorchannelmixer=aa={opacity}"
+            uses = 1 + (shadow_distance > 0) + (glow_amount > 0) + (outline_w > 0)
+            img_tags = [f"[img{idx}_{n}]" for n in range(uses)]
+            image_uses.setdefault(img_chain, []).extend(img_tags)
+            img_src = iter(img_tags)
+
+            def overlay_with(tag: str, xoff: float = 0.0, yoff: float = 0.0) -> None:
+                nonlocal current_v, step
+                step += 1
+                next_v = f"[v{idx}_{step}]"
+                filter_parts.append(f"{current_v}{tag}overlay=x=W*{x}+{xoff}:y=H*{y}+{yoff}:format=auto:repeatlast=1{next_v}")
+                current_v = next_v
+
+            if shadow_distance > 0:
+                sh_tag = f"[imgsh{idx}]"
+                filter_parts.append(f"{next(img_src)}boxblur=lr={max(1, shadow_distance//2)}:lp=1,colorchannelmixer=aa=0.6{sh_tag}")
+                overlay_with(sh_tag, shadow_distance, shadow_distance)
+            if glow_amount > 0:
+                glow_tag = f"[imggl{idx}]"
+                filter_parts.append(f"{next(img_src)}boxblur=lr={max(1, glow_amount//2)}:lp=1,colorchannelmixer=aa={glow_opacity}{glow_tag}")
+                overlay_with(glow_tag, 0, 0)
+            if outline_w > 0:
+                ol_tag = f"[imgol{idx}]"
+                filter_parts.append(f"{next(img_src)}pad=w=iw+{outline_w*2}:h=ih+{outline_w*2}:x={outline_w}:y={outline_w}:color={outline_color}@1.0{ol_tag}")
+                overlay_with(ol_tag, -outline_w, -outline_w)
+            overlay_with(next(img_src), 0, 0)
+        elif layer.get("type") == "flattened":
+            # Static layers pre-composited by flatten_static_layers: one canvas-sized frame.
+            filter_parts.append(f"movie='{escape_filter_path(layer['imagePath'])}',format=rgba[flat{idx}]")
+            filter_parts.append(f"{current_v}[flat{idx}]overlay=x=0:y=0:format=auto:repeatlast=1[v{lid}]")
+            current_v = f"[v{lid}]"
+        elif layer.get("type") == "text":
+            x = float(layer.get("x", 0) or 0)
+            y = float(layer.get("y", 0) or 0)
+            bitmap = render_text_bitmap(asset_dir, layer) if asset_dir else None
+            if bitmap:
+                png, pad = bitmap
+                filter_parts.append(f"movie='{escape_filter_path(png)}',format=rgba[txt{idx}]")
+                filter_parts.append(
+                    f"{current_v}[txt{idx}]overlay=x=W*{x}-{pad}:y=H*{y}-{pad}:format=auto:repeatlast=1[v{lid}]"
+                )
+            else:
+                filter_parts.append(f"{current_v}{drawtext_filter(layer, f'W*{x}', f'H*{y}')}[v{lid}]")
+            current_v = f"[v{lid}]"
+
+    for chain, tags in image_uses.items():
+        if len(tags) == 1:
+            filter_parts.append(f"{chain}{tags[0]}")
+        else:
+            filter_parts.append(f"{chain},split={len(tags)}" + "".join(tags))
+
+    return ";".join(filter_parts), current_v or video_in
+
+
+def drawtext_filter(layer: Dict[str, Any], x: str, y: str, color: Optional[str] = None) -> str:
+    """drawtext for a text layer at (x, y); color replaces the fill and drops outline/shadow."""
+    text = escape_text(layer.get("text") or "Text")
+    opacity = float(layer.get("opacity") or 1.0)
+    font = escape_text(layer.get("font") or "Segoe UI")
+    fontfile = resolve_font_file(layer.get("font") or "")
+    fontsize = int(layer.get("fontSize") or 12)
+    font_arg = f":fontfile='{fontfile}'" if fontfile else f":font='{font}'"
+    if color:
+        return f"drawtext=text='{text}':fontcolor={color}:fontsize={fontsize}{font_arg}:x={x}:y={y}"
+    color = hex_to_rgb(layer.get("color") or "#ffffff") + f"@{opacity:.3f}"
+    outline_color = hex_to_rgb(layer.get("outlineColor") or "#000000") + f"@{opacity:.3f}"
+    outline_width = max(0, int(layer.get("outlineWidth") or 0))
+    shadow_alpha = max(0.0, min(1.0, opacity * 0.6))
+    shadow_color = hex_to_rgb(layer.get("shadowColor") or "#000000") + f"@{shadow_alpha:.3f}"
+    shadow_distance = int(layer.get("shadowDistance") or 0)
+    return (
+        f"drawtext=text='{text}':fontcolor={color}:fontsize={fontsize}{font_arg}:x={x}:y={y}"
+        f":bordercolor={outline_color}:borderw={outline_width}"
+        f":shadowcolor={shadow_color}:shadowx={shadow_distance}:shadowy={shadow_distance}"
+    )
+
+
+def render_text_bitmap(asset_dir: str, layer: Dict[str, Any]) -> Optional[Tuple[str, int]]:
+    """Draw a text layer (outline, shadow, glow) once into a cached RGBA PNG.
+
+    Returns (png, pad): the text origin sits pad pixels in from the bitmap's
+    top-left corner. None when ffmpeg cannot draw it (e.g. no drawtext).
+    """
+    text = layer.get("text") or "Text"
+    fontsize = int(layer.get("fontSize") or 12)
+    outline_width = max(0, int(layer.get("outlineWidth") or 0))
+    shadow_distance = max(0, int(layer.get("shadowDistance") or 0))
+    glow_amount = max(0, int(layer.get("glowAmount") or 0))
+    glow_opacity = float(layer.get("glowOpacity") or 0.4)
+    glow_color = hex_to_rgb(layer.get("glowColor") or layer.get("color") or "#ffffff")
+    pad = outline_width + max(shadow_distance, glow_amount) + 2
+    lines = text.split("\n")
+    # Generous box: most glyphs are narrower than 1em; the margin stays transparent.
+    width = fontsize * max(len(line) for line in lines) + fontsize + 2 * pad
+    height = int(fontsize * 1.5 * len(lines)) + 2 * pad
+    main = drawtext_filter(layer, str(pad), str(pad))
+    fontfile = font_path(layer.get("font") or "")
+    text_dir = os.path.join(asset_dir, "text")
+    os.makedirs(text_dir, exist_ok=True)
+    key = hash_key({
+        "kind": "text",
+        "version": TEXT_CACHE_VERSION,
+        "drawtext": main,
+        "font": file_identity(fontfile) if fontfile else None,
+        "glow": [glow_amount, glow_opacity, glow_color] if glow_amount else None,
+        "size": [width, height],
+    })
+    out_path = os.path.join(text_dir, f"{key}.png")
+    if os.path.isfile(out_path):
+        return out_path, pad
+    if glow_amount:
+        glow = drawtext_filter(layer, str(pad), str(pad), color=f"{glow_color}@1.0")
+        graph = (
+            f"[0:v]split=2[tb][gb];"
+            f"[gb]{glow},boxblur=lr={max(1, glow_amount // 2)}:lp=1,colorchannelmixer=aa={glow_opacity}[glow];"
+            f"[tb]{main}[txt];[glow][txt]overlay=format=auto,format=rgba[out]"
+        )
+    else:
+        graph = f"[0:v]{main},format=rgba[out]"
+    # Chunk workers (and batch renders sharing the cache) may build the same
+    # bitmap at once; each writes its own temp file.
+    tmp_path = os.path.join(text_dir, f"{key}.{os.getpid()}.{threading.get_ident()}.tmp.png")
+    args = [
+        "-y",
+        "-f",
+        "lavfi",
+        "-i",
+        f"color=c=black@0:s={width}x{height}:r=1,format=rgba",
+        "-filter_complex",
+        graph,
+        "-map",
+        "[out]",
+        "-frames:v",
+        "1",
+        "-c:v",
+        "png",
+        "-f",
+        "image2",
+        "-update",
+        "1",
+        tmp_path,
+    ]
+    if run_ffmpeg(args, with_progress=False) != 0 or not os.path.isfile(tmp_path):
+        return None
+    os.replace(tmp_path, out_path)
+    return out_path, pad
+
+
+def is_static_layer(layer: Dict[str, Any]) -> bool:
+    """Layers whose pixels never change over the render: still images and text."""
+    kind = layer.get("type")
+    if kind == "text":
+        return True
+    path = layer.get("imagePath")
+    return kind == "image" and isinstance(path, str) and path.lower().endswith(STILL_IMAGE_EXTS) and os.path.isfile(path)
+
+
+def render_static_layers(asset_dir: str, run: List[Dict[str, Any]], canvas: Tuple[int, int]) -> Optional[str]:
+    """Composite static layers onto a transparent canvas once; return the cached RGBA PNG."""
+    static_dir = os.path.join(asset_dir, "static")
+    os.makedirs(static_dir, exist_ok=True)
+    key = hash_key({
+        "kind": "static",
+        "version": STATIC_CACHE_VERSION,
+        "layers": layers_identity(run),
+        "canvas": list(canvas),
+    })
+    out_path = os.path.join(static_dir, f"{key}.png")
+    if os.path.isfile(out_path):
+        return out_path
+    cw, ch = canvas
+    filter_complex, v_label = build_layer_filters(run, has_audio=False, asset_dir=asset_dir)
+    tmp_path = os.path.join(static_dir, f"{key}.{os.getpid()}.{threading.get_ident()}.tmp.png")
+    args = [
+        "-y",
+        "-f",
+        "lavfi",
+        "-i",
+        f"color=c=black@0:s={cw}x{ch}:r=1,format=rgba",
+        "-filter_complex",
+        f"{filter_complex};{v_label}format=rgba[flat]",
+        "-map",
+        "[flat]",
+        "-frames:v",
+        "1",
+        "-c:v",
+        "png",
+        "-f",
+        "image2",
+        "-update",
+        "1",
+        tmp_path,
+    ]
+    if run_ffmpeg(args, with_progress=False) != 0 or not os.path.isfile(tmp_path):
+        return None
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def flatten_static_layers(
+    work_dir: str,
+    layers: List[Dict[str, Any]],
+    canvas: Tuple[int, int],
+) -> List[Dict[str, Any]]:
+    """Replace runs of adjacent static layers with one pre-composited overlay.
+
+    A run is flattened when it saves per-frame work: several layers, any
+    text, or image effects (shadow, glow, outline). Runs that fail to render
+    keep their original layers.
+    """
+    flat: List[Dict[str, Any]] = []
+    run: List[Dict[str, Any]] = []
+
+    def flush() -> None:
+        worth = len(run) > 1 or any(
+            l.get("type") == "text" or l.get("shadowDistance") or l.get("glowAmount") or l.get("outlineWidth")
+            for l in run
+        )
+        png = render_static_layers(cache_root(work_dir), run, canvas) if worth else None
+        if png:
+            print(f"[renderer] Flattened {len(run)} static layer(s) into one overlay")
+            flat.append({"type": "flattened", "imagePath": png, "layers": len(run)})
+        else:
+            if worth:
+                eprint("[renderer] Could not flatten static layers; compositing them per frame")
+            flat.extend(run)
+        run.clear()
+
+    for layer in layers:
+        if is_static_layer(layer):
+            run.append(layer)
+            continue
+        if run:
+            flush()
+        flat.append(layer)
+    if run:
+        flush()
+    return flat
+
+
+# In-process memo of probe summaries keyed by probe_key().
+_probe_memo: Dict[str, Dict[str, Any]] = {}
+_probe_lock = threading.Lock()
+
+
+def probe_cache_dir(work_dir: str) -> str:
+    d = os.environ.get("vizmatic_PROBE_CACHE") or os.path.join(cache_root(work_dir), "probe")
+    os.makedirs(d, exist_ok=True)
+    return d
+
+
+def probe_key(path: str) -> str:
+    """Key on path+size+mtime; mirrored by electron's mediaLibrary:probe."""
+    ident = file_identity(path)
+    blob = f"{ident['path']}|{ident['size']}|{ident['mtime']}"
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def parse_rate(value: Any) -> Optional[float]:
+    try:
+        num, _, den = str(value).partition("/")
+        rate = float(num) / float(den or 1)
+        return rate if rate > 0 else None
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def summarize_probe(data: Dict[str, Any]) -> Dict[str, Any]:
+    fmt = data.get("format") or {}
+    streams = data.get("streams") or []
+    video = next((st for st in streams if st.get("codec_type") == "video"), None)
+    audio = next((st for st in streams if st.get("codec_type") == "audio"), None)
+    info: Dict[str, Any] = {"duration": None}
+    for source in (fmt, video or {}, audio or {}):
+        try:
+            info["duration"] = float(source["duration"])
+            break
+        except (KeyError, TypeError, ValueError):
+            continue
+    if video:
+        info.update({
+            "width": video.get("width"),
+            "height": video.get("height"),
+            "fps": parse_rate(video.get("avg_frame_rate")) or parse_rate(video.get("r_frame_rate")),
+            "videoCodec": video.get("codec_name"),
+            "pixFmt": video.get("pix_fmt"),
+            "profile": video.get("profile"),
+            "timeBase": video.get("time_base"),
+        })
+        keyframes: List[float] = []
+        for pkt in data.get("packets") or []:
+            if pkt.get("stream_index") != video.get("index") or "K" not in str(pkt.get("flags") or ""):
+                continue
+            try:
+                keyframes.append(float(pkt["pts_time"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+        if len(keyframes) >= 2:
+            info["keyframeInterval"] = (keyframes[-1] - keyframes[0]) / (len(keyframes) - 1)
+    if audio:
+        info.update({
+            "audioCodec": audio.get("codec_name"),
+            "audioChannels": audio.get("channels"),
+            "sampleRate": int(audio["sample_rate"]) if str(audio.get("sample_rate") or "").isdigit() else None,
+        })
+    return info
+
+
+def run_probe(path: str) -> Optional[Dict[str, Any]]:
+    """One ffprobe spawn: format, streams and the first 10s of packet flags."""
+    exe = ffprobe_exe()
+    try:
+        proc = subprocess.run([
+            exe,
+            "-v",
+            "error",
+            "-print_format",
+            "json",
+            "-show_format",
+            "-show_streams",
+            "-show_entries",
+            "packet=stream_index,pts_time,flags",
+            "-read_intervals",
+            "%+10",
+            path,
+        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+        return summarize_probe(json.loads(proc.stdout or "{}"))
+    except Exception:
+        return None
+
+
+def probe_media(path: str, cache_dir: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Return the probe summary for path from memory, disk cache or ffprobe."""
+    try:
+        key = probe_key(path)
+    except OSError:
+        return None
+    with _probe_lock:
+        if key in _probe_memo:
+            return _probe_memo[key]
+    cache_path = os.path.join(cache_dir, f"{key}.json") if cache_dir else None
+    info: Optional[Dict[str, Any]] = None
+    if cache_path and os.path.isfile(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("version") == PROBE_CACHE_VERSION:
+                info = cached
+        except (OSError, ValueError):
+            info = None
+    if info is None:
+        info = run_probe(path)
+        if info is None:
+            return None
+        ident = file_identity(path)
+        info.update({"version": PROBE_CACHE_VERSION, "path": ident["path"], "size": ident["size"], "mtimeNs": ident["mtime"]})
+        if cache_path:
+            tmp = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(info, f)
+                os.replace(tmp, cache_path)
+            except OSError:
+                pass
+    with _probe_lock:
+        _probe_memo[key] = info
+    return info
+
+
+def probe_cached(path: str, cache_dir: Optional[str], kind: str, compute: Callable[[], Any]) -> Any:
+    """Memoize a probe beyond the summary as <probe cache>/<probe key>.<kind>.json.
+
+    The summary entry's format is shared with electron, so extra probes keep
+    their own files under the same source key. Failed probes (None) are not cached.
+    """
+    try:
+        key = f"{probe_key(path)}.{kind}"
+    except OSError:
+        return None
+    with _probe_lock:
+        if key in _probe_memo:
+            return _probe_memo[key]
+    cache_path = os.path.join(cache_dir, f"{key}.json") if cache_dir else None
+    value: Any = None
+    if cache_path and os.path.isfile(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("version") == PROBE_CACHE_VERSION:
+                value = cached.get("value")
+        except (OSError, ValueError, AttributeError):
+            value = None
+    if value is None:
+        value = compute()
+        if value is None:
+            return None
+        if cache_path:
+            tmp = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"version": PROBE_CACHE_VERSION, "value": value}, f)
+                os.replace(tmp, cache_path)
+            except OSError:
+                pass
+    with _probe_lock:
+        _probe_memo[key] = value
+    return value
+
+
+def probe_many(paths: List[str], cache_dir: Optional[str] = None, jobs: int = 8) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Probe each distinct path once, running cache misses concurrently."""
+    unique = list(dict.fromkeys(paths))
+    if len(unique) <= 1 or jobs <= 1:
+        return {p: probe_media(p, cache_dir) for p in unique}
+    with ThreadPoolExecutor(max_workers=min(jobs, len(unique))) as pool:
+        results = list(pool.map(lambda p: probe_media(p, cache_dir), unique))
+    return dict(zip(unique, results))
+
+
+def ffprobe_duration_ms(path: str, cache_dir: Optional[str] = None) -> Optional[int]:
+    info = probe_media(path, cache_dir)
+    sec = info.get("duration") if info else None
+    if sec is None or not (sec >= 0):
+        return None
+    return int(sec * 1000)
+
+
+def layer_number(layer: Dict[str, Any], key: str, default: float, lo: Optional[float] = None, hi: Optional[float] = None) -> float:
+    """Numeric layer field, defaulted and clamped the way the editor normalizes it."""
+    try:
+        value = float(layer.get(key))  # type: ignore[arg-type]
+    except (TypeError, ValueError):
+        value = default
+    if not math.isfinite(value):
+        value = default
+    if lo is not None:
+        value = max(lo, value)
+    if hi is not None:
+        value = min(hi, value)
+    return value
+
+
+def spectrograph_mode(layer: Dict[str, Any]) -> str:
+    if layer.get("vizType") == "dot":
+        return "dots"
+    return str(layer.get("mode") or "bar")
+
+
+def spectrograph_band_count(layer: Dict[str, Any]) -> int:
+    mode = spectrograph_mode(layer)
+    key = "dotCount" if mode == "dots" else "solidPointCount" if mode == "solid" else "barCount"
+    return int(layer_number(layer, key, DEFAULT_BAND_COUNT, lo=8))
+
+
+def analysis_cache_dir(work_dir: str) -> str:
+    d = os.path.join(cache_root(work_dir), "analysis")
+    os.makedirs(d, exist_ok=True)
+    return d
+
+
+def spectrum_settings(layer: Dict[str, Any]) -> Dict[str, Any]:
+    """AnalyserNode parameters; layers that share them share one FFT pass."""
+    fft_size = int(layer_number(layer, "fftSize", DEFAULT_FFT_SIZE))
+    if fft_size not in FFT_SIZES:
+        fft_size = DEFAULT_FFT_SIZE
+    return {
+        "fftSize": fft_size,
+        "smoothing": layer_number(layer, "smoothingTimeConstant", DEFAULT_SMOOTHING, 0.0, 0.99),
+    }
+
+
+def band_settings(layer: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-layer reduction of a spectrum to bands, as the preview samples it."""
+    min_db = layer_number(layer, "minDecibels", -95.0, -140.0, -20.0)
+    max_db = layer_number(layer, "maxDecibels", -10.0, -80.0, 0.0)
+    if max_db <= min_db:
+        max_db = min(0.0, min_db + 1)
+    low_pct = layer_number(layer, "lowCutoffPercent", 0.0, 0.0, 0.95)
+    high_pct = layer_number(layer, "highCutoffPercent", 1.0, 0.05, 1.0)
+    if high_pct <= low_pct:
+        high_pct = min(1.0, low_pct + 0.01)
+    freq_scale = layer.get("freqScale")
+    return {
+        "count": spectrograph_band_count(layer),
+        "freqScale": freq_scale if freq_scale in ("lin", "rlog") else "log",
+        "averaging": max(1, int(round(layer_number(layer, "averaging", 1, lo=1)))),
+        "minDecibels": min_db,
+        "maxDecibels": max_db,
+        "lowCutoffPercent": low_pct,
+        "highCutoffPercent": high_pct,
+        "lowCutHz": layer_number(layer, "lowCutHz", 40.0),
+        "highCutHz": layer_number(layer, "highCutHz", 16000.0),
+    }
+
+
+def spectrum_cache_key(audio_path: str, settings: Dict[str, Any], fps: float, sample_rate: int) -> str:
+    return hash_key({
+        "kind": "spectrum",
+        "version": ANALYSIS_CACHE_VERSION,
+        "source": file_identity(audio_path),
+        "fftSize": settings["fftSize"],
+        "smoothing": settings["smoothing"],
+        "fps": fps,
+        "sampleRate": sample_rate,
+    })
+
+
+def stream_audio_pcm(path: str, sample_rate: int, chunk_samples: int) -> Iterator["np.ndarray"]:
+    """Yield mono float32 PCM chunks decoded by ffmpeg through a pipe."""
+    cmd = [
+        ffmpeg_exe(),
+        "-hide_banner",
+        "-v",
+        "error",
+        "-i",
+        path,
+        "-vn",
+        "-ac",
+        "1",
+        "-ar",
+        str(sample_rate),
+        "-f",
+        "f32le",
+        "pipe:1",
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    assert proc.stdout is not None
+    try:
+        while True:
+            data = proc.stdout.read(chunk_samples * 4)
+            if not data:
+                break
+            usable = len(data) - len(data) % 4
+            if usable:
+                yield np.frombuffer(data[:usable], dtype="<f4")
+    finally:
+        proc.stdout.close()
+        code = proc.wait()
+    if code != 0:
+        raise RuntimeError(f"audio decode failed with code {code}: {path}")
+
+
+def compute_spectrum(
+    audio_path: str,
+    settings: Dict[str, Any],
+    fps: float,
+    sample_rate: int,
+    frame_count: int,
+    dest: str,
+) -> None:
+    """Write smoothed |X|/N magnitudes, one row per output frame, to dest (.npy).
+
+    Matches AnalyserNode: the frame at time t analyses the fftSize samples
+    ending at t under a Blackman window, and smoothing runs once per frame.
+    """
+    n = settings["fftSize"]
+    tau = settings["smoothing"]
+    bins = n // 2
+    phase = 2 * np.pi * np.arange(n) / n
+    window = (0.42 - 0.5 * np.cos(phase) + 0.08 * np.cos(2 * phase)).astype(np.float32)
+    # Window end sample per frame, offset by the n zeros of leading silence.
+    ends = np.round(np.arange(frame_count) * (sample_rate / fps)).astype(np.int64)
+    offsets = np.arange(n)
+    tmp = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+    out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(frame_count, bins))
+    prev = np.zeros(bins, dtype=np.float32)
+    buf = np.zeros(n, dtype=np.float32)
+    base = 0  # padded-stream index of buf[0]
+    k = 0
+
+    def flush(available: int) -> None:
+        nonlocal k, prev
+        ready = k + int(np.searchsorted(ends[k:], available - n, side="right"))
+        if ready <= k:
+            return
+        frames = buf[(ends[k:ready] - base)[:, None] + offsets] * window
+        mags = np.abs(np.fft.rfft(frames, axis=1)[:, :bins]).astype(np.float32) / n
+        for row in range(ready - k):
+            prev = tau * prev + (1 - tau) * mags[row]
+            out[k + row] = prev
+        k = ready
+
+    try:
+        for chunk in stream_audio_pcm(audio_path, sample_rate, sample_rate):
+            buf = np.concatenate([buf, chunk])
+            flush(base + len(buf))
+            if k < frame_count:
+                drop = int(ends[k]) - base
+                buf = buf[drop:]
+                base += drop
+            else:
+                break
+        if k < frame_count:
+            # Trailing frames analyse the tail padded with silence.
+            pad = max(0, int(ends[-1]) + n - base - len(buf))
+            buf = np.concatenate([buf, np.zeros(pad, dtype=np.float32)])
+            flush(base + len(buf))
+        out.flush()
+        # Unmap before renaming; a mapped file cannot be replaced on Windows.
+        out = None
+        os.replace(tmp, dest)
+    except BaseException:
+        out = None
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+# Loaded analysis arrays by path, least recently used first; files are
+# content-addressed, so entries never go stale.
+_analysis_memo: Dict[str, "np.ndarray"] = {}
+_analysis_lock = threading.Lock()
+
+
+def load_analysis_array(path: str) -> "np.ndarray":
+    with _analysis_lock:
+        cached = _analysis_memo.pop(path, None)
+        if cached is None:
+            cached = np.load(path, mmap_mode="r")
+        _analysis_memo[path] = cached
+        while len(_analysis_memo) > ANALYSIS_MEMO_MAX:
+            del _analysis_memo[next(iter(_analysis_memo))]
+    return cached
+
+
+def load_spectrum(
+    work_dir: str,
+    audio_path: str,
+    settings: Dict[str, Any],
+    fps: float,
+    duration: float,
+    sample_rate: int = ANALYSIS_SAMPLE_RATE,
+) -> Tuple[str, "np.ndarray"]:
+    """Return (cache key, memory-mapped spectrum), analysing on a cache miss."""
+    key = spectrum_cache_key(audio_path, settings, fps, sample_rate)
+    path = os.path.join(analysis_cache_dir(work_dir), f"{key}.spectrum.npy")
+    if os.path.isfile(path):
+        os.utime(path, None)
+        print(f"[renderer] Analysis cache hit: fft {settings['fftSize']} ({key[:12]})")
+    else:
+        frames = max(1, int(math.ceil(duration * fps)))
+        print(f"[renderer] Analysing audio: fft {settings['fftSize']}, {frames} frames")
+        compute_spectrum(audio_path, settings, fps, sample_rate, frames, path)
+    return key, load_analysis_array(path)
+
+
+def compute_band_frames(spectrum: "np.ndarray", bands: Dict[str, Any], sample_rate: int, block: int = 4096) -> "np.ndarray":
+    """Reduce spectrum rows to the layer's bands, normalized to 0..1.
+
+    Bins become getByteFrequencyData bytes against the layer's dB range, bins
+    outside lowCutHz..highCutHz are silenced, then bands are picked and
+    averaged exactly as the preview's sampleValue() does.
+    """
+    frame_count, bin_count = spectrum.shape
+    count = bands["count"]
+    low_idx = int((bin_count - 1) * bands["lowCutoffPercent"])
+    high_idx = int((bin_count - 1) * bands["highCutoffPercent"])
+    step = max(1, max(1, high_idx - low_idx + 1) // count)
+    t = np.arange(count) / max(1, count - 1)
+    if bands["freqScale"] == "lin":
+        scaled = np.arange(count)
+    elif bands["freqScale"] == "rlog":
+        scaled = np.floor((1 - (1 - t) ** 2) * (count - 1)).astype(np.int64)
+    else:
+        scaled = np.floor(t ** 2 * (count - 1)).astype(np.int64)
+    half = bands["averaging"] // 2 if bands["averaging"] > 1 else 0
+    taps = np.clip(scaled[:, None] + np.arange(-half, half + 1), 0, count - 1)
+    columns = np.minimum(bin_count - 1, low_idx + taps * step)
+    used, inverse = np.unique(columns, return_inverse=True)
+    inverse = inverse.reshape(columns.shape)
+    freqs = used * (sample_rate / (bin_count * 2))
+    passband = (freqs >= bands["lowCutHz"]) & (freqs <= bands["highCutHz"])
+    min_db = bands["minDecibels"]
+    scale = 255.0 / (bands["maxDecibels"] - min_db)
+    out = np.empty((frame_count, count), dtype=np.float32)
+    with np.errstate(divide="ignore"):
+        for start in range(0, frame_count, block):
+            mags = np.asarray(spectrum[start:start + block, used], dtype=np.float32)
+            db = 20 * np.log10(mags)
+            byte = np.floor(np.clip((db - min_db) * scale, 0, 255))
+            byte[:, ~passband] = 0
+            out[start:start + block] = byte[:, inverse].mean(axis=2) / 255.0
+    return out
+
+
+def load_band_frames(
+    work_dir: str,
+    spectrum_key: str,
+    spectrum: "np.ndarray",
+    bands: Dict[str, Any],
+    sample_rate: int = ANALYSIS_SAMPLE_RATE,
+) -> "np.ndarray":
+    key = hash_key({"kind": "bands", "version": ANALYSIS_CACHE_VERSION, "spectrum": spectrum_key, "bands": bands})
+    path = os.path.join(analysis_cache_dir(work_dir), f"{key}.bands.npy")
+    if not os.path.isfile(path):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, compute_band_frames(spectrum, bands, sample_rate))
+        os.replace(tmp, path)
+    else:
+        os.utime(path, None)
+    return load_analysis_array(path)
+
+
+def analyze_layers(work_dir: str, audio_path: str, layers: List[Dict[str, Any]], fps: float) -> Dict[int, "np.ndarray"]:
+    """Band frames (frames x bands, 0..1) for every spectrograph layer, keyed by layer index.
+
+    Audio is decoded and transformed once per distinct spectrum setting, no
+    matter how many layers use it; both stages are cached across renders.
+    """
+    if np is None:
+        return {}
+    info = probe_media(audio_path, probe_cache_dir(work_dir))
+    duration = info.get("duration") if info else None
+    if not duration or duration <= 0:
+        eprint(f"[renderer] Unknown audio duration; skipping analysis: {audio_path}")
+        return {}
+    spectra: Dict[str, Tuple[str, "np.ndarray"]] = {}
+    results: Dict[int, "np.ndarray"] = {}
+    for idx, layer in enumerate(layers):
+        if layer.get("type") != "spectrograph":
+            continue
+        settings = spectrum_settings(layer)
+        skey = json.dumps(settings, sort_keys=True)
+        if skey not in spectra:
+            spectra[skey] = load_spectrum(work_dir, audio_path, settings, fps, float(duration))
+        spectrum_key, spectrum = spectra[skey]
+        results[idx] = load_band_frames(work_dir, spectrum_key, spectrum, band_settings(layer))
+    return results
+
+
+def compute_energy_frames(spectrum: "np.ndarray", min_db: float, max_db: float, block: int = 4096) -> "np.ndarray":
+    """Mean getByteFrequencyData level per frame (0..1), the preview's audioAmplitude."""
+    scale = 255.0 / (max_db - min_db)
+    out = np.empty(spectrum.shape[0], dtype=np.float32)
+    with np.errstate(divide="ignore"):
+        for start in range(0, spectrum.shape[0], block):
+            db = 20 * np.log10(np.asarray(spectrum[start:start + block], dtype=np.float32))
+            out[start:start + block] = np.floor(np.clip((db - min_db) * scale, 0, 255)).mean(axis=1) / 255.0
+    return out
+
+
+def analyze_energy(work_dir: str, audio_path: str, layers: List[Dict[str, Any]], fps: float) -> Optional["np.ndarray"]:
+    """Per-frame audio energy for audio-responsive layers.
+
+    Like the preview, it is read from the analyser configured by the first
+    spectrograph layer (or the defaults), so it shares that layer's spectrum.
+    """
+    if np is None:
+        return None
+    info = probe_media(audio_path, probe_cache_dir(work_dir))
+    duration = info.get("duration") if info else None
+    if not duration or duration <= 0:
+        return None
+    first = next((l for l in layers if l.get("type") == "spectrograph"), {})
+    spectrum_key, spectrum = load_spectrum(work_dir, audio_path, spectrum_settings(first), fps, float(duration))
+    bands = band_settings(first)
+    key = hash_key({
+        "kind": "energy",
+        "version": ANALYSIS_CACHE_VERSION,
+        "spectrum": spectrum_key,
+        "minDecibels": bands["minDecibels"],
+        "maxDecibels": bands["maxDecibels"],
+    })
+    path = os.path.join(analysis_cache_dir(work_dir), f"{key}.energy.npy")
+    if not os.path.isfile(path):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, compute_energy_frames(spectrum, bands["minDecibels"], bands["maxDecibels"]))
+        os.replace(tmp, path)
+    return load_analysis_array(path)
+
+
+# The preview draws spectrographs on a fixed work canvas and stretches it to the
+# layer box, so pixel-valued settings (gaps, widths, radii) are in these units.
+SPECTRO_WORK_SIZE = (512, 200)
+
+
+def rgb_unit(color: Optional[str], default: str) -> "np.ndarray":
+    return np.array(parse_hex_color(color or default), dtype=np.float32) / 255.0
+
+
+def blur_alpha(alpha: "np.ndarray", sigma: float) -> "np.ndarray":
+    """Approximate a Gaussian (canvas shadowBlur / 2) with three box passes per axis."""
+    radius = int(round((math.sqrt(4 * sigma * sigma + 1) - 1) / 2))
+    if radius <= 0:
+        return alpha
+    width = 2 * radius + 1
+    out = alpha
+    for axis in (0, 1):
+        for _ in range(3):
+            pad = [(0, 0), (0, 0)]
+            pad[axis] = (radius + 1, radius)
+            summed = np.cumsum(np.pad(out, pad), axis=axis, dtype=np.float32)
+            n = out.shape[axis]
+            if axis == 0:
+                out = (summed[width:width + n] - summed[:n]) / width
+            else:
+                out = (summed[:, width:width + n] - summed[:, :n]) / width
+    return out
+
+
+def composite_over(dst: "np.ndarray", src: "np.ndarray") -> None:
+    """Source-over for planar premultiplied RGBA (4, h, w) buffers, in place on dst."""
+    dst *= 1.0 - src[3]
+    dst += src
+
+
+def spectrograph_painter(layer: Dict[str, Any], bands: "np.ndarray", size: Tuple[int, int]) -> Callable[[int], "np.ndarray"]:
+    """Return paint(frame) -> planar premultiplied RGBA at the layer's pixel size.
+
+    Shapes, colours and mirroring follow the preview's canvas drawing; buffers
+    and per-pixel lookup tables are built once and reused for every frame.
+    """
+    w, h = size
+    ww, wh = SPECTRO_WORK_SIZE
+    mode = spectrograph_mode(layer)
+    count = bands.shape[1]
+    layout = layer.get("layout") or ("circle" if layer.get("pathMode") == "circular" else "straight")
+    circular = layout == "circle"
+    invert = bool(layer.get("invert"))
+    bar_w = ww / count
+    bar_pct = layer_number(layer, "barWidthPct", 0.8) if mode in ("bar", "solid") else 0.6
+    min_bar = layer_number(layer, "minBarHeight", 2.0)
+    intensity = layer_number(layer, "intensity", 1.1)
+    curve = max(0.2, layer_number(layer, "responseCurve", 0.9))
+    amp_scale = layer.get("ampScale") or "log"
+
+    def scale_amp(v: "np.ndarray") -> "np.ndarray":
+        if amp_scale == "lin":
+            return v
+        curved = np.maximum(0.0, v) ** curve
+        if amp_scale == "sqrt":
+            return np.sqrt(curved)
+        if amp_scale == "cbrt":
+            return np.cbrt(curved)
+        return np.log10(1 + 9 * curved)
+
+    u = ((np.arange(w) + 0.5) * (ww / w)).astype(np.float32)
+    v = ((np.arange(h) + 0.5) * (wh / h)).astype(np.float32)
+    cy = wh / 2 + layer_number(layer, "centerYOffset", 0.0) * wh
+    if (layer.get("colorMode") or "gradient") == "solid":
+        fill = rgb_unit(layer.get("primaryColor") or layer.get("color"), "#66f0ff")[:, None, None]
+    else:
+        # Gradient runs down the work canvas; the circle is drawn translated to its centre.
+        t = np.clip((v - cy) / wh if circular else v / wh, 0.0, 1.0)[None, :, None]
+        primary = rgb_unit(layer.get("primaryColor"), "#66f0ff")[:, None, None]
+        secondary = rgb_unit(layer.get("secondaryColor"), "#6e4dff")[:, None, None]
+        fill = (primary + (secondary - primary) * t).astype(np.float32)
+    fill_alpha = 1.0
+    if mode == "solid" and not circular:
+        fill_alpha = layer_number(layer, "solidFillAlpha", 0.35, 0.05, 1.0)
+    background: Optional[Tuple["np.ndarray", float]] = None
+    if not circular:
+        background = (rgb_unit(layer.get("backgroundColor"), "#050816")[:, None, None], layer_number(layer, "trailAlpha", 0.35, 0.0, 1.0))
+
+    out = np.empty((4, h, w), dtype=np.float32)
+    mask = np.empty((h, w), dtype=bool)
+    rows = v[:, None]
+
+    if circular:
+        radius = min(ww, wh) / 2
+        draw_r = max(8.0, radius - max(layer_number(layer, "paddingX", 24.0), layer_number(layer, "paddingY", 22.0)))
+        inner_r = draw_r * layer_number(layer, "baseRadiusRatio", 0.22)
+        step = 2 * math.pi / count
+        thickness = step * bar_pct
+        dx = u[None, :] - ww / 2
+        dy = v[:, None] - cy
+        dist = np.hypot(dx, dy)
+        rel = np.mod(np.arctan2(dy, dx) + math.pi / 2 - layer_number(layer, "radialSpin", 0.0) * 2 * math.pi, 2 * math.pi)
+        if mode in ("bar", "solid"):
+            seg = np.minimum(count - 1, (rel // step).astype(np.int64))
+            in_angle = (rel - seg * step) <= thickness
+        else:
+            seg = np.mod(np.round((rel - thickness / 2) / step).astype(np.int64), count)
+            off = np.mod(rel - (seg * step + thickness / 2) + math.pi, 2 * math.pi) - math.pi
+            along = dist * np.cos(off)
+            perp = dist * np.abs(np.sin(off))
+        line_half = max(1.0, radius * 0.01 * bar_pct) / 2
+        dot_r = max(2.0, radius * 0.015 * bar_pct)
+
+        def shape(values: "np.ndarray") -> None:
+            mag = np.maximum(min_bar, scale_amp(values) * intensity * (draw_r - inner_r))
+            if mode in ("bar", "solid"):
+                np.logical_and(in_angle, dist >= inner_r, out=mask)
+                mask[...] &= dist <= (inner_r + mag)[seg]
+            elif mode == "line":
+                np.logical_and(perp <= line_half, along >= inner_r, out=mask)
+                mask[...] &= along <= (inner_r + mag)[seg]
+            else:
+                outer = np.full(count, inner_r) if invert else inner_r + mag
+                np.less_equal(perp * perp + (along - outer[seg]) ** 2, dot_r * dot_r, out=mask)
+    else:
+        xs = np.arange(count) * bar_w + bar_w / 2
+        if mode in ("bar", "solid"):
+            bar_width = max(1.0, bar_w * (1.0 if mode == "solid" else bar_pct) * layer_number(layer, "barWidthScale", 1.0) - layer_number(layer, "barGap", 2.0))
+            first = np.minimum(count - 1, (u // bar_w).astype(np.int64))
+            # Wide bars can spill over their neighbours; test every bar that may reach a column.
+            reach = []
+            for back in range(int(math.ceil(bar_width / bar_w))):
+                idx = first - back
+                covered = (idx >= 0) & (u - idx * bar_w < bar_width)
+                reach.append((np.maximum(idx, 0), covered))
+        elif mode == "line":
+            seg = np.clip(((u - xs[0]) // bar_w).astype(np.int64), 0, count - 2)
+            frac = (u - xs[seg]) / bar_w
+            on_line = (u >= xs[0]) & (u <= xs[-1])
+            line_half = max(0.5, layer_number(layer, "lineWidth", 2.0)) / 2
+        else:
+            near = np.clip(np.round((u - xs[0]) / bar_w).astype(np.int64), 0, count - 1)
+            neighbours = [np.clip(near + o, 0, count - 1) for o in (-1, 0, 1)]
+            dot_r = max(1.0, layer_number(layer, "dotSize", 3.0))
+
+        def shape(values: "np.ndarray") -> None:
+            heights = np.maximum(min_bar, np.floor(scale_amp(values) * intensity * wh))
+            tops = heights if invert else wh - heights
+            if mode in ("bar", "solid"):
+                mask.fill(False)
+                for idx, covered in reach:
+                    if invert:
+                        mask[...] |= covered[None, :] & (rows < heights[idx][None, :])
+                    else:
+                        mask[...] |= covered[None, :] & (rows >= tops[idx][None, :])
+            elif mode == "line":
+                y0 = tops[seg]
+                slope = (tops[seg + 1] - y0) / bar_w
+                centre = y0 + (tops[seg + 1] - y0) * frac
+                reach_y = line_half * np.sqrt(1 + slope * slope)
+                np.less_equal(np.abs(rows - centre[None, :]), reach_y[None, :], out=mask)
+                mask[...] &= on_line[None, :]
+            else:
+                mask.fill(False)
+                for idx in neighbours:
+                    mask[...] |= (u - xs[idx])[None, :] ** 2 + (rows - tops[idx][None, :]) ** 2 <= dot_r * dot_r
+
+    mirror_x = bool(layer["mirror"]) if isinstance(layer.get("mirror"), bool) else bool(layer.get("mirrorX"))
+    mirror_y = bool(layer.get("mirrorY"))
+    half_w, half_h = w // 2, h // 2
+    last = bands.shape[0] - 1
+
+    def paint(frame: int) -> "np.ndarray":
+        shape(np.asarray(bands[min(frame, last)], dtype=np.float32))
+        coverage = out[3]
+        np.multiply(mask, np.float32(fill_alpha), out=coverage)
+        np.multiply(fill, coverage, out=out[:3])
+        if background is not None:
+            bg_rgb, bg_alpha = background
+            under = (1.0 - coverage) * bg_alpha
+            out[:3] += bg_rgb * under
+            coverage += under
+        if mirror_y and half_h:
+            out[:, h - half_h:] = out[:, :half_h][:, ::-1]
+        if mirror_x and half_w:
+            out[:, :, w - half_w:] = out[:, :, :half_w][:, :, ::-1]
+        return out
+
+    return paint
+
+
+def particles_painter(
+    layer: Dict[str, Any],
+    size: Tuple[int, int],
+    fps: float,
+    frame_count: int,
+    seed: int,
+    energy: Optional["np.ndarray"] = None,
+) -> Callable[[int], "np.ndarray"]:
+    """Return paint(frame) -> planar premultiplied RGBA for a particles layer.
+
+    Particles are seeded deterministically and kept as struct-of-arrays. Each
+    particle moves at a constant velocity scaled by (1 + energy), so its
+    position at any frame is x0 + v * (frames + cumulative energy), wrapped
+    to the layer box: one vectorized step per frame, and any frame can be
+    rendered without simulating the ones before it.
+    """
+    w, h = size
+    count = max(10, int(round(layer_number(layer, "particleCount", 200))))
+    direction = math.radians(layer_number(layer, "direction", 0.0))
+    base_speed = max(1.0, layer_number(layer, "speed", 60.0))
+    size_min = max(1.0, layer_number(layer, "sizeMin", 2.0))
+    size_max = max(size_min, layer_number(layer, "sizeMax", 6.0))
+    opacity_min = layer_number(layer, "opacityMin", 0.3, 0.0, 1.0)
+    opacity_max = max(opacity_min, layer_number(layer, "opacityMax", 0.9, 0.0, 1.0))
+    rng = np.random.default_rng(seed)
+    x0 = rng.random(count) * w
+    y0 = rng.random(count) * h
+    radius = (size_min + rng.random(count) * (size_max - size_min)).astype(np.float32)
+    alpha = (opacity_min + rng.random(count) * (opacity_max - opacity_min)).astype(np.float32)
+    heading = direction + (rng.random(count) - 0.5) * (math.pi / 6)
+    step = base_speed * (0.7 + rng.random(count) * 0.6) / fps
+    vx = np.cos(heading) * step
+    vy = np.sin(heading) * step
+    # travel[k]: frames of base-speed motion accumulated by frame k.
+    travel = np.arange(max(1, frame_count), dtype=np.float64)
+    if energy is not None and layer.get("audioResponsive", True) and len(energy) > 1:
+        boost = np.zeros(len(travel), dtype=np.float64)
+        n = min(len(travel), len(energy))
+        boost[1:n] = np.asarray(energy[1:n], dtype=np.float64)
+        travel += np.cumsum(boost)
+    colour = rgb_unit(layer.get("color"), "#7ea5ff")[:, None, None]
+    # Discs are splatted through per-size stamps of pixel offsets into a
+    # padded index space, so stamps at the edges need no bounds checks.
+    reach = np.ceil(radius + 0.5).astype(np.int64)
+    pad = int(reach.max())
+    pw, ph = w + 2 * pad, h + 2 * pad
+    stamps = []
+    for r in np.unique(reach):
+        oy, ox = np.mgrid[-r:r + 1, -r:r + 1]
+        # Drop stamp corners no disc of this reach can touch from anywhere in its base pixel.
+        near_x = np.maximum(0, np.maximum(ox - 0.5, -ox - 0.5))
+        near_y = np.maximum(0, np.maximum(oy - 0.5, -oy - 0.5))
+        used = np.hypot(near_x, near_y) < r
+        stamps.append((
+            np.flatnonzero(reach == r),
+            (oy * pw + ox)[used],
+            (ox[used] + 0.5).astype(np.float32),
+            (oy[used] + 0.5).astype(np.float32),
+        ))
+    out = np.empty((4, h, w), dtype=np.float32)
+
+    def paint(frame: int) -> "np.ndarray":
+        t = travel[min(frame, len(travel) - 1)]
+        xs = np.mod(x0 + vx * t, w)
+        ys = np.mod(y0 + vy * t, h)
+        fx = np.floor(xs)
+        fy = np.floor(ys)
+        base = (fy.astype(np.int64) + pad) * pw + fx.astype(np.int64) + pad
+        rx = (xs - fx).astype(np.float32)
+        ry = (ys - fy).astype(np.float32)
+        indices = []
+        weights = []
+        for members, offsets, ox, oy in stamps:
+            # Visit discs in memory order so the scatter below stays cache friendly.
+            members = members[np.argsort(base[members], kind="stable")]
+            dx = ox - rx[members][:, None]
+            dy = oy - ry[members][:, None]
+            cover = np.clip(radius[members][:, None] + 0.5 - np.sqrt(dx * dx + dy * dy), 0.0, 0.9999)
+            cover *= alpha[members][:, None]
+            indices.append((base[members][:, None] + offsets).ravel())
+            weights.append(np.log1p(-cover).ravel())
+        # One fill colour: source-over of all discs reduces to 1 - prod(1 - a).
+        transmit = np.bincount(np.concatenate(indices), weights=np.concatenate(weights), minlength=pw * ph)
+        np.negative(np.expm1(transmit.reshape(ph, pw)[pad:pad + h, pad:pad + w]), out=out[3], casting="unsafe")
+        np.multiply(colour, out[3], out=out[:3])
+        return out
+
+    return paint
+
+
+def layer_compositor(
+    layer: Dict[str, Any],
+    canvas: Tuple[int, int],
+    size: Tuple[int, int],
+    paint: Callable[[int], "np.ndarray"],
+    effects: bool = True,
+) -> Optional[Tuple[Tuple[int, int, int, int], Callable[[int, "np.ndarray"], None]]]:
+    """Place a painted layer on the canvas like the preview's drawImage pass.
+
+    Returns (box, draw) where box is (x0, y0, x1, y1) in canvas pixels,
+    including room for rotation, shadow and glow, and draw(frame, dst)
+    composites onto a planar premultiplied RGBA buffer covering that box.
+    effects=False skips glow/outline/shadow for layers the preview draws plain.
+    Returns None when the layer is entirely off-canvas.
+    """
+    cw, ch = canvas
+    w, h = size
+    x = layer_number(layer, "x", 0.0) * cw
+    y = layer_number(layer, "y", 0.0) * ch
+    theta = math.radians(layer_number(layer, "rotate", 0.0))
+    reverse = bool(layer.get("reverse"))
+    opacity = layer_number(layer, "opacity", 1.0, 0.0, 1.0)
+    glow = 0.0 if layer.get("glowEnabled") is False or not effects else layer_number(layer, "glowBlur", layer_number(layer, "glowAmount", 0.0), lo=0.0)
+    glow_opacity = layer_number(layer, "glowOpacity", 0.4, 0.0, 1.0)
+    outline = 0.0 if layer.get("outlineEnabled") is False or not effects else layer_number(layer, "outlineWidth", 0.0, lo=0.0)
+    shadow_enabled = layer.get("shadowEnabled") is not False and effects
+    shadow_d = int(round(layer_number(layer, "shadowDistance", 0.0, lo=0.0))) if shadow_enabled else 0
+    shadow_blur = layer_number(layer, "shadowBlur", shadow_d, lo=0.0) if shadow_enabled else 0.0
+    glow_rgb = rgb_unit(layer.get("glowColor") or layer.get("color"), "#ffffff")[:, None, None]
+    outline_rgb = rgb_unit(layer.get("outlineColor"), "#000000")[:, None, None]
+    shadow_rgb = rgb_unit(layer.get("shadowColor"), "#000000")[:, None, None]
+    margin = int(math.ceil(1.5 * max(glow, outline, shadow_blur))) + (shadow_d if shadow_d > 0 else 0)
+
+    cx, cy = x + w / 2, y + h / 2
+    cos_t, sin_t = math.cos(theta), math.sin(theta)
+    ext_x = abs(cos_t) * w / 2 + abs(sin_t) * h / 2
+    ext_y = abs(sin_t) * w / 2 + abs(cos_t) * h / 2
+    x0 = max(0, int(math.floor(cx - ext_x)) - margin)
+    y0 = max(0, int(math.floor(cy - ext_y)) - margin)
+    x1 = min(cw, int(math.ceil(cx + ext_x)) + margin)
+    y1 = min(ch, int(math.ceil(cy + ext_y)) + margin)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    bw, bh = x1 - x0, y1 - y0
+    placed = np.zeros((4, bh, bw), dtype=np.float32)
+    scratch = np.empty_like(placed)
+
+    if theta == 0.0:
+        ox, oy = int(round(x)) - x0, int(round(y)) - y0
+        dst = (slice(max(0, oy), min(bh, oy + h)), slice(max(0, ox), min(bw, ox + w)))
+        sx = slice(max(0, -ox), max(0, -ox) + dst[1].stop - dst[1].start)
+        sy = slice(max(0, -oy), max(0, -oy) + dst[0].stop - dst[0].start)
+        if reverse:
+            sx = slice(w - sx.start - 1, (w - sx.stop - 1) if sx.stop < w else None, -1)
+
+        def place(src: "np.ndarray") -> None:
+            placed[(slice(None),) + dst] = src[:, sy, sx]
+    else:
+        gy, gx = np.mgrid[y0:y1, x0:x1]
+        dx = gx + 0.5 - cx
+        dy = gy + 0.5 - cy
+        lx = cos_t * dx + sin_t * dy
+        ly = -sin_t * dx + cos_t * dy
+        if reverse:
+            lx = -lx
+        src_x = np.floor(lx + w / 2).astype(np.int64)
+        src_y = np.floor(ly + h / 2).astype(np.int64)
+        inside = ((src_x >= 0) & (src_x < w) & (src_y >= 0) & (src_y < h)).ravel()
+        dst_idx = np.flatnonzero(inside)
+        src_idx = (src_y.ravel() * w + src_x.ravel())[inside]
+
+        def place(src: "np.ndarray") -> None:
+            placed.reshape(4, -1)[:, dst_idx] = src.reshape(4, -1)[:, src_idx]
+
+    def shadow(dst: "np.ndarray", rgb: "np.ndarray", alpha: "np.ndarray") -> None:
+        np.multiply(rgb, alpha, out=scratch[:3])
+        scratch[3] = alpha
+        composite_over(dst, scratch)
+
+    def image(dst: "np.ndarray", alpha: float) -> None:
+        if alpha >= 1.0:
+            composite_over(dst, placed)
+        else:
+            np.multiply(placed, alpha, out=scratch)
+            composite_over(dst, scratch)
+
+    def draw(frame: int, dst: "np.ndarray") -> None:
+        place(paint(frame))
+        cover = placed[3]
+        if 0 < shadow_d < min(bw, bh):
+            shade = np.zeros_like(cover)
+            shade[shadow_d:, shadow_d:] = blur_alpha(cover, shadow_blur / 2)[:bh - shadow_d, :bw - shadow_d]
+            shadow(dst, shadow_rgb, shade * opacity)
+            image(dst, opacity)
+        if outline > 0:
+            shadow(dst, outline_rgb, blur_alpha(cover, outline / 2) * opacity)
+            image(dst, opacity)
+        if glow > 0:
+            shadow(dst, glow_rgb, blur_alpha(cover, glow / 2) * (opacity * glow_opacity))
+            image(dst, opacity * glow_opacity)
+        image(dst, opacity)
+
+    return (x0, y0, x1, y1), draw
+
+
+def layer_pixel_size(layer: Dict[str, Any], canvas: Tuple[int, int]) -> Tuple[int, int]:
+    """Layer box in canvas pixels, defaulted the way the preview sizes it."""
+    cw, ch = canvas
+    w = layer_number(layer, "width", cw, lo=1)
+    h = layer_number(layer, "height", round(w * ch / cw), lo=1)
+    return max(1, int(round(w))), max(1, int(round(h)))
+
+
+def prepare_raster_layers(
+    work_dir: str,
+    audio_path: Optional[str],
+    layers: List[Dict[str, Any]],
+    canvas: Tuple[int, int],
+    fps: float,
+    duration: float = 0.0,
+) -> Optional[Dict[str, Any]]:
+    """Rasterize audio-reactive and particle layers in NumPy into one rawvideo RGBA stream.
+
+    Consecutive rasterized layers form a run flattened into one plane; runs
+    are stacked vertically in the stream frame and cropped back out in the
+    filtergraph, so layer order relative to filter-drawn layers is kept.
+    duration (timeline seconds) is the shortest the stream may be.
+    Returns None (filters are used instead) when numpy is missing or no
+    layer can be rasterized.
+    """
+    has_particles = any(l.get("type") == "particles" for l in layers)
+    has_spectro = bool(audio_path) and any(l.get("type") == "spectrograph" for l in layers)
+    if np is None or not (has_particles or has_spectro):
+        return None
+    bands: Dict[int, "np.ndarray"] = {}
+    energy: Optional["np.ndarray"] = None
+    try:
+        if has_spectro:
+            bands = analyze_layers(work_dir, str(audio_path), layers, fps)
+        if audio_path and any(l.get("type") == "particles" and l.get("audioResponsive", True) for l in layers):
+            energy = analyze_energy(work_dir, audio_path, layers, fps)
+    except (OSError, RuntimeError) as exc:
+        eprint(f"[renderer] Spectrum analysis failed; using filter layers: {exc}")
+        bands, energy = {}, None
+    # The timeline bounds the stream even with audio: particles that ignore it
+    # (or lost their analysis) still need frames for the whole render.
+    frame_count = max(
+        [len(f) for f in bands.values()]
+        + [len(energy) if energy is not None else 0, int(math.ceil(duration * fps))]
+    )
+    rastered = set(bands) | {i for i, l in enumerate(layers) if l.get("type") == "particles"}
+    if not rastered or frame_count <= 0:
+        return None
+    def make_drawers() -> Dict[int, Tuple[Tuple[int, int, int, int], Callable[[int, "np.ndarray"], None]]]:
+        # Painters keep scratch buffers, so every concurrent feed gets its own set.
+        made: Dict[int, Tuple[Tuple[int, int, int, int], Callable[[int, "np.ndarray"], None]]] = {}
+        for idx in sorted(rastered):
+            layer = layers[idx]
+            size = layer_pixel_size(layer, canvas)
+            if idx in bands:
+                placed = layer_compositor(layer, canvas, size, spectrograph_painter(layer, bands[idx], size))
+            else:
+                seed = int(hash_key({"particles": layer.get("id") or idx})[:16], 16)
+                paint = particles_painter(layer, size, fps, frame_count, seed, energy)
+                placed = layer_compositor(layer, canvas, size, paint, effects=False)
+            if placed:
+                made[idx] = placed
+        return made
+
+    drawers = make_drawers()
+    runs: List[Dict[str, Any]] = []
+    run: Optional[Dict[str, Any]] = None
+    for idx in range(len(layers)):
+        if idx not in rastered:
+            run = None
+            continue
+        if idx not in drawers:
+            continue  # off-canvas: nothing to draw, keep the run going
+        if run is None:
+            run = {"layers": []}
+            runs.append(run)
+        run["layers"].append(idx)
+    offset = 0
+    for run in runs:
+        boxes = [drawers[idx][0] for idx in run["layers"]]
+        run["x"] = min(b[0] for b in boxes)
+        run["y"] = min(b[1] for b in boxes)
+        run["w"] = max(b[2] for b in boxes) - run["x"]
+        run["h"] = max(b[3] for b in boxes) - run["y"]
+        run["offset"] = offset
+        offset += run["h"]
+    if not runs:
+        return {"runs": [], "skip": rastered, "size": (0, 0), "frames": 0, "feed": None}
+    stream_w = max(r["w"] for r in runs)
+    stream_h = offset
+    print(f"[renderer] Rasterizing {len(drawers)} layer(s) into a {stream_w}x{stream_h} overlay stream")
+
+    def feed(stream: Any, start: int = 0, count: Optional[int] = None) -> None:
+        """Write frames [start, start + count) of the overlay stream."""
+        drawn = make_drawers()
+        frame = np.zeros((stream_h, stream_w, 4), dtype=np.uint8)
+        planes = [(r, np.zeros((4, r["h"], r["w"]), dtype=np.float32)) for r in runs]
+        stop = frame_count if count is None else min(frame_count, start + count)
+        for k in range(start, stop):
+            for r, acc in planes:
+                acc.fill(0)
+                for idx in r["layers"]:
+                    (bx0, by0, bx1, by1), draw = drawn[idx]
+                    draw(k, acc[:, by0 - r["y"]:by1 - r["y"], bx0 - r["x"]:bx1 - r["x"]])
+                # rawvideo rgba is straight alpha; unpremultiply on the way out.
+                np.clip(acc[3], 0.0, 1.0, out=acc[3])
+                np.divide(acc[:3], np.maximum(acc[3], 1e-6), out=acc[:3])
+                acc *= 255.0
+                acc += 0.5
+                out = frame[r["offset"]:r["offset"] + r["h"], :r["w"]]
+                np.copyto(out, np.moveaxis(acc, 0, -1), casting="unsafe")
+            stream.write(frame.data)
+
+    return {"runs": runs, "skip": rastered, "size": (stream_w, stream_h), "frames": frame_count, "feed": feed}
+
+
+def raster_input_args(raster: Dict[str, Any], fps: float) -> List[str]:
+    w, h = raster["size"]
+    return ["-f", "rawvideo", "-pix_fmt", "rgba", "-s", f"{w}x{h}", "-framerate", f"{fps:g}", "-i", "pipe:0"]
+
+
+def read_project(project_path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.isfile(project_path):
+        eprint(f"[renderer] Project JSON not found: {project_path}")
+        return None
+    try:
+        project = load_project(project_path)
+        validate_project(project)
+    except Exception as exc:
+        eprint(f"[renderer] Invalid project JSON: {exc}")
+        return None
+    return project
+
+
+def project_canvas(project: Dict[str, Any]) -> Tuple[Optional[Tuple[int, int]], float]:
+    """Return (canvas size or None, fps) from metadata.canvas."""
+    metadata = project.get("metadata") or {}
+    canvas_meta = metadata.get("canvas") if isinstance(metadata, dict) else None
+    canvas_size: Optional[Tuple[int, int]] = None
+    fps = DEFAULT_FPS
+    if isinstance(canvas_meta, dict):
+        try:
+            cw = int(canvas_meta.get("width") or 0)
+            ch = int(canvas_meta.get("height") or 0)
+            if cw > 0 and ch > 0:
+                canvas_size = (cw, ch)
+        except Exception:
+            canvas_size = None
+        try:
+            fps = float(canvas_meta.get("fps") or DEFAULT_FPS)
+        except Exception:
+            fps = DEFAULT_FPS
+        if fps <= 0:
+            fps = DEFAULT_FPS
+    return canvas_size, fps
+
+
+def project_work_dir(project_path: str) -> str:
+    override = os.environ.get("vizmatic_WORK_DIR")
+    if override:
+        os.makedirs(override, exist_ok=True)
+        return override
+    return ensure_tmp_dir(os.path.join(os.path.dirname(project_path), ".vizmatic"))
+
+
+def analyze_main(argv: List[str]) -> int:
+    """`analyze <project.json>`: precompute spectrograph analysis into the cache."""
+    parser = argparse.ArgumentParser(prog="vizmatic-renderer analyze", description="Precompute spectrograph layer analysis.")
+    parser.add_argument("project", help="path/to/project.json")
+    cli = parser.parse_args(argv)
+    project = read_project(cli.project)
+    if project is None:
+        return 2
+    if np is None:
+        eprint("[renderer] numpy is not installed; spectrum analysis is unavailable.")
+        return 2
+    audio = (project.get("audio") or {}).get("path")
+    if not audio or not os.path.isfile(audio):
+        eprint(f"[renderer] Missing audio file: {audio or '(none)'}")
+        return 2
+    if not check_ffmpeg():
+        return 2
+    _canvas, fps = project_canvas(project)
+    layers = project.get("layers") or []
+    try:
+        bands = analyze_layers(project_work_dir(cli.project), audio, layers, fps)
+    except (OSError, RuntimeError) as exc:
+        eprint(f"[renderer] Analysis failed: {exc}")
+        return 1
+    for idx, frames in bands.items():
+        print(f"[renderer] Layer {idx}: {frames.shape[0]} frames x {frames.shape[1]} bands")
+    if any(l.get("type") == "particles" and l.get("audioResponsive", True) for l in layers):
+        energy = analyze_energy(project_work_dir(cli.project), audio, layers, fps)
+        if energy is not None:
+            print(f"[renderer] Audio energy: {len(energy)} frames")
+    print("[renderer] Analysis complete")
+    return 0
+
+
+def media_cache_dir(kind: str, media_path: str, cache_dir: Optional[str] = None) -> str:
+    """<cache root>/<kind> for derived media assets; defaults to the cache beside the media."""
+    root = cache_dir or cache_root(project_work_dir(os.path.abspath(media_path)))
+    d = os.path.join(root, kind)
+    os.makedirs(d, exist_ok=True)
+    return d
+
+
+def compute_peaks(audio_path: str, samples_per_peak: int, sample_rate: int) -> "np.ndarray":
+    """Base-level (min, max) pairs of mono PCM, decoded and reduced chunk by chunk."""
+    mins: List["np.ndarray"] = []
+    maxs: List["np.ndarray"] = []
+    carry = np.zeros(0, dtype=np.float32)
+    for chunk in stream_audio_pcm(audio_path, sample_rate, samples_per_peak * 256):
+        buf = np.concatenate([carry, chunk])
+        whole = len(buf) - len(buf) % samples_per_peak
+        if whole:
+            blocks = buf[:whole].reshape(-1, samples_per_peak)
+            mins.append(blocks.min(axis=1))
+            maxs.append(blocks.max(axis=1))
+        carry = buf[whole:]
+    if len(carry):
+        mins.append(carry.min(keepdims=True))
+        maxs.append(carry.max(keepdims=True))
+    if not mins:
+        return np.zeros((0, 2), dtype=np.int8)
+    peaks = np.stack([np.concatenate(mins), np.concatenate(maxs)], axis=1)
+    return np.clip(np.round(peaks * 127), -128, 127).astype(np.int8)
+
+
+def peaks_pyramid(base: "np.ndarray") -> List["np.ndarray"]:
+    levels = [base]
+    while len(levels[-1]) > PEAKS_MIN_COUNT:
+        prev = levels[-1]
+        pad = -len(prev) % PEAKS_LEVEL_FACTOR
+        if pad:
+            prev = np.concatenate([prev, np.repeat(prev[-1:], pad, axis=0)])
+        groups = prev.reshape(-1, PEAKS_LEVEL_FACTOR, 2)
+        levels.append(np.stack([groups[:, :, 0].min(axis=1), groups[:, :, 1].max(axis=1)], axis=1))
+    return levels
+
+
+def write_peaks(dest: str, levels: List["np.ndarray"], sample_rate: int, samples_per_peak: int) -> None:
+    """Little-endian file: b"VZPK", u16 version, u16 level count, u32 sample rate,
+    u32 samples per base peak, u32 level factor, u32 peak count per level, then
+    each level's int8 (min, max) pairs, finest first."""
+    tmp = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(b"VZPK")
+        f.write(struct.pack("<HHIII", PEAKS_VERSION, len(levels), sample_rate, samples_per_peak, PEAKS_LEVEL_FACTOR))
+        f.write(struct.pack(f"<{len(levels)}I", *[len(level) for level in levels]))
+        for level in levels:
+            f.write(level.tobytes())
+    os.replace(tmp, dest)
+
+
+def ensure_peaks(
+    audio_path: str,
+    cache_dir: Optional[str] = None,
+    samples_per_peak: int = DEFAULT_PEAKS_SAMPLES,
+    sample_rate: int = ANALYSIS_SAMPLE_RATE,
+) -> Dict[str, Any]:
+    """Cached waveform peak pyramid for audio_path; see write_peaks for the layout."""
+    key = hash_key({
+        "kind": "peaks",
+        "version": PEAKS_VERSION,
+        "source": file_identity(audio_path),
+        "samplesPerPeak": samples_per_peak,
+        "sampleRate": sample_rate,
+    })
+    dest = os.path.join(media_cache_dir("peaks", audio_path, cache_dir), f"{key}.peaks")
+    if not os.path.isfile(dest):
+        levels = peaks_pyramid(compute_peaks(audio_path, samples_per_peak, sample_rate))
+        write_peaks(dest, levels, sample_rate, samples_per_peak)
+    with open(dest, "rb") as f:
+        _magic, _version, level_count, _rate, _spp, _factor = struct.unpack("<4sHHIII", f.read(20))
+        counts = list(struct.unpack(f"<{level_count}I", f.read(4 * level_count)))
+    return {
+        "source": audio_path,
+        "peaks": dest,
+        "bytes": os.path.getsize(dest),
+        "sampleRate": sample_rate,
+        "samplesPerPeak": samples_per_peak,
+        "levelFactor": PEAKS_LEVEL_FACTOR,
+        "levels": counts,
+    }
+
+
+def ensure_thumbs(
+    video_path: str,
+    cache_dir: Optional[str] = None,
+    count: int = DEFAULT_THUMB_COUNT,
+    height: int = DEFAULT_THUMB_HEIGHT,
+) -> Dict[str, Any]:
+    """Cached JPEG strip of count evenly spaced frames, each tile height px tall at 16:9.
+
+    Every frame comes from its own fast-seeking input, so long sources are
+    never decoded end to end.
+    """
+    count = max(1, count)
+    height = max(2, height // 2 * 2)
+    width = max(2, int(round(height * 16 / 9 / 2)) * 2)
+    key = hash_key({
+        "kind": "thumbs",
+        "version": THUMBS_VERSION,
+        "source": file_identity(video_path),
+        "count": count,
+        "size": [width, height],
+    })
+    dest = os.path.join(media_cache_dir("thumbs", video_path, cache_dir), f"{key}.jpg")
+    result = {"source": video_path, "thumbs": dest, "count": count, "tileWidth": width, "tileHeight": height}
+    if os.path.isfile(dest):
+        return result
+    info = probe_media(video_path, os.environ.get("vizmatic_PROBE_CACHE"))
+    duration = float((info or {}).get("duration") or 0)
+    args: List[str] = ["-y"]
+    parts: List[str] = []
+    for n in range(count):
+        # Tile centres, so the first and last thumbs avoid fades at the edges.
+        args += ["-ss", f"{duration * (n + 0.5) / count:.3f}", "-i", video_path]
+        parts.append(
+            f"[{n}:v]trim=end_frame=1,setpts=PTS-STARTPTS,"
+            f"scale=w={width}:h={height}:force_original_aspect_ratio=decrease,"
+            f"pad=w={width}:h={height}:x=(ow-iw)/2:y=(oh-ih)/2:color=black,setsar=1[t{n}]"
+        )
+    tiles = "".join(f"[t{n}]" for n in range(count))
+    graph = ";".join(parts) + (f";{tiles}hstack=inputs={count}[strip]" if count > 1 else ";[t0]null[strip]")
+    tmp = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp.jpg"
+    args += ["-filter_complex", graph, "-map", "[strip]", "-frames:v", "1", "-q:v", "4", "-update", "1", tmp]
+    code = run_ffmpeg(args, with_progress=False)
+    if code != 0 or not os.path.isfile(tmp):
+        raise RuntimeError(f"thumbnail extraction failed with code {code}: {video_path}")
+    os.replace(tmp, dest)
+    return result
+
+
+def peaks_main(argv: List[str]) -> int:
+    """`peaks <audio>...`: cache waveform peak pyramids and print their paths as JSON."""
+    parser = argparse.ArgumentParser(prog="vizmatic-renderer peaks", description="Compute cached waveform peaks.")
+    parser.add_argument("paths", nargs="+", help="audio (or video) files")
+    parser.add_argument("--cache-dir", default=os.environ.get("vizmatic_CACHE_DIR"), help="cache root (default: beside each file)")
+    parser.add_argument("--samples-per-peak", type=int, default=DEFAULT_PEAKS_SAMPLES, help="samples per finest peak at 48 kHz")
+    cli = parser.parse_args(argv)
+    if np is None:
+        eprint("[renderer] numpy is not installed; waveform peaks are unavailable.")
+        return 2
+    if not check_ffmpeg():
+        return 2
+    results: List[Dict[str, Any]] = []
+    for path in cli.paths:
+        try:
+            results.append(ensure_peaks(path, cli.cache_dir, max(1, cli.samples_per_peak)))
+        except (OSError, RuntimeError) as exc:
+            eprint(f"[renderer] Peaks failed for {path}: {exc}")
+            return 1
+    print(json.dumps({"peaks": results}))
+    return 0
+
+
+def thumbs_main(argv: List[str]) -> int:
+    """`thumbs <video>...`: cache thumbnail strips and print their paths as JSON."""
+    parser = argparse.ArgumentParser(prog="vizmatic-renderer thumbs", description="Extract cached clip thumbnail strips.")
+    parser.add_argument("paths", nargs="+", help="video files")
+    parser.add_argument("--cache-dir", default=os.environ.get("vizmatic_CACHE_DIR"), help="cache root (default: beside each file)")
+    parser.add_argument("--count", type=int, default=DEFAULT_THUMB_COUNT, help="thumbnails per strip")
+    parser.add_argument("--height", type=int, default=DEFAULT_THUMB_HEIGHT, help="thumbnail height in pixels")
+    cli = parser.parse_args(argv)
+    if not check_ffmpeg():
+        return 2
+    results: List[Dict[str, Any]] = []
+    for path in cli.paths:
+        try:
+            results.append(ensure_thumbs(path, cli.cache_dir, cli.count, cli.height))
+        except (OSError, RuntimeError) as exc:
+            eprint(f"[renderer] Thumbnails failed for {path}: {exc}")
+            return 1
+    print(json.dumps({"thumbs": results}))
+    return 0
+
+
+class JobOutput:
+    """File-like stand-in for stdout/stderr that turns a job's lines into events."""
+
+    def __init__(self, emit: Callable[[Dict[str, Any]], None], job_id: str, stream: str) -> None:
+        self.emit = emit
+        self.job_id = job_id
+        self.stream = stream
+        self.pending = ""
+        self.lock = threading.Lock()
 
+    def write(self, text: str) -> int:
+        with self.lock:
+            self.pending += text
+            *lines, self.pending = self.pending.split("\n")
+        for line in lines:
+            self.emit_line(line)
+        return len(text)
 
-def escape_text(txt: str) -> str:
-    return txt.replace("\\", "\\\\").replace(":", "\\:").replace("'", "\\'")
+    def flush(self) -> None:
+        with self.lock:
+            line, self.pending = self.pending, ""
+        if line:
+            self.emit_line(line)
 
+    def emit_line(self, line: str) -> None:
+        if line.startswith("[event] "):
+            try:
+                payload = json.loads(line[len("[event] "):])
+            except ValueError:
+                payload = None
+            if isinstance(payload, dict):
+                # Render events (stage, progress, ffmpeg, summary) keep their fields.
+                self.emit(dict({"id": self.job_id, "event": payload.pop("type", "progress")}, **payload))
+                return
+        self.emit({"id": self.job_id, "event": "log", "stream": self.stream, "line": line})
 
-def resolve_font_file(font: str) -> Optional[str]:
-    if not font:
-        return None
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "client", "public", "fonts"))
-    candidates = [
-        f"{font}.ttf",
-        f"{font.replace(' ', '')}.ttf",
-        f"{font.replace(' ', '-')}.ttf",
-    ]
-    for name in candidates:
-        path = os.path.join(base_dir, name)
-        if os.path.isfile(path):
-            normalized = path.replace("\\", "/")
-            return normalized.replace(":", r"\:")
-    return None
 
+def serve_probe(params: Dict[str, Any]) -> Dict[str, Any]:
+    paths = [str(p) for p in params.get("paths") or []]
+    cache_dir = params.get("cacheDir") or os.environ.get("vizmatic_PROBE_CACHE")
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    return {"probes": probe_many(paths, cache_dir)}
 
-def escape_filter_path(path: str) -> str:
-    normalized = path.replace("\\", "/")
-    normalized = normalized.replace(":", r"\:")
-    normalized = normalized.replace("'", r"\'")
-    return normalized
 
+def serve_media_assets(method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    paths = [str(p) for p in params.get("paths") or []]
+    cache_dir = params.get("cacheDir") or os.environ.get("vizmatic_CACHE_DIR")
+    if method == "peaks":
+        if np is None:
+            raise RuntimeError("numpy is not installed; waveform peaks are unavailable")
+        return {"peaks": [ensure_peaks(p, cache_dir) for p in paths]}
+    count = int(params.get("count") or DEFAULT_THUMB_COUNT)
+    height = int(params.get("height") or DEFAULT_THUMB_HEIGHT)
+    return {"thumbs": [ensure_thumbs(p, cache_dir, count, height) for p in paths]}
 
-def escape_geq_expr(expr: str) -> str:
-    return expr.replace("\\", "\\\\").replace(":", "\\:").replace(",", "\\,")
 
+def serve_main(argv: List[str]) -> int:
+    """`serve`: a long-lived renderer reading JSON-lines jobs from stdin.
 
-def build_layer_filters(layers: List[Dict[str, Any]], has_audio: bool, canvas: Optional[Tuple[int, int]] = None) -> Tuple[Optional[str], str]:
-    """Return (filter_complex, video_label)"""
-    if not layers and not canvas:
-        return None, "[0:v]"
+    Requests are {"id", "method", "params"}; render, probe, analyze, peaks and thumbs jobs
+    run one at a time in arrival order, while cancel and shutdown act at once.
+    Every job answers with JSON-lines events carrying its id: queued, started,
+    log and the render's stage/progress/ffmpeg/summary events, then exactly
+    one of done, error or cancelled. A job whose id is still queued or running
+    is rejected with an error event. Probe summaries and the most recently
+    used analysis arrays (ANALYSIS_MEMO_MAX) stay loaded between jobs.
+    """
+    parser = argparse.ArgumentParser(prog="vizmatic-renderer serve", description="Serve render jobs over stdin/stdout JSON lines.")
+    parser.parse_args(argv)
+    out = sys.stdout
+    err = sys.stderr
+    out_lock = threading.Lock()
 
-    filter_parts: List[str] = []
-    current_v = "[0:v]"
-    if canvas:
-        cw, ch = canvas
-        filter_parts.append(
-            f"{current_v}scale=w={cw}:h={ch}:force_original_aspect_ratio=decrease,"
-            f"pad=w={cw}:h={ch}:x=(ow-iw)/2:y=(oh-ih)/2:color=black[v0]"
-        )
-        current_v = "[v0]"
+    def emit(event: Dict[str, Any]) -> None:
+        line = json.dumps(event, default=str)
+        with out_lock:
+            out.write(line + "\n")
+            out.flush()
 
-    spec_layers = [l for l in layers if l.get("type") == "spectrograph"]
-    if spec_layers and has_audio:
-        split = f"[1:a]asplit={len(spec_layers)}" + "".join([f"[as{idx}]" for idx in range(len(spec_layers))])
-        filter_parts.append(split)
+    jobs: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+    state_lock = threading.Lock()
+    pending: Dict[str, Dict[str, Any]] = {}
+    current: Dict[str, Any] = {}
 
-    spec_idx = 0
-    for idx, layer in enumerate(layers):
-        lid = idx + 1
-        if layer.get("type") == "spectrograph":
-            if not has_audio:
+    def run_job(job: Dict[str, Any]) -> Dict[str, Any]:
+        method = job["method"]
+        params = job["params"]
+        if method == "probe":
+            return {"code": 0, "result": serve_probe(params)}
+        if method in ("peaks", "thumbs"):
+            return {"code": 0, "result": serve_media_assets(method, params)}
+        if not params.get("project"):
+            raise ValueError(f"{method} needs params.project")
+        extra = [str(a) for a in params.get("args") or []]
+        if method == "render":
+            return {"code": main(["main.py", str(params["project"])] + extra)}
+        return {"code": analyze_main([str(params["project"])] + extra)}
+
+    def worker() -> None:
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            with state_lock:
+                if pending.pop(job["id"], None) is None:
+                    continue  # cancelled while queued
+                current.update(job)
+                _cancel_event.clear()
+            emit({"id": job["id"], "event": "started"})
+            sys.stdout = JobOutput(emit, job["id"], "stdout")  # type: ignore[assignment]
+            sys.stderr = JobOutput(emit, job["id"], "stderr")  # type: ignore[assignment]
+            try:
+                outcome: Dict[str, Any] = run_job(job)
+                event = "done"
+            except SystemExit as exc:  # argparse rejects bad job args this way
+                outcome, event = {"code": exc.code if isinstance(exc.code, int) else 2}, "error"
+            except Exception as exc:
+                outcome, event = {"message": str(exc)}, "error"
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                sys.stdout, sys.stderr = out, err
+                with state_lock:
+                    current.clear()
+                    cancelled = _cancel_event.is_set()
+            if cancelled:
+                event = "cancelled"
+            emit(dict({"id": job["id"], "event": event}, **outcome))
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    emit({"event": "ready", "pid": os.getpid()})
+    for raw in sys.stdin:
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            request = json.loads(raw)
+            job_id = str(request["id"])
+            method = str(request["method"])
+        except (ValueError, KeyError, TypeError) as exc:
+            emit({"event": "error", "message": f"bad request: {exc}"})
+            continue
+        params = request.get("params") or {}
+        if method in ("render", "probe", "analyze", "peaks", "thumbs"):
+            job = {"id": job_id, "method": method, "params": params}
+            with state_lock:
+                busy = job_id in pending or current.get("id") == job_id
+                if not busy:
+                    pending[job_id] = job
+                    position = len(pending)
+            if busy:
+                emit({"id": job_id, "event": "error", "message": f"job id {job_id} is already queued or running"})
+                continue
+            jobs.put(job)
+            emit({"id": job_id, "event": "queued", "position": position})
+        elif method == "cancel":
+            target = str(params.get("job") or "")
+            with state_lock:
+                queued = pending.pop(target, None)
+                running = current.get("id") == target
+                if running:
+                    cancel_ffmpeg()
+            if queued:
+                emit({"id": target, "event": "cancelled"})
+            emit({"id": job_id, "event": "done", "result": {"cancelled": bool(queued or running)}})
+        elif method == "shutdown":
+            emit({"id": job_id, "event": "done"})
+            break
+        else:
+            emit({"id": job_id, "event": "error", "message": f"unknown method: {method}"})
+    # Queued jobs still run; shutdown (or EOF) only stops accepting new ones.
+    jobs.put(None)
+    thread.join()
+    return 0
+
+
+def batch_projects(inputs: List[str]) -> List[str]:
+    """Project JSONs named directly or found (non-recursively) in directories."""
+    paths: List[str] = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths += sorted(os.path.join(item, n) for n in os.listdir(item) if n.lower().endswith(".json"))
+        else:
+            paths.append(item)
+    return list(dict.fromkeys(os.path.abspath(p) for p in paths))
+
+
+def available_memory_mb() -> Optional[int]:
+    try:
+        with open("/proc/meminfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_AVPHYS_PAGES") // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def estimate_render_mb(project: Dict[str, Any]) -> int:
+    """Rough peak memory of one render; encoder lookahead and raster frames scale with the canvas."""
+    canvas, _fps = project_canvas(project)
+    cw, ch = canvas or (1920, 1080)
+    return int(256 + cw * ch * 4 * 100 / (1024 * 1024))
+
+
+def batch_render(entry: Dict[str, Any], env: Dict[str, str], extra: List[str], log_dir: str) -> Dict[str, Any]:
+    """Render one batch project in a child process, logging its output to a file."""
+    name = os.path.splitext(os.path.basename(entry["path"]))[0]
+    log_path = os.path.join(log_dir, f"{name}-{hash_key(entry['path'])[:8]}.log")
+    stages: Dict[str, Any] = {}
+    summary: Dict[str, Any] = {}
+    output_ms = 0
+    started = time.monotonic()
+    with open(log_path, "w", encoding="utf-8") as log:
+        proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), entry["path"]] + extra,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            env=env,
+        )
+        entry["proc"] = proc
+        assert proc.stdout is not None
+        for line in proc.stdout:
+            log.write(line)
+            line = line.rstrip()
+            if line.startswith("total_duration_ms="):
+                output_ms = int(line.split("=", 1)[1] or 0)
+            if not line.startswith("[event] "):
                 continue
-            mode = layer.get("mode") or "bar"
-            path_mode = layer.get("pathMode") or "straight"
-            x = float(layer.get("x", 0) or 0)
-            y = float(layer.get("y", 0) or 0)
-            spec_tag = f"[spec{idx}]"
-            w = int(layer.get("width") or 640)
-            h = int(layer.get("height") or 200)
-            opacity = float(layer.get("opacity") or 1.0)
-            invert = bool(layer.get("invert"))
-            base_w = w
             try:
-                if mode == "dots":
-                    base_w = int(layer.get("dotCount") or w)
-                elif mode == "solid":
-                    base_w = int(layer.get("solidPointCount") or w)
-                else:
-                    base_w = int(layer.get("barCount") or w)
-            except Exception:
-                base_w = w
-            if base_w <= 0:
-                base_w = w
-            color_value = layer.get("color") or ""
-            tint = parse_hex_color(color_value) if color_value else None
-            if mode == "line":
-                spec_chain = f"[as{spec_idx}]showfreqs=mode=line:ascale=log:win_size=2048:size={base_w}x{h}"
-            elif mode == "dots":
-                spec_chain = f"[as{spec_idx}]showfreqs=mode=dot:ascale=log:win_size=2048:size={base_w}x{h}"
-            elif mode == "solid":
-                spec_chain = f"[as{spec_idx}]showspectrum=s={base_w}x{h}:mode=combined:color=intensity:scale=log:win_func=hann"
-            else:
-                spec_chain = f"[as{spec_idx}]showfreqs=mode=bar:ascale=log:win_size=2048:size={base_w}x{h}"
-            if base_w != w:
-                spec_chain += f",scale=w={w}:h={h}:flags=neighbor"
-            if mode == "bar":
-                try:
-                    bar_width = float(layer.get("barWidthPct") or 0)
-                except Exception:
-                    bar_width = 0
-                if bar_width and bar_width < 1.0:
-                    narrow_w = max(1, int(w * bar_width))
-                    spec_chain += f",scale=w={narrow_w}:h={h}:flags=neighbor,pad=w={w}:h={h}:x=(ow-iw)/2:y=0:color=black@0"
-            if tint:
-                r, g, b = tint
-                spec_chain += f",format=gray,format=rgb24,lutrgb=r='val*{r}/255':g='val*{g}/255':b='val*{b}/255'"
-            if invert:
-                spec_chain += ",vflip"
-            if opacity < 1.0:
-                spec_chain += f",format=rgba,colorchannelmixer=aa={opacity}"
-            if path_mode == "circular":
-                rad = "hypot(X-W/2,Y-H/2)"
-                ang = "(atan2(Y-H/2,X-W/2)+PI)/(2*PI)*W"
-                ry = f"{rad}/(min(W,H)/2)*H"
-                expr = f"if(lte({rad},min(W,H)/2),p({ang},{ry}),0)"
-                expr = escape_geq_expr(expr)
-                spec_chain += f",geq=r='{expr}':g='{expr}':b='{expr}'"
-            filter_parts.append(f"{spec_chain}{spec_tag}")
-            filter_parts.append(
-                f"{current_v}{spec_tag}overlay=x=W*{x}:y=H*{y}:format=auto[v{lid}]"
-            )
-            current_v = f"[v{lid}]"
-            spec_idx += 1
-        elif layer.get("type") == "image":
-            path = layer.get("imagePath")
-            if not path:
+                ev = json.loads(line[len("[event] "):])
+            except ValueError:
                 continue
-            x = float(layer.get("x", 0) or 0)
-            y = float(layer.get("y", 0) or 0)
-            width = int(layer.get("width") or 100)
-            height = int(layer.get("height") or 100)
-            opacity = float(layer.get("opacity") or 1.0)
-            rotate = float(layer.get("rotate") or 0)
-            reverse = bool(layer.get("reverse"))
-            invert = bool(layer.get("invert"))
-            outline_w = int(layer.get("outlineWidth") or 0)
-            outline_color = hex_to_rgb(layer.get("outlineColor") or "#000000")
-            glow_amount = int(layer.get("glowAmount") or 0)
-            glow_opacity = float(layer.get("glowOpacity") or 0.4)
-            glow_color = hex_to_rgb(layer.get("glowColor") or "#000000")
-            shadow_distance = int(layer.get("shadowDistance") or 0)
-            shadow_color = hex_to_rgb(layer.get("shadowColor") or "#000000")
-            step = 0
-            img_tag = f"[img{idx}]"
-            img_path = escape_filter_path(path)
-            img_chain = f"movie='{img_path}':loop=0,scale=w={width}:h={height}:flags=lanczos,format=rgba"
-            if rotate:
-                radians = rotate * 3.14159265 / 180.0
-                img_chain += f",rotate={radians}:fillcolor=black@0"
-            if reverse:
-                img_chain += ",hflip"
-            if invert:
-                img_chain += ",negate"
-            if opacity < 1.0:
-                img_chain += f",colorchannelmixer=aa={opacity}"
-            filter_parts.append(f"{img_chain}{img_tag}")
+            if ev.get("type") == "stage" and ev.get("state") == "end":
+                stages[ev["stage"]] = {"wallSeconds": ev.get("wallSeconds"), "cpuSeconds": ev.get("cpuSeconds")}
+            elif ev.get("type") == "summary":
+                summary = ev
+        code, cpu = wait_with_usage(proc)
+    return {
+        "project": entry["path"],
+        "output": (entry["project"].get("output") or {}).get("path"),
+        "code": code,
+        "wallSeconds": round(time.monotonic() - started, 3),
+        "cpuSeconds": round(cpu, 3) if cpu is not None else summary.get("cpuSeconds"),
+        "outputSeconds": output_ms / 1000.0,
+        "stages": stages,
+        "log": log_path,
+    }
 
-            def overlay_with(tag: str, xoff: float = 0.0, yoff: float = 0.0) -> None:
-                nonlocal current_v, step
-                step += 1
-                next_v = f"[v{idx}_{step}]"
-                filter_parts.append(f"{current_v}{tag}overlay=x=W*{x}+{xoff}:y=H*{y}+{yoff}:format=auto:repeatlast=1{next_v}")
-                current_v = next_v
 
-            if shadow_distance > 0:
-                sh_tag = f"[imgsh{idx}]"
-                filter_parts.append(f"{img_tag}boxblur=lr={max(1, shadow_distance//2)}:lp=1,colorchannelmixer=aa=0.6{sh_tag}")
-                overlay_with(sh_tag, shadow_distance, shadow_distance)
-            if glow_amount > 0:
-                glow_tag = f"[imggl{idx}]"
-                filter_parts.append(f"{img_tag}boxblur=lr={max(1, glow_amount//2)}:lp=1,colorchannelmixer=aa={glow_opacity}{glow_tag}")
-                overlay_with(glow_tag, 0, 0)
-            if outline_w > 0:
-                ol_tag = f"[imgol{idx}]"
-                filter_parts.append(f"{img_tag}pad=w=iw+{outline_w*2}:h=ih+{outline_w*2}:x={outline_w}:y={outline_w}:color={outline_color}@1.0{ol_tag}")
-                overlay_with(ol_tag, -outline_w, -outline_w)
-            overlay_with(img_tag, 0, 0)
-        elif layer.get("type") == "text":
-            text = escape_text(layer.get("text") or "Text")
-            opacity = float(layer.get("opacity") or 1.0)
-            color = hex_to_rgb(layer.get("color") or "#ffffff") + f"@{opacity:.3f}"
-            font = escape_text(layer.get("font") or "Segoe UI")
-            fontfile = resolve_font_file(layer.get("font") or "")
-            fontsize = int(layer.get("fontSize") or 12)
-            x = float(layer.get("x", 0) or 0)
-            y = float(layer.get("y", 0) or 0)
-            outline_color = hex_to_rgb(layer.get("outlineColor") or "#000000") + f"@{opacity:.3f}"
-            outline_width = max(0, int(layer.get("outlineWidth") or 0))
-            shadow_alpha = max(0.0, min(1.0, opacity * 0.6))
-            shadow_color = hex_to_rgb(layer.get("shadowColor") or "#000000") + f"@{shadow_alpha:.3f}"
-            shadow_distance = int(layer.get("shadowDistance") or 0)
-            font_arg = f":fontfile='{fontfile}'" if fontfile else f":font='{font}'"
-            filter_parts.append(
-                f"{current_v}drawtext=text='{text}':fontcolor={color}:fontsize={fontsize}{font_arg}:x=W*{x}:y=H*{y}:bordercolor={outline_color}:borderw={outline_width}:shadowcolor={shadow_color}:shadowx={shadow_distance}:shadowy={shadow_distance}[v{lid}]"
-            )
-            current_v = f"[v{lid}]"
+def batch_main(argv: List[str]) -> int:
+    """`batch <project.json|dir>...`: render a queue of projects for throughput.
 
-    return ";".join(filter_parts), current_v or "[0:v]"
+    Projects run as child renders sharing one cache root, so probes and
+    segments of common media are produced once. Up to --parallel renders run
+    at a time, each with an equal share of the CPUs (vizmatic_CPUS), and a
+    render only starts while the estimated memory of everything running fits
+    under --mem-mb. Each render gets its own scratch dir
+    (.vizmatic/<hash of project path>), so projects sharing a directory or
+    clips run side by side; shared cache entries are written under
+    per-process temp names and published atomically.
+    """
+    parser = argparse.ArgumentParser(prog="vizmatic-renderer batch", description="Render many projects with shared caches.")
+    parser.add_argument("inputs", nargs="+", help="project JSONs or directories of them")
+    parser.add_argument("--parallel", type=int, default=None, help="renders at once (default: cpu_count // 4)")
+    parser.add_argument("--mem-mb", type=int, default=None, help="memory budget for running renders (default: 80%% of available)")
+    parser.add_argument("--cache-dir", default=None, help="shared cache root (default: vizmatic_CACHE_DIR or next to the first project)")
+    parser.add_argument("--report", default="batch_report.json", help="summary report JSON path")
+    parser.add_argument("--draft", action="store_true", help="render every project as a draft")
+    parser.add_argument("--incremental", action="store_true", help="render every project incrementally")
+    cli = parser.parse_args(argv)
 
+    paths = batch_projects(cli.inputs)
+    if not paths:
+        eprint("[batch] No project JSONs found.")
+        return 2
+    if not check_ffmpeg():
+        eprint("[batch] ffmpeg not available; aborting.")
+        return 2
+    cache_dir = os.path.abspath(
+        cli.cache_dir or os.environ.get("vizmatic_CACHE_DIR") or os.path.join(project_work_dir(paths[0]), "cache")
+    )
+    os.makedirs(cache_dir, exist_ok=True)
+    report_path = os.path.abspath(cli.report)
+    log_dir = os.path.splitext(report_path)[0] + "_logs"
+    os.makedirs(log_dir, exist_ok=True)
+
+    cpus = env_int("vizmatic_CPUS", 0) or os.cpu_count() or 1
+    parallel = max(1, cli.parallel or cpus // 4)
+    available = available_memory_mb()
+    mem_limit = cli.mem_mb or (int(available * 0.8) if available else None)
+    extra = (["--draft"] if cli.draft else []) + (["--incremental"] if cli.incremental else [])
+    env = dict(os.environ, vizmatic_CACHE_DIR=cache_dir, vizmatic_CPUS=str(max(1, cpus // parallel)))
+
+    results: List[Dict[str, Any]] = []
+    pending: List[Dict[str, Any]] = []
+    for path in paths:
+        project = read_project(path)
+        if project is None:
+            results.append({"project": path, "code": 2, "error": "invalid project"})
+            continue
+        clips = [c.get("path") for c in project.get("clips") or [] if isinstance(c, dict) and c.get("path")]
+        pending.append({
+            "path": path,
+            "project": project,
+            "media": {os.path.abspath(str(c)) for c in clips},
+            "work_dir": os.path.join(os.path.dirname(path), ".vizmatic", hash_key(path)[:16]),
+            "mem_mb": estimate_render_mb(project),
+        })
+    # One probe pass over every project's media; the renders then read the shared probe cache.
+    media = sorted(set().union(*(e["media"] for e in pending))) if pending else []
+    probe_dir = os.environ.get("vizmatic_PROBE_CACHE") or os.path.join(cache_dir, "probe")
+    os.makedirs(probe_dir, exist_ok=True)
+    probe_many([m for m in media if os.path.isfile(m)], probe_dir)
+
+    print(f"[batch] {len(pending)} project(s), {parallel} at a time, {env['vizmatic_CPUS']} CPU(s) each, cache {cache_dir}")
+    if mem_limit:
+        print(f"[batch] Memory budget: {mem_limit} MB")
+    cond = threading.Condition()
+    running: List[Dict[str, Any]] = []
+    started = time.monotonic()
+
+    def admissible(entry: Dict[str, Any]) -> bool:
+        if not running:
+            return True
+        return not mem_limit or sum(r["mem_mb"] for r in running) + entry["mem_mb"] <= mem_limit
+
+    def run(entry: Dict[str, Any]) -> None:
+        try:
+            result = batch_render(entry, dict(env, vizmatic_WORK_DIR=entry["work_dir"]), extra, log_dir)
+        except Exception as exc:
+            result = {"project": entry["path"], "code": 1, "error": str(exc)}
+        status = "ok" if result["code"] == 0 else f"failed ({result['code']})"
+        print(f"[batch] {os.path.basename(entry['path'])}: {status} in {result.get('wallSeconds', 0):.1f}s", flush=True)
+        with cond:
+            results.append(result)
+            running.remove(entry)
+            cond.notify_all()
 
-def ffprobe_duration_ms(path: str) -> Optional[int]:
-    exe = ffprobe_exe()
     try:
-        proc = subprocess.run([
-            exe,
-            "-v",
-            "error",
-            "-show_entries",
-            "format=duration",
-            "-of",
-            "default=noprint_wrappers=1:nokey=1",
-            path,
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-        s = proc.stdout.strip()
-        if not s:
-            return None
-        sec = float(s)
-        if not (sec >= 0):
-            return None
-        return int(sec * 1000)
-    except Exception:
-        return None
+        with cond:
+            while pending or running:
+                entry = next((e for e in pending if len(running) < parallel and admissible(e)), None)
+                if entry is None:
+                    cond.wait()
+                    continue
+                pending.remove(entry)
+                running.append(entry)
+                print(f"[batch] Starting {entry['path']}", flush=True)
+                threading.Thread(target=run, args=(entry,), daemon=True).start()
+    except KeyboardInterrupt:
+        with cond:
+            for entry in running:
+                if entry.get("proc"):
+                    entry["proc"].terminate()
+        raise
+
+    wall = time.monotonic() - started
+    order = {p: n for n, p in enumerate(paths)}
+    results.sort(key=lambda r: order.get(r["project"], 0))
+    output_seconds = sum(r.get("outputSeconds") or 0 for r in results if r["code"] == 0)
+    failed = [r["project"] for r in results if r["code"] != 0]
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "cacheDir": cache_dir,
+        "parallel": parallel,
+        "memoryLimitMb": mem_limit,
+        "wallSeconds": round(wall, 3),
+        "outputSeconds": round(output_seconds, 3),
+        # Seconds of finished video per wall-clock second across the queue.
+        "throughput": round(output_seconds / wall, 3) if wall > 0 else None,
+        "succeeded": len(results) - len(failed),
+        "failed": failed,
+        "projects": results,
+    }
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"[batch] {report['succeeded']}/{len(results)} rendered in {wall:.1f}s; report: {report_path}")
+    return 1 if failed else 0
+
+
+SUBCOMMANDS: Dict[str, Callable[[List[str]], int]] = {
+    "analyze": analyze_main,
+    "serve": serve_main,
+    "batch": batch_main,
+    "peaks": peaks_main,
+    "thumbs": thumbs_main,
+}
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="vizmatic-renderer", description="Render a vizmatic project JSON via ffmpeg.")
+    parser.add_argument("project", help="path/to/project.json")
+    parser.add_argument("--jobs", type=int, default=None, help="concurrent ffmpeg segment workers")
+    parser.add_argument("--single-pass", action="store_true", help="compile the whole timeline into one ffmpeg run")
+    parser.add_argument("--chunks", type=int, default=None, help="composite layers in N time-parallel chunks")
+    parser.add_argument("--draft", action="store_true", help="fast low-resolution review render from cached proxies")
+    parser.add_argument("--incremental", action="store_true", help="re-composite only the chunks an edit changed")
+    parser.add_argument("--stream", action="store_true", help="stream decoded clips into the composite instead of segment files")
+    return parser
 
 
 def main(argv: List[str]) -> int:
-    if len(argv) != 2:
-        eprint("Usage: python renderer/python/main.py <path/to/project.json>")
+    if len(argv) < 2:
+        eprint("Usage: python renderer/python/main.py <path/to/project.json> [--jobs N] [--chunks N] [--draft] [--incremental]")
         return 2
+    if argv[1] in SUBCOMMANDS:
+        return SUBCOMMANDS[argv[1]](argv[2:])
+    cli = build_arg_parser().parse_args(argv[1:])
+    global _progress
+    try:
+        return render_project(cli)
+    finally:
+        _progress = None
+        remove_pingpong_spills()
 
-    project_path = argv[1]
-    if not os.path.isfile(project_path):
-        eprint(f"[renderer] Project JSON not found: {project_path}")
-        return 2
 
-    try:
-        project = load_project(project_path)
-        validate_project(project)
-    except Exception as exc:
-        eprint(f"[renderer] Invalid project JSON: {exc}")
+def render_project(cli: argparse.Namespace) -> int:
+    global _progress
+    project_path = cli.project
+    project = read_project(project_path)
+    if project is None:
         return 2
 
     audio = (project.get("audio") or {}).get("path")
     clip_entries = [c for c in (project.get("clips") or []) if isinstance(c, dict) and c.get("path")]
     output = (project.get("output") or {}).get("path")
     layers = project.get("layers") or []
-    metadata = project.get("metadata") or {}
-    canvas_meta = metadata.get("canvas") if isinstance(metadata, dict) else None
-    canvas_size: Optional[Tuple[int, int]] = None
-    if isinstance(canvas_meta, dict):
-        try:
-            cw = int(canvas_meta.get("width") or 0)
-            ch = int(canvas_meta.get("height") or 0)
-            if cw > 0 and ch > 0:
-                canvas_size = (cw, ch)
-        except Exception:
-            canvas_size = None
+    options = render_options(project)
+    canvas_size, fps = project_canvas(project)
 
     print("[renderer] Loaded project")
     print(f"  audio: {audio or 'none'}")
@@ -690,19 +4815,10 @@ def main(argv: List[str]) -> int:
         eprint(f"[renderer] Missing audio file: {audio}")
         return 2
 
-    # Estimate total duration from clips
-    total_ms = 0
-    for c in clip_entries:
-        p = c.get("path")
-        if not p:
-            continue
-        d = ffprobe_duration_ms(p)
-        if d is not None:
-            total_ms += d
-    if total_ms > 0:
-        print(f"total_duration_ms={total_ms}")
+    work_dir = project_work_dir(project_path)
+    probe_dir = probe_cache_dir(work_dir)
+    probe_many([str(c.get("path")) for c in clip_entries], probe_dir)
 
-    work_dir = ensure_tmp_dir(os.path.join(os.path.dirname(project_path), ".vizmatic"))
     clip_jobs: List[Dict[str, Any]] = []
     cursor = 0.0
     for idx, c in enumerate(clip_entries):
@@ -719,7 +4835,7 @@ def main(argv: List[str]) -> int:
             if trim_end_val is not None:
                 duration = max(0.05, trim_end_val - trim_start)
             else:
-                d = ffprobe_duration_ms(path)
+                d = ffprobe_duration_ms(path, probe_dir)
                 if d is not None:
                     duration = max(0.05, d / 1000.0 - trim_start)
                 else:
@@ -729,7 +4845,7 @@ def main(argv: List[str]) -> int:
         except Exception:
             duration_val = 0.05
         if trim_end_val is None:
-            d = ffprobe_duration_ms(path)
+            d = ffprobe_duration_ms(path, probe_dir)
             if d is not None:
                 trim_end_val = max(trim_start, d / 1000.0)
         start_val = c.get("start")
@@ -754,26 +4870,269 @@ def main(argv: List[str]) -> int:
         })
         cursor = max(cursor, start_val + duration_val)
 
-    render_paths: List[str] = []
-    current = 0.0
     if not canvas_size:
         canvas_size = (1920, 1080)
-    for idx, clip in enumerate(clip_jobs):
-        start_val = float(clip.get("start") or 0)
-        if start_val > current + 0.001:
-            gap = start_val - current
-            render_paths.append(render_blank_clip(work_dir, gap, canvas_size))
-            current += gap
-        render_paths.append(render_clip_segment(work_dir, clip, idx))
-        current += float(clip.get("duration") or 0)
 
-    code, tmp_video = concat_videos_to_h264(work_dir, render_paths)
+    # The output runs for the timeline, cut to the audio when it is shorter (-shortest).
+    output_seconds = cursor
+    if audio:
+        audio_ms = ffprobe_duration_ms(audio, probe_dir)
+        if audio_ms:
+            output_seconds = min(cursor, audio_ms / 1000.0)
+    print(f"total_duration_ms={int(output_seconds * 1000)}")
+    try:
+        deliverables = project_deliverables(project, output, output_seconds)
+    except ValueError as exc:
+        eprint(f"[renderer] {exc}")
+        return 2
+    for item in deliverables:
+        print(f"[renderer] Deliverable {item['name']}: {item['path']}")
+
+    single_pass = bool(cli.single_pass or options.get("singlePass"))
+    stream = bool(cli.stream or options.get("stream")) and not single_pass
+    draft = bool(cli.draft or options.get("draft"))
+    stages: List[Tuple[str, float]] = []
+    if draft:
+        stages.append(("proxies", sum((ffprobe_duration_ms(c["path"], probe_dir) or 0) / 1000.0 for c in clip_jobs)))
+    if layers and options.get("rasterLayers", True):
+        stages.append(("analysis", 0.1 * output_seconds))
+    if single_pass or stream:
+        stages.append(("render", output_seconds))
+    else:
+        stages += [("segments", cursor), ("concat", 0.05 * cursor)]
+        if audio or layers:
+            stages.append(("composite", output_seconds if layers else 0.1 * output_seconds))
+    progress = _progress = RenderProgress(stages)
+
+    jobs, threads = worker_budget(cli.jobs or int(options.get("jobs") or 0) or env_int("vizmatic_JOBS", 0))
+    final_encode: Optional[Dict[str, Any]] = None
+    if draft:
+        canvas_size, fps, scale = draft_settings(canvas_size, fps, options)
+        layers = scale_layers(layers, scale)
+        final_encode = DRAFT_ENCODE
+        print(f"[renderer] Draft render: {canvas_size[0]}x{canvas_size[1]} @ {fps:g} fps")
+        progress.begin("proxies", stages[0][1])
+        proxies = ensure_proxies(work_dir, [c["path"] for c in clip_jobs], canvas_size, fps, jobs, threads)
+        for clip in clip_jobs:
+            clip["proxyOf"] = clip["path"]
+            clip["path"] = proxies[clip["path"]]
+
+    if layers and options.get("flattenLayers", True):
+        layers = flatten_static_layers(work_dir, layers, canvas_size)
+
+    raster: Optional[Dict[str, Any]] = None
+    if layers and options.get("rasterLayers", True):
+        progress.begin("analysis")
+        raster = prepare_raster_layers(work_dir, audio, layers, canvas_size, fps, cursor)
+
+    if single_pass:
+        print("[renderer] Single-pass render")
+        progress.begin("render", output_seconds)
+        code = render_single_pass(
+            work_dir, clip_jobs, audio, output, layers, canvas_size, fps, encode=final_encode, raster=raster, deliverables=deliverables
+        )
+        if code != 0:
+            eprint(f"[renderer] Single-pass render failed with code {code}")
+            return code
+        progress.finish()
+        print("[renderer] Render complete:", output)
+        return 0
+
+    seg_dir: Optional[str] = None
+    if options.get("segmentCache", True):
+        seg_dir = os.path.join(cache_root(work_dir), "segments")
+        os.makedirs(seg_dir, exist_ok=True)
+    encode = dict(final_encode or DEFAULT_ENCODE, threads=threads)
+
+    if stream:
+        buffer_mb = int(options.get("streamBufferMB") or 0) or env_int("vizmatic_STREAM_BUFFER_MB", DEFAULT_STREAM_BUFFER_MB)
+        print(f"[renderer] Streaming render: {jobs} clip decoder(s), {buffer_mb} MB frame buffer")
+        progress.begin("render", output_seconds)
+        code = render_streamed(
+            work_dir,
+            clip_jobs,
+            audio,
+            output,
+            layers,
+            canvas_size,
+            fps,
+            jobs,
+            buffer_mb,
+            seg_dir,
+            encode,
+            raster,
+            final_encode,
+            deliverables,
+        )
+        if code != 0:
+            eprint(f"[renderer] Streaming render failed with code {code}")
+            return code
+        progress.finish()
+        print("[renderer] Render complete:", output)
+        return 0
+    resume = bool(options.get("resume", True))
+    journal = RenderJournal(render_journal_path(work_dir, output)) if resume and seg_dir else None
+    print(f"[renderer] Segment workers: {jobs} x {threads} threads")
+    units: List[Tuple[str, Callable[[], str]]] = []
+    timeline = timeline_units(clip_jobs)
+    black_key = black_cache_key(canvas_size, fps, encode)
+    cuts: Dict[int, Optional[Tuple[float, float]]] = {}
+    if options.get("smartCut", True) and not draft:
+        cuts = {idx: smart_cut_plan(clip, canvas_size, fps, probe_dir, encode) for idx, clip in enumerate(clip_jobs)}
+        copied = sum(1 for cut in cuts.values() if cut)
+        if copied:
+            print(f"[renderer] Smart cut: {copied} of {len(clip_jobs)} clip(s) copy their keyframe-aligned interior")
+    # Seconds each distinct segment will encode; cache hits encode nothing.
+    pending: Dict[str, float] = {}
+    for kind, duration, idx in timeline:
+        cut = cuts.get(idx)
+        key = black_key if kind == "gap" else clip_cache_key(clip_jobs[idx], canvas_size, fps, encode, cut)
+        if not (seg_dir and os.path.isfile(os.path.join(seg_dir, f"{key}.mp4"))):
+            pending[key] = BLACK_SEGMENT_SECONDS if kind == "gap" else duration - (cut[1] - cut[0] if cut else 0.0)
+    for kind, duration, idx in timeline:
+        if kind == "gap":
+            # Every gap shares one canonical black segment (rendered once).
+            units.append((black_key, lambda: cached_segment(
+                seg_dir,
+                black_key,
+                "black",
+                lambda: render_blank_clip(work_dir, BLACK_SEGMENT_SECONDS, canvas_size, fps, encode),
+                journal,
+                BLACK_SEGMENT_SECONDS,
+            )))
+            continue
+        clip = clip_jobs[idx]
+        cut = cuts.get(idx)
+        key = clip_cache_key(clip, canvas_size, fps, encode, cut)
+        units.append((key, lambda key=key, clip=clip, idx=idx, cut=cut, duration=duration: cached_segment(
+            seg_dir,
+            key,
+            f"clip {idx}",
+            lambda: render_smart_cut_segment(work_dir, clip, idx, cut, canvas_size, fps, encode)
+            if cut
+            else render_clip_segment(work_dir, clip, idx, canvas_size, fps, encode),
+            journal,
+            duration,
+        )))
+    if journal and journal.entries:
+        finished = sum(1 for key in dict.fromkeys(k for k, _ in units) if key in journal.entries)
+        print(f"[renderer] Resuming: {finished} of {len(dict.fromkeys(k for k, _ in units))} segment(s) already rendered")
+
+    def canvas_video() -> Tuple[int, str]:
+        """Render (or reuse) every segment and join them into the canvas timeline."""
+        progress.begin("segments", sum(pending.values()))
+        render_paths = render_segments(units, jobs)
+        concat_entries: List[ConcatEntry] = []
+        for (kind, duration, _idx), path in zip(timeline, render_paths):
+            if kind == "gap":
+                concat_entries += gap_concat_entries(path, duration, fps)
+            else:
+                concat_entries.append((path, None))
+        if seg_dir:
+            prune_segment_cache(seg_dir, env_int("vizmatic_CACHE_MAX_MB", DEFAULT_CACHE_MAX_MB) * 1024 * 1024, render_paths)
+        progress.begin("concat", cursor)
+        concat_key = "concat:" + hash_key(concat_entries)
+        joined = os.path.join(work_dir, "concat_video.mp4")
+        if journal and journal.done(concat_key, joined):
+            print("[renderer] Resuming: reusing the joined timeline")
+            return 0, joined
+        code, tmp_video = concat_videos_to_h264(work_dir, concat_entries)
+        if code != 0:
+            eprint(f"[renderer] Concat stage failed with code {code}")
+        elif journal:
+            journal.record(concat_key, tmp_video, mtime=os.stat(tmp_video).st_mtime_ns)
+        return code, tmp_video
+
+    try:
+        resume_chunk_seconds = float(options.get("resumeChunkSeconds") or DEFAULT_RESUME_CHUNK_SECONDS)
+    except (TypeError, ValueError):
+        resume_chunk_seconds = DEFAULT_RESUME_CHUNK_SECONDS
+    incremental = bool(cli.incremental or options.get("incremental"))
+    chunks = cli.chunks or int(options.get("chunks") or 0)
+    # Opt-in: chunks restart animated image layers, so long composites only run
+    # as cached chunks (resuming mid-way) when the project asks for it.
+    resume_chunks = bool(
+        journal and options.get("resumeChunks") and chunks <= 1 and output_seconds > 1.5 * resume_chunk_seconds
+    )
+    if layers and (incremental or resume_chunks):
+        placed: List[Tuple[str, float, float]] = []
+        at = 0.0
+        for (_kind, duration, _idx), (key, _produce) in zip(timeline, units):
+            placed.append((key, at, duration))
+            at += duration
+        context = {
+            "canvas": list(canvas_size),
+            "fps": fps,
+            "encode": encode_identity(final_encode),
+            "layers": layers_identity(layers),
+            # Audio only reaches the picture through audio-reactive layers.
+            "audio": file_identity(audio) if audio and layers_read_audio(layers) else None,
+            "raster": bool(raster and raster["runs"]),
+            "analysis": ANALYSIS_CACHE_VERSION,
+        }
+
+        def composite_canvas() -> Tuple[int, str]:
+            result = canvas_video()
+            progress.begin("composite", output_seconds)
+            return result
+
+        try:
+            chunk_seconds = float(options.get("incrementalChunkSeconds") or DEFAULT_INCREMENTAL_CHUNK_SECONDS)
+        except (TypeError, ValueError):
+            chunk_seconds = DEFAULT_INCREMENTAL_CHUNK_SECONDS
+        label = "Incremental render" if incremental else "Resumable composite"
+        if not incremental:
+            chunk_seconds = resume_chunk_seconds
+        code = render_incremental(
+            work_dir,
+            audio,
+            output,
+            layers,
+            fps,
+            output_seconds,
+            placed,
+            context,
+            composite_canvas,
+            jobs,
+            threads,
+            chunk_seconds,
+            raster,
+            final_encode,
+            journal,
+            label,
+            deliverables,
+        )
+        if code != 0:
+            eprint(f"[renderer] {label} failed with code {code}")
+            return code
+        progress.finish()
+        print("[renderer] Render complete:", output)
+        return 0
+
+    code, tmp_video = canvas_video()
     if code != 0:
-        eprint(f"[renderer] Concat stage failed with code {code}")
         return code
+    if audio or layers:
+        progress.begin("composite", output_seconds)
 
-    if audio or layers or canvas_size:
-        code = mux_audio_video(tmp_video, audio, output, layers, canvas=canvas_size)
+    if layers and chunks > 1:
+        code = render_chunked(work_dir, tmp_video, audio, output, layers, fps, chunks, jobs, threads, raster, final_encode, deliverables)
+        if code != 0:
+            eprint(f"[renderer] Chunked render failed with code {code}")
+            return code
+    elif audio or layers or deliverables:
+        # Segments are rendered at canvas size, so the mux only composites layers.
+        code = mux_audio_video(
+            tmp_video,
+            audio,
+            output,
+            layers,
+            asset_dir=cache_root(work_dir),
+            raster=raster,
+            fps=fps,
+            encode=final_encode,
+            deliverables=deliverables,
+        )
         if code != 0:
             eprint(f"[renderer] Mux stage failed with code {code}")
             return code
@@ -786,6 +5145,9 @@ def main(argv: List[str]) -> int:
             eprint(f"[renderer] Failed to move temp video to output: {exc}")
             return 1
 
+    if journal:
+        journal.compact([key for key, _ in units])
+    progress.finish()
     print("[renderer] Render complete:", output)
     return 0
 
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The renderer is a script, not a package; import it as the `main` module.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
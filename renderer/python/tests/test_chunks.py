@@ -0,0 +1,47 @@
+import pytest
+
+import main
+
+
+def assert_tiles(chunks, total, fps):
+    assert chunks[0][0] == 0
+    assert chunks[-1][1] == pytest.approx(total)
+    for (_a, end), (start, _b) in zip(chunks, chunks[1:]):
+        assert end == start
+    for start, end in chunks:
+        assert end > start
+        assert start * fps == pytest.approx(round(start * fps))
+
+
+def test_without_keyframes_the_whole_span_is_one_chunk():
+    assert main.plan_chunks([], 10.0, 4, 30.0) == [(0.0, 10.0)]
+    assert main.plan_chunks([0.0, 1.0, 2.0], 10.0, 1, 30.0) == [(0.0, 10.0)]
+
+
+def test_boundaries_snap_to_the_keyframe_nearest_each_target():
+    keyframes = [float(t) for t in range(10)]
+    chunks = main.plan_chunks(keyframes, 10.0, 4, 30.0)
+    # Targets 2.5 / 5 / 7.5 s; ties go to the earlier keyframe.
+    assert chunks == [(0.0, 2.0), (2.0, 5.0), (5.0, 7.0), (7.0, 10.0)]
+
+
+def test_fewer_keyframes_than_chunks_yields_fewer_chunks():
+    chunks = main.plan_chunks([4.0], 8.0, 4, 25.0)
+    assert chunks == [(0.0, 4.0), (4.0, 8.0)]
+
+
+def test_keyframes_outside_the_span_are_ignored():
+    chunks = main.plan_chunks([-1.0, 0.0, 12.0, 20.0], 12.0, 3, 30.0)
+    assert chunks == [(0.0, 12.0)]
+
+
+@pytest.mark.parametrize("fps", [24.0, 29.97, 30.0, 60.0])
+@pytest.mark.parametrize("count", [2, 3, 8])
+def test_chunks_tile_the_span_on_the_frame_grid(fps, count):
+    total = 17.3
+    keyframes = [0.5 + 1.37 * k for k in range(13)]
+    chunks = main.plan_chunks(keyframes, total, count, fps)
+    assert 1 <= len(chunks) <= count
+    assert_tiles(chunks, round(total * fps) / fps, fps)
+    key_frames = {round(t * fps) for t in keyframes}
+    assert all(round(start * fps) in key_frames for start, _end in chunks[1:])
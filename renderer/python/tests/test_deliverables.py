@@ -0,0 +1,135 @@
+import os
+
+import pytest
+
+import main
+
+
+def deliverables(*items, output="/renders/out.mp4", seconds=12.5, audio="/renders/song.wav"):
+    project = {"audio": {"path": audio} if audio else None, "output": {"deliverables": list(items)}}
+    return main.project_deliverables(project, output, seconds)
+
+
+def test_names_paths_and_codecs_follow_the_entry():
+    got = deliverables(
+        {"name": "square", "crop": "1:1"},
+        {"path": "/renders/web.webm"},
+        {"path": "/renders/audio.m4a"},
+        {"name": "silent", "video": False},
+        "not a deliverable",
+    )
+    assert [(d["name"], d["path"], d["videoCodec"], d["audioCodec"]) for d in got] == [
+        ("square", os.path.join("/renders", "out_square.mp4"), "libx264", "aac"),
+        ("deliverable2", "/renders/web.webm", "libvpx-vp9", "libopus"),
+        ("deliverable3", "/renders/audio.m4a", None, "aac"),
+        ("silent", os.path.join("/renders", "out_silent.mp4"), None, "aac"),
+    ]
+    assert all(d["seconds"] == 12.5 for d in got)
+    assert got[0]["crop"] == "1:1"
+
+
+def test_projects_without_deliverables_have_none():
+    assert main.project_deliverables({}, "/renders/out.mp4", 1.0) == []
+    assert main.project_deliverables({"output": {"deliverables": "x"}}, "/renders/out.mp4", 1.0) == []
+
+
+def test_audio_only_deliverables_need_project_audio():
+    assert [d["videoCodec"] for d in deliverables({"name": "a"}, audio=None)] == ["libx264"]
+    with pytest.raises(ValueError, match="silent"):
+        deliverables({"name": "a"}, {"name": "silent", "video": False}, audio=None)
+    with pytest.raises(ValueError, match="deliverable1"):
+        deliverables({"path": "/r/a.wav"}, audio=None)
+
+
+def test_split_fans_out_to_video_deliverables_and_the_main_output():
+    items = deliverables({"name": "a", "width": 1080}, {"path": "/r/a.mp3"}, {"name": "b"})
+    parts, labels = main.deliverable_split("[vout]", items, keep="[main]")
+    assert parts == [
+        "[vout]split=3[dv0][dv2][main]",
+        "[dv0]scale=w=1080:h=-2:flags=lanczos[do0]",
+        "[dv2]null[do2]",
+    ]
+    assert labels == ["[do0]", None, "[do2]", "[main]"]
+
+
+def test_single_output_uses_null_instead_of_split():
+    items = deliverables({"name": "a", "fps": 24})
+    parts, labels = main.deliverable_split("[0:v]", items)
+    assert parts == ["[0:v]null[dv0]", "[dv0]fps=24[do0]"]
+    assert labels == ["[do0]"]
+    parts, labels = main.deliverable_split("[vout]", [], keep="[main]")
+    assert parts == ["[vout]null[main]"]
+    assert labels == ["[main]"]
+
+
+def test_audio_only_deliverables_need_no_filter():
+    items = deliverables({"path": "/r/a.wav"}, {"path": "/r/b.mp3"})
+    assert main.deliverable_split("[0:v]", items) == ([], [None, None])
+    assert main.deliverable_split("[0:v]", items, keep="[main]") == (["[0:v]null[main]"], [None, None, "[main]"])
+
+
+def test_filter_chains_crop_scale_and_rate():
+    assert main.deliverable_filter({}) == "null"
+    assert main.deliverable_filter({"crop": "9:16", "height": 1920, "fps": 30}) == (
+        "crop=w='trunc(min(iw,ih*0.562500)/2)*2':h='trunc(min(ih,iw/0.562500)/2)*2',"
+        "scale=w=-2:h=1920:flags=lanczos,fps=30"
+    )
+    assert main.deliverable_filter({"crop": {"x": 0.25, "width": 0.5}}) == (
+        "crop=w='trunc(iw*0.5/2)*2':h='trunc(ih*1.0/2)*2':x='iw*0.25':y='ih*0.0'"
+    )
+    assert main.deliverable_filter({"crop": "1:0"}) == "null"
+
+
+def test_args_for_video_and_audio_outputs():
+    mp4, webm, mp3 = deliverables({"name": "a", "crf": 18}, {"path": "/r/b.webm", "bitrate": "2M"}, {"path": "/r/c.mp3"})
+    assert main.deliverable_args(mp4, "[do0]", "1:a") == [
+        "-map", "[do0]", "-c:v", "libx264", "-preset", "medium", "-crf", "18", "-pix_fmt", "yuv420p",
+        "-map", "1:a", "-c:a", "aac", "-b:a", "192k", "-shortest", mp4["path"],
+    ]
+    assert main.deliverable_args(webm, "[do1]", None) == [
+        "-map", "[do1]", "-c:v", "libvpx-vp9", "-b:v", "2M", "-pix_fmt", "yuv420p", "-an", "/r/b.webm",
+    ]
+    assert main.deliverable_args(mp3, None, "1:a") == [
+        "-vn", "-map", "1:a", "-c:a", "libmp3lame", "-b:a", "192k", "-t", "12.500", "/r/c.mp3",
+    ]
+
+
+def test_constant_quality_vp9_sets_zero_bitrate():
+    (webm,) = deliverables({"path": "/r/b.webm"})
+    args = main.deliverable_args(webm, "[do0]", "1:a")
+    assert args[args.index("-crf") : args.index("-crf") + 4] == ["-crf", "23", "-b:v", "0"]
+    assert "-preset" not in args
+
+
+def test_copied_video_keeps_the_chunk_encode():
+    (mp4,) = deliverables({"name": "a", "crf": 18})
+    assert main.deliverable_args(mp4, "0:v", "2:a", copy_video=True) == [
+        "-map", "0:v", "-c:v", "copy", "-map", "2:a", "-c:a", "aac", "-b:a", "192k", "-shortest", mp4["path"],
+    ]
+
+
+def test_identity_ignores_where_a_deliverable_is_written():
+    a, b, c, d = deliverables(
+        {"name": "a", "crop": "1:1"}, {"path": "/elsewhere/b.mp4", "crop": "1:1"}, {"name": "c"}, {"path": "/r/d.webm", "crop": "1:1"}
+    )
+    assert main.deliverable_identity(a) == main.deliverable_identity(b)
+    assert main.deliverable_identity(a) != main.deliverable_identity(c)
+    assert main.deliverable_identity(b) != main.deliverable_identity(d)
+
+
+def test_stitch_joins_video_chunks_and_encodes_audio_from_the_source(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(main, "run_ffmpeg", lambda args, **_kw: calls.append(args) or 0)
+    mp4, m4a = deliverables({"name": "a"}, {"path": "/r/a.m4a"})
+    chunks = {0: [str(tmp_path / "c0.mp4"), str(tmp_path / "c1.mp4")]}
+    assert main.stitch_deliverables(str(tmp_path), chunks, "/renders/song.wav", [mp4, m4a]) == 0
+    (args,) = calls
+    list_path = str(tmp_path / "deliverable_0.txt")
+    assert args[args.index("-f") + 1 : args.index("-f") + 3] == ["concat", "-i"]
+    assert args[args.index(list_path) + 1 : args.index(list_path) + 3] == ["-i", "/renders/song.wav"]
+    assert args[args.index("/renders/song.wav") + 1 :] == (
+        main.deliverable_args(mp4, "0:v", "1:a", copy_video=True) + main.deliverable_args(m4a, None, "1:a")
+    )
+    assert (tmp_path / "deliverable_0.txt").read_text().count("file ") == 2
+    assert main.stitch_deliverables(str(tmp_path), {}, None, []) == 0
+    assert len(calls) == 1
@@ -0,0 +1,55 @@
+import pytest
+
+import main
+
+
+def test_defaults_halve_the_canvas_and_cap_the_rate():
+    assert main.draft_settings((1920, 1080), 30.0, {}) == ((960, 540), 15.0, 0.5)
+
+
+def test_dimensions_stay_even():
+    for canvas in [(1000, 562), (1281, 721), (640, 362)]:
+        for scale in (0.3, 0.5, 0.77):
+            (w, h), _fps, _scale = main.draft_settings(canvas, 30.0, {"draftScale": scale})
+            assert w % 2 == 0 and h % 2 == 0
+            assert w == pytest.approx(canvas[0] * scale, abs=2)
+            assert h == pytest.approx(canvas[1] * scale, abs=2)
+
+
+def test_returned_scale_matches_the_draft_width():
+    size, _fps, scale = main.draft_settings((1000, 562), 30.0, {"draftScale": 0.33})
+    assert scale == size[0] / 1000
+
+
+@pytest.mark.parametrize(
+    "options, size",
+    [
+        ({"draftScale": 5}, (1920, 1080)),
+        ({"draftScale": 0.01}, (192, 108)),
+        ({"draftScale": "bogus"}, (960, 540)),
+        ({"draftScale": 0}, (960, 540)),
+    ],
+)
+def test_scale_is_clamped_and_defaulted(options, size):
+    assert main.draft_settings((1920, 1080), 30.0, options)[0] == size
+
+
+@pytest.mark.parametrize(
+    "fps, options, expected",
+    [
+        (30.0, {"draftFps": 60}, 30.0),
+        (60.0, {"draftFps": 24}, 24.0),
+        (30.0, {"draftFps": "fast"}, 15.0),
+        (30.0, {"draftFps": 0.2}, 1.0),
+        (12.0, {}, 12.0),
+    ],
+)
+def test_rate_never_exceeds_the_project_rate(fps, options, expected):
+    assert main.draft_settings((1920, 1080), fps, options)[1] == expected
+
+
+def test_scale_layers_scales_pixel_keys_only():
+    layer = {"type": "text", "x": 0.25, "y": 0.5, "fontSize": 40, "outlineWidth": 2, "visible": True, "speed": 3}
+    (scaled,) = main.scale_layers([layer], 0.5)
+    assert scaled == {"type": "text", "x": 0.25, "y": 0.5, "fontSize": 20.0, "outlineWidth": 1.0, "visible": True, "speed": 1.5}
+    assert layer["fontSize"] == 40
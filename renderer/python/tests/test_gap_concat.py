@@ -0,0 +1,49 @@
+import pytest
+
+import main
+
+BLACK = "/cache/black.mp4"
+
+
+def covered(entries):
+    return sum(main.BLACK_SEGMENT_SECONDS if outpoint is None else outpoint for _path, outpoint in entries)
+
+
+def test_short_gap_is_one_cut_copy():
+    assert main.gap_concat_entries(BLACK, 1.0, 30.0) == [(BLACK, 1.0)]
+
+
+def test_whole_multiples_need_no_cut():
+    assert main.gap_concat_entries(BLACK, 2.0, 30.0) == [(BLACK, None)]
+    assert main.gap_concat_entries(BLACK, 6.0, 30.0) == [(BLACK, None)] * 3
+
+
+def test_long_gap_repeats_then_cuts_the_last_copy():
+    entries = main.gap_concat_entries(BLACK, 5.5, 30.0)
+    assert entries[:2] == [(BLACK, None), (BLACK, None)]
+    assert entries[2] == (BLACK, pytest.approx(1.5))
+    assert len(entries) == 3
+
+
+def test_remainders_under_half_a_frame_are_dropped():
+    # 3.99 s is 4 s to the nearest frame at 30 fps: two whole copies, no 0-length cut.
+    assert main.gap_concat_entries(BLACK, 3.99, 30.0) == [(BLACK, None)] * 2
+    assert main.gap_concat_entries(BLACK, 0.01, 30.0) == []
+
+
+@pytest.mark.parametrize("fps", [24.0, 30.0, 60.0])
+@pytest.mark.parametrize("duration", [0.1, 0.5, 1.999, 2.001, 3.25, 7.0, 12.34])
+def test_entries_cover_the_gap_to_within_half_a_frame(duration, fps):
+    entries = main.gap_concat_entries(BLACK, duration, fps)
+    assert abs(covered(entries) - duration) <= 0.5 / fps + 1e-9
+    assert all(outpoint is None or 0 < outpoint < main.BLACK_SEGMENT_SECONDS for _path, outpoint in entries)
+
+
+def test_concat_list_writes_outpoints_and_escapes_quotes(tmp_path):
+    dest = tmp_path / "concat.txt"
+    main.write_concat_list([("/a/it's.mp4", None), (BLACK, 1.25)], str(dest))
+    assert dest.read_text(encoding="utf-8") == (
+        "file '/a/it'\\''s.mp4'\n"
+        f"file '{BLACK}'\n"
+        "outpoint 1.250000\n"
+    )
@@ -0,0 +1,107 @@
+import json
+import os
+
+import main
+
+
+def unit(tmp_path, name, data=b"segment"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_recorded_units_survive_a_reload(tmp_path):
+    journal_path = str(tmp_path / "render.journal")
+    seg = unit(tmp_path, "a.mp4")
+    main.RenderJournal(journal_path).record("a", seg)
+    assert main.RenderJournal(journal_path).done("a", seg)
+
+
+def test_size_change_or_missing_file_is_not_done(tmp_path):
+    journal = main.RenderJournal(str(tmp_path / "render.journal"))
+    seg = unit(tmp_path, "a.mp4")
+    journal.record("a", seg)
+    with open(seg, "ab") as f:
+        f.write(b"more")
+    assert not journal.done("a", seg)
+    os.remove(seg)
+    assert not journal.done("a", seg)
+    assert not journal.done("unknown", seg)
+
+
+def test_pinned_mtime_must_match(tmp_path):
+    journal = main.RenderJournal(str(tmp_path / "render.journal"))
+    seg = unit(tmp_path, "chunk.mp4")
+    journal.record("chunk", seg, mtime=os.stat(seg).st_mtime_ns)
+    assert journal.done("chunk", seg)
+    st = os.stat(seg)
+    os.utime(seg, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert not journal.done("chunk", seg)
+
+
+def test_torn_and_foreign_lines_are_ignored(tmp_path):
+    journal_path = tmp_path / "render.journal"
+    seg = unit(tmp_path, "a.mp4")
+    main.RenderJournal(str(journal_path)).record("a", seg)
+    with open(journal_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"version": main.RESUME_JOURNAL_VERSION + 1, "key": "b", "size": 7}) + "\n")
+        f.write(json.dumps({"version": main.RESUME_JOURNAL_VERSION, "size": 7}) + "\n")
+        f.write('{"version": 1, "key": "c", "si')
+    journal = main.RenderJournal(str(journal_path))
+    assert set(journal.entries) == {"a"}
+
+
+def test_verify_trusts_journaled_units_without_probing(tmp_path, monkeypatch):
+    journal = main.RenderJournal(str(tmp_path / "render.journal"))
+    seg = unit(tmp_path, "a.mp4")
+    journal.record("a", seg)
+
+    def probe(path, seconds):
+        raise AssertionError("journaled units must not be probed")
+
+    monkeypatch.setattr(main, "media_duration_ok", probe)
+    assert journal.verify("a", seg, 4.0)
+
+
+def test_verify_records_unjournaled_units_that_pass_the_stream_check(tmp_path, monkeypatch):
+    journal_path = str(tmp_path / "render.journal")
+    journal = main.RenderJournal(journal_path)
+    good = unit(tmp_path, "good.mp4")
+    bad = unit(tmp_path, "bad.mp4")
+    monkeypatch.setattr(main, "media_duration_ok", lambda path, seconds: path == good)
+    assert journal.verify("good", good, 4.0)
+    assert not journal.verify("bad", bad, 4.0)
+    assert set(main.RenderJournal(journal_path).entries) == {"good"}
+
+
+def test_verify_without_a_duration_skips_the_stream_check(tmp_path, monkeypatch):
+    journal = main.RenderJournal(str(tmp_path / "render.journal"))
+    seg = unit(tmp_path, "a.mp4")
+    monkeypatch.setattr(main, "media_duration_ok", lambda path, seconds: False)
+    assert journal.verify("a", seg, None)
+    assert journal.done("a", seg)
+
+
+def test_compact_keeps_only_the_listed_keys_once(tmp_path):
+    journal_path = tmp_path / "render.journal"
+    journal = main.RenderJournal(str(journal_path))
+    paths = {k: unit(tmp_path, f"{k}.mp4") for k in "abc"}
+    for key, path in paths.items():
+        journal.record(key, path)
+    journal.record("a", paths["a"])
+    journal.compact(["c", "a", "c", "missing"])
+    lines = journal_path.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["key"] for line in lines] == ["c", "a"]
+    assert set(journal.entries) == {"a", "c"}
+    assert set(main.RenderJournal(str(journal_path)).entries) == {"a", "c"}
+    assert not [p for p in os.listdir(tmp_path) if p.endswith(".tmp")]
+
+
+def test_journal_path_depends_on_the_output_only(tmp_path, monkeypatch):
+    monkeypatch.delenv("vizmatic_CACHE_DIR", raising=False)
+    work = str(tmp_path / "work")
+    first = main.render_journal_path(work, str(tmp_path / "out.mp4"))
+    assert first == main.render_journal_path(work, str(tmp_path / "." / "out.mp4"))
+    assert first != main.render_journal_path(work, str(tmp_path / "other.mp4"))
+    assert os.path.dirname(first) == os.path.join(work, "cache", "manifests")
+    assert os.path.isdir(os.path.dirname(first))
@@ -0,0 +1,42 @@
+import pytest
+
+import main
+
+np = pytest.importorskip("numpy")
+
+CANVAS = (640, 360)
+FPS = 30.0
+
+
+def particles(**extra):
+    layer = {"id": "p1", "type": "particles", "x": 0.5, "y": 0.5, "width": 0.5, "height": 0.5}
+    layer.update(extra)
+    return layer
+
+
+@pytest.mark.parametrize("audio", [None, "/nonexistent/song.mp3"])
+def test_stream_covers_the_timeline_for_non_responsive_particles(tmp_path, audio):
+    raster = main.prepare_raster_layers(str(tmp_path), audio, [particles(audioResponsive=False)], CANVAS, FPS, 10.0)
+    assert raster is not None
+    assert raster["frames"] == 300
+    assert raster["skip"] == {0}
+
+
+def test_failed_audio_analysis_keeps_particles_rasterized(tmp_path, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("decode failed")
+
+    monkeypatch.setattr(main, "analyze_energy", fail)
+    raster = main.prepare_raster_layers(str(tmp_path), "/music/song.mp3", [particles()], CANVAS, FPS, 4.0)
+    assert raster is not None
+    assert raster["frames"] == 120
+
+
+def test_audio_longer_than_the_timeline_sets_the_length(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "analyze_energy", lambda *args, **kwargs: np.zeros(450, dtype=np.float32))
+    raster = main.prepare_raster_layers(str(tmp_path), "/music/song.mp3", [particles()], CANVAS, FPS, 10.0)
+    assert raster["frames"] == 450
+
+
+def test_layers_without_raster_types_use_filters(tmp_path):
+    assert main.prepare_raster_layers(str(tmp_path), None, [{"type": "text", "text": "hi"}], CANVAS, FPS, 10.0) is None
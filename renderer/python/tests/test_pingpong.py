@@ -0,0 +1,70 @@
+import shutil
+import subprocess
+
+import pytest
+
+import main
+
+CANVAS = (160, 90)
+FPS = 30.0
+FRAME = 160 * 90 * 3 // 2
+# Lossless segments make the rendered fill comparable frame for frame.
+LOSSLESS = dict(main.DEFAULT_ENCODE, crf=0)
+
+
+def pingpong(path, seg_len, duration, trim_start=0.0):
+    return {"path": path, "trimStart": trim_start, "trimEnd": trim_start + seg_len, "duration": duration, "fillMethod": "pingpong"}
+
+
+@pytest.mark.parametrize("duration", [7.0, 70.0, 700.0])
+def test_input_count_does_not_grow_with_the_slot(duration, tmp_path):
+    input_args, parts = main.build_pingpong_graph(pingpong("/media/a.mp4", 1.0, duration), CANVAS, FPS, 0, "pp", "[v]", str(tmp_path))
+    assert input_args.count("-i") == 2  # the forward pass and one reversed chunk
+    assert parts[-1].startswith("[ppcycle]loop=")
+    assert f"trim=duration={duration:.3f}" in parts[-1]
+    assert not list(tmp_path.iterdir())
+
+
+def test_short_slots_play_the_pieces_directly(tmp_path):
+    input_args, parts = main.build_pingpong_graph(pingpong("/media/a.mp4", 1.0, 1.5), CANVAS, FPS, 3, "pp", "[v]", str(tmp_path))
+    assert input_args.count("-i") == 2
+    assert parts[0].startswith("[3:v]")
+    assert "loop=" not in ";".join(parts)
+
+
+def decoded_frames(path, *input_args):
+    args = [main.ffmpeg_exe(), "-v", "error"] + list(input_args) + ["-i", path, "-f", "rawvideo", "-pix_fmt", "yuv420p", "-"]
+    data = subprocess.run(args, stdout=subprocess.PIPE, check=True).stdout
+    return [data[i : i + FRAME] for i in range(0, len(data), FRAME)]
+
+
+@pytest.fixture
+def source(tmp_path):
+    if not shutil.which(main.ffmpeg_exe()):
+        pytest.skip("ffmpeg is not installed")
+    path = str(tmp_path / "src.mp4")
+    code = main.run_ffmpeg(
+        ["-hide_banner", "-y", "-f", "lavfi", "-i", "testsrc2=size=160x90:rate=30", "-t", "2"]
+        + main.segment_output_args(LOSSLESS, path),
+        with_progress=False,
+    )
+    assert code == 0
+    return path
+
+
+@pytest.mark.parametrize("memory_mb", [None, "1"])
+def test_rendered_fill_bounces_for_the_whole_slot(source, tmp_path, monkeypatch, memory_mb):
+    # 1 MB holds fewer frames than the cycle, so the cycle spills to raw frames.
+    if memory_mb:
+        monkeypatch.setenv("vizmatic_PINGPONG_MEM_MB", memory_mb)
+    work = tmp_path / "work"
+    work.mkdir()
+    out = main.render_clip_segment(str(work), pingpong(source, 1.0, 7.0, trim_start=0.5), 0, CANVAS, FPS, LOSSLESS)
+    src = decoded_frames(source)[15:45]
+    got = decoded_frames(out)
+    assert len(got) == 210
+    assert got == ((src + src[::-1]) * 4)[:210]
+    spills = [p.name for p in work.iterdir() if p.suffix == ".yuv"]
+    assert len(spills) == (1 if memory_mb else 0)
+    main.remove_pingpong_spills()
+    assert not [p for p in work.iterdir() if p.suffix == ".yuv"]
@@ -0,0 +1,92 @@
+import os
+
+import pytest
+
+import main
+
+CANVAS = (640, 360)
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(b"not really video")
+    return str(path)
+
+
+def clip(path, **extra):
+    base = {"path": path, "trimStart": 0.0, "trimEnd": 2.0, "duration": 2.0, "fillMethod": "loop"}
+    base.update(extra)
+    return base
+
+
+def test_key_is_stable_for_identical_inputs(source):
+    assert main.clip_cache_key(clip(source), CANVAS, 30.0) == main.clip_cache_key(clip(source), CANVAS, 30.0)
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        {"trimStart": 0.5},
+        {"trimEnd": 1.5},
+        {"duration": 3.0},
+        {"fillMethod": "pingpong"},
+        {"hue": 90},
+        {"flipH": True},
+    ],
+)
+def test_key_changes_with_clip_settings(source, change):
+    assert main.clip_cache_key(clip(source, **change), CANVAS, 30.0) != main.clip_cache_key(clip(source), CANVAS, 30.0)
+
+
+def test_key_changes_with_canvas_rate_encode_and_cut(source):
+    key = main.clip_cache_key(clip(source), CANVAS, 30.0)
+    assert main.clip_cache_key(clip(source), (1280, 720), 30.0) != key
+    assert main.clip_cache_key(clip(source), CANVAS, 25.0) != key
+    assert main.clip_cache_key(clip(source), CANVAS, 30.0, dict(main.DEFAULT_ENCODE, crf=28)) != key
+    assert main.clip_cache_key(clip(source), CANVAS, 30.0, cut=(0.0, 1.0)) != key
+
+
+def test_thread_count_and_fill_case_do_not_change_key(source):
+    key = main.clip_cache_key(clip(source), CANVAS, 30.0)
+    assert main.clip_cache_key(clip(source), CANVAS, 30.0, dict(main.DEFAULT_ENCODE, threads=8)) == key
+    assert main.clip_cache_key(clip(source, fillMethod="LOOP"), CANVAS, 30.0) == key
+
+
+def test_key_follows_source_modification(source):
+    key = main.clip_cache_key(clip(source), CANVAS, 30.0)
+    st = os.stat(source)
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert main.clip_cache_key(clip(source), CANVAS, 30.0) != key
+
+
+def test_proxy_clips_are_keyed_by_their_source(source, tmp_path):
+    proxy = tmp_path / "proxy.mp4"
+    proxy.write_bytes(b"proxy")
+    key = main.clip_cache_key(clip(str(proxy), proxyOf=source), CANVAS, 30.0)
+    assert key != main.clip_cache_key(clip(source), CANVAS, 30.0)
+    # Cache hits touch the proxy; that must not invalidate segments rendered from it.
+    st = os.stat(proxy)
+    os.utime(proxy, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert main.clip_cache_key(clip(str(proxy), proxyOf=source), CANVAS, 30.0) == key
+
+
+def test_cross_device_publish_copies_under_a_private_name(tmp_path, monkeypatch):
+    src = tmp_path / "work" / "seg.mp4"
+    src.parent.mkdir()
+    src.write_bytes(b"segment")
+    dest = str(tmp_path / "cache.mp4")
+    real_replace = os.replace
+    published = []
+
+    def replace(a, b):
+        if a == str(src):
+            raise OSError("cross-device link")
+        published.append(a)
+        real_replace(a, b)
+
+    monkeypatch.setattr(main.os, "replace", replace)
+    main.move_into_cache(str(src), dest)
+    assert open(dest, "rb").read() == b"segment"
+    assert not src.exists()
+    assert published == [f"{dest}.{os.getpid()}.{main.threading.get_ident()}.part"]
@@ -0,0 +1,42 @@
+import io
+import json
+import sys
+import threading
+
+import main
+
+
+def serve(monkeypatch, lines, job):
+    """Run serve_main over lines; job(argv) stands in for a render."""
+    out = io.StringIO()
+    monkeypatch.setattr(sys, "stdout", out)
+    monkeypatch.setattr(main, "main", job)
+    monkeypatch.setattr(sys, "stdin", lines)
+    assert main.serve_main([]) == 0
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def test_a_reused_pending_job_id_is_rejected(monkeypatch):
+    release = threading.Event()
+    renders = []
+
+    def job(argv):
+        renders.append(argv[1])
+        release.wait(5)
+        return 0
+
+    def lines():
+        yield json.dumps({"id": "a", "method": "render", "params": {"project": "first.json"}})
+        yield json.dumps({"id": "a", "method": "render", "params": {"project": "second.json"}})
+        yield json.dumps({"id": "b", "method": "render", "params": {"project": "third.json"}})
+        release.set()
+        yield json.dumps({"id": "x", "method": "shutdown"})
+
+    events = serve(monkeypatch, lines(), job)
+    assert renders == ["first.json", "third.json"]
+    # The rejection may land before or after the first job starts.
+    seen = [e["event"] for e in events if e.get("id") == "a"]
+    assert seen[0] == "queued" and seen[-1] == "done" and sorted(seen[1:-1]) == ["error", "started"]
+    (rejected,) = [e for e in events if e.get("id") == "a" and e["event"] == "error"]
+    assert "already queued or running" in rejected["message"]
+    assert [e["event"] for e in events if e.get("id") == "b"] == ["queued", "started", "done"]
@@ -0,0 +1,211 @@
+import shutil
+import subprocess
+
+import pytest
+
+import main
+
+CANVAS = (640, 360)
+
+
+@pytest.fixture
+def probes(monkeypatch, tmp_path):
+    """Stub the ffprobe calls: a 10 s H.264 source at the canvas with a keyframe every second."""
+    source = tmp_path / "src.mp4"
+    source.write_bytes(b"h264")
+    state = {
+        "stream": {
+            "codec_name": "h264",
+            "pix_fmt": "yuv420p",
+            "width": 640,
+            "height": 360,
+            "sample_aspect_ratio": "1:1",
+            "r_frame_rate": "30/1",
+            "profile": "High",
+            "level": 30,
+            "time_base": "1/90000",
+            "extradata_hash": "sha256:5ca1ab1e",
+            "start_time": "0.000000",
+        },
+        "keyframes": [float(t) for t in range(10)],
+        "duration": 10.0,
+        "calls": [],
+    }
+
+    def probe_video_stream(path):
+        state["calls"].append(("stream", path))
+        return dict(state["stream"])
+
+    def video_keyframes(path, span=None):
+        state["calls"].append(("keyframes", span))
+        lo, hi = span if span else (float("-inf"), float("inf"))
+        # ffprobe -read_intervals starts at the keyframe before lo.
+        before = [t for t in state["keyframes"] if t <= lo]
+        first = before[-1] if before else float("-inf")
+        return [t for t in state["keyframes"] if first <= t <= hi], state["duration"]
+
+    def edge_stream_params(path, canvas, fps, encode, scratch_dir):
+        state["calls"].append(("edge", encode))
+        edge = dict(state["stream"], **state["edge"])
+        return {k: edge.get(k) for k in main.CONCAT_COPY_KEYS}
+
+    state["edge"] = {}
+    monkeypatch.setattr(main, "probe_video_stream", probe_video_stream)
+    monkeypatch.setattr(main, "edge_stream_params", edge_stream_params)
+    monkeypatch.setattr(main, "video_keyframes", video_keyframes)
+    monkeypatch.setattr(main, "_probe_memo", {})
+    state["path"] = str(source)
+    return state
+
+
+def clip(path, trim_start=1.3, duration=6.0, **extra):
+    base = {"path": path, "trimStart": trim_start, "trimEnd": trim_start + duration, "duration": duration}
+    base.update(extra)
+    return base
+
+
+def test_copy_span_is_bounded_by_keyframes_inside_the_trim(probes):
+    assert main.smart_cut_plan(clip(probes["path"]), CANVAS, 30.0) == (2.0, 7.0)
+
+
+def test_keyframe_on_the_trim_start_is_used(probes):
+    assert main.smart_cut_plan(clip(probes["path"], trim_start=3.0, duration=4.5), CANVAS, 30.0) == (3.0, 7.0)
+
+
+@pytest.mark.parametrize(
+    "extra",
+    [
+        {"hue": 30},
+        {"invert": True},
+        {"fillMethod": "pingpong"},
+        {"trimEnd": 3.3},  # loop fill: the trim is shorter than the slot
+    ],
+)
+def test_touched_clips_are_not_cut(probes, extra):
+    assert main.smart_cut_plan(clip(probes["path"], **extra), CANVAS, 30.0) is None
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        {"codec_name": "hevc"},
+        {"pix_fmt": "yuv422p"},
+        {"width": 1280},
+        {"sample_aspect_ratio": "4:3"},
+        {"r_frame_rate": "25/1"},
+    ],
+)
+def test_sources_needing_normalization_are_not_cut(probes, change):
+    probes["stream"].update(change)
+    assert main.smart_cut_plan(clip(probes["path"]), CANVAS, 30.0) is None
+
+
+def test_slot_running_past_the_source_is_not_cut(probes):
+    assert main.smart_cut_plan(clip(probes["path"], trim_start=6.0, duration=6.0), CANVAS, 30.0) is None
+
+
+def test_less_than_a_second_of_whole_gops_is_not_worth_copying(probes):
+    assert main.smart_cut_plan(clip(probes["path"], trim_start=2.5, duration=1.2), CANVAS, 30.0) is None
+
+
+def test_keyframes_are_relative_to_the_stream_start(probes):
+    probes["stream"]["start_time"] = "0.500000"
+    probes["keyframes"] = [0.5 + t for t in range(10)]
+    probes["duration"] = 10.5
+    assert main.smart_cut_plan(clip(probes["path"]), CANVAS, 30.0) == (2.0, 7.0)
+
+
+def test_keyframe_scan_is_limited_to_the_trimmed_range(probes):
+    main.smart_cut_plan(clip(probes["path"]), CANVAS, 30.0)
+    spans = [span for kind, span in probes["calls"] if kind == "keyframes"]
+    assert len(spans) == 1
+    lo, hi = spans[0]
+    assert lo <= 1.3 and hi >= 7.3
+    assert hi - lo < 10.0
+
+
+@pytest.mark.parametrize("change", [{"extradata_hash": "sha256:0ther"}, {"profile": "Main"}, {"level": 31}])
+def test_sources_from_other_encoders_are_not_cut(probes, change):
+    probes["edge"] = change
+    assert main.smart_cut_plan(clip(probes["path"]), CANVAS, 30.0) is None
+
+
+def test_sources_without_extradata_are_not_cut(probes):
+    probes["stream"]["extradata_hash"] = None
+    assert main.smart_cut_plan(clip(probes["path"]), CANVAS, 30.0) is None
+
+
+def test_nothing_is_encoded_for_clips_rejected_earlier(probes):
+    assert main.smart_cut_plan(clip(probes["path"], hue=30), CANVAS, 30.0) is None
+    probes["stream"]["width"] = 1280
+    assert main.smart_cut_plan(clip(probes["path"]), CANVAS, 30.0) is None
+    assert not [call for call in probes["calls"] if call[0] == "edge"]
+
+
+def test_probes_are_cached_in_memory_and_on_disk(probes, tmp_path, monkeypatch):
+    cache_dir = tmp_path / "probe"
+    cache_dir.mkdir()
+    first = main.smart_cut_plan(clip(probes["path"]), CANVAS, 30.0, str(cache_dir))
+    assert len(probes["calls"]) == 3
+    assert main.smart_cut_plan(clip(probes["path"]), CANVAS, 30.0, str(cache_dir)) == first
+    assert len(probes["calls"]) == 3
+    # A fresh process reads the entries written beside the probe summary.
+    monkeypatch.setattr(main, "_probe_memo", {})
+    assert main.smart_cut_plan(clip(probes["path"]), CANVAS, 30.0, str(cache_dir)) == first
+    assert len(probes["calls"]) == 3
+    key = main.probe_key(probes["path"])
+    kinds = sorted(p.name[len(key) + 1 :] for p in cache_dir.iterdir() if p.name.startswith(key))
+    assert len(kinds) == 3
+    assert kinds[0].startswith("edge-")
+    assert kinds[1:] == ["keyframes-0.300-8.300.json", "stream.json"]
+
+
+def test_edge_check_depends_on_the_encoder_settings(probes, tmp_path):
+    cache_dir = tmp_path / "probe"
+    cache_dir.mkdir()
+    main.smart_cut_plan(clip(probes["path"]), CANVAS, 30.0, str(cache_dir))
+    main.smart_cut_plan(clip(probes["path"]), CANVAS, 30.0, str(cache_dir), dict(main.DEFAULT_ENCODE, threads=2))
+    assert len([call for call in probes["calls"] if call[0] == "edge"]) == 1
+    main.smart_cut_plan(clip(probes["path"]), CANVAS, 30.0, str(cache_dir), dict(main.DEFAULT_ENCODE, crf=18))
+    assert len([call for call in probes["calls"] if call[0] == "edge"]) == 2
+
+
+def decoded_frames(path, *filters):
+    args = [main.ffmpeg_exe(), "-v", "error", "-i", path]
+    if filters:
+        args += ["-vf", ",".join(filters)]
+    args += ["-f", "rawvideo", "-pix_fmt", "yuv420p", "-"]
+    return subprocess.run(args, stdout=subprocess.PIPE, check=True).stdout
+
+
+@pytest.fixture
+def ffmpeg():
+    if not shutil.which(main.ffmpeg_exe()):
+        pytest.skip("ffmpeg is not installed")
+
+
+def test_segment_copies_the_interior_and_encodes_the_edges(ffmpeg, tmp_path):
+    # Lossless edges make the joined segment comparable frame for frame.
+    encode = dict(main.DEFAULT_ENCODE, crf=0)
+    source = str(tmp_path / "src.mp4")
+    code = main.run_ffmpeg(
+        ["-hide_banner", "-y", "-f", "lavfi", "-i", "testsrc2=size=320x180:rate=30", "-t", "4", "-g", "30"]
+        + main.segment_output_args(encode, source),
+        with_progress=False,
+    )
+    assert code == 0
+    work = tmp_path / "work"
+    work.mkdir()
+    out = main.render_smart_cut_segment(
+        str(work), clip(source, trim_start=0.5, duration=2.8), 0, (1.0, 3.0), (320, 180), 30.0, encode
+    )
+    assert sorted(p.name for p in work.iterdir() if p.suffix == ".mp4") == [
+        "clip_0000.mp4",
+        "clip_0000_body.mp4",
+        "clip_0000_head.mp4",
+        "clip_0000_tail.mp4",
+    ]
+    frame = 320 * 180 * 3 // 2
+    got = decoded_frames(out)
+    assert len(got) == 84 * frame
+    assert got == decoded_frames(source, "trim=start_frame=15:end_frame=99")
@@ -0,0 +1,104 @@
+import pytest
+
+import main
+
+np = pytest.importorskip("numpy")
+
+RATE = 8000
+
+
+def analyser_reference(samples, fft_size, smoothing, fps, frame_count):
+    """Straight transcription of the Web Audio AnalyserNode frequency-data steps."""
+    n = fft_size
+    i = np.arange(n)
+    # Blackman window with alpha = 0.16.
+    window = 0.42 - 0.5 * np.cos(2 * np.pi * i / n) + 0.08 * np.cos(4 * np.pi * i / n)
+    tail = max(0, int(round(frame_count * RATE / fps)) - len(samples))
+    padded = np.concatenate([np.zeros(n), samples, np.zeros(tail + n)])
+    prev = np.zeros(n // 2)
+    rows = []
+    for frame in range(frame_count):
+        end = int(round(frame * RATE / fps))
+        block = padded[end:end + n]  # the n samples ending at the frame time
+        mags = np.abs(np.fft.fft(block * window))[: n // 2] / n
+        prev = smoothing * prev + (1 - smoothing) * mags
+        rows.append(prev)
+    return np.array(rows)
+
+
+@pytest.fixture
+def signal():
+    t = np.arange(int(RATE * 1.5)) / RATE
+    tone = 0.6 * np.sin(2 * np.pi * 440 * t) + 0.3 * np.sin(2 * np.pi * 1250 * t) * (t > 0.5)
+    return tone.astype(np.float32)
+
+
+def feed(monkeypatch, samples, chunk):
+    def fake_pcm(path, sample_rate, chunk_samples):
+        assert sample_rate == RATE
+        for start in range(0, len(samples), chunk):
+            yield samples[start:start + chunk]
+
+    monkeypatch.setattr(main, "stream_audio_pcm", fake_pcm)
+
+
+@pytest.mark.parametrize("fft_size, smoothing", [(256, 0.0), (2048, 0.78), (1024, 0.95)])
+def test_matches_analyser_node(monkeypatch, tmp_path, signal, fft_size, smoothing):
+    fps = 30.0
+    # Past the end of the audio, so trailing frames read the silent tail.
+    frame_count = 50
+    feed(monkeypatch, signal, 1000)
+    dest = str(tmp_path / "spectrum.npy")
+    main.compute_spectrum("audio.wav", {"fftSize": fft_size, "smoothing": smoothing}, fps, RATE, frame_count, dest)
+    got = np.load(dest)
+    want = analyser_reference(signal.astype(np.float64), fft_size, smoothing, fps, frame_count)
+    assert got.shape == (frame_count, fft_size // 2)
+    assert got.dtype == np.float32
+    # The renderer works in float32; near-silent bins only agree to its precision.
+    np.testing.assert_allclose(got, want, rtol=1e-4, atol=1e-5)
+
+
+def test_result_does_not_depend_on_decode_chunking(monkeypatch, tmp_path, signal):
+    settings = {"fftSize": 512, "smoothing": 0.5}
+    results = []
+    for chunk in (97, 4096, len(signal)):
+        feed(monkeypatch, signal, chunk)
+        dest = str(tmp_path / f"spectrum_{chunk}.npy")
+        main.compute_spectrum("audio.wav", settings, 24.0, RATE, 40, dest)
+        results.append(np.load(dest))
+    np.testing.assert_allclose(results[0], results[1], rtol=1e-6, atol=1e-9)
+    np.testing.assert_allclose(results[0], results[2], rtol=1e-6, atol=1e-9)
+
+
+def test_tone_peaks_in_its_bin(monkeypatch, tmp_path, signal):
+    feed(monkeypatch, signal, 1000)
+    dest = str(tmp_path / "spectrum.npy")
+    main.compute_spectrum("audio.wav", {"fftSize": 1024, "smoothing": 0.0}, 30.0, RATE, 20, dest)
+    spectrum = np.load(dest)
+    assert int(np.argmax(spectrum[10])) == round(440 * 1024 / RATE)
+
+
+def test_failed_decode_leaves_no_partial_file(monkeypatch, tmp_path):
+    def broken_pcm(path, sample_rate, chunk_samples):
+        yield np.zeros(100, dtype=np.float32)
+        raise RuntimeError("audio decode failed")
+
+    monkeypatch.setattr(main, "stream_audio_pcm", broken_pcm)
+    dest = tmp_path / "spectrum.npy"
+    with pytest.raises(RuntimeError, match="audio decode failed"):
+        main.compute_spectrum("audio.wav", {"fftSize": 256, "smoothing": 0.5}, 30.0, RATE, 10, str(dest))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_loaded_arrays_are_capped_least_recently_used_first(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "_analysis_memo", {})
+    monkeypatch.setattr(main, "ANALYSIS_MEMO_MAX", 2)
+    paths = []
+    for n in range(3):
+        paths.append(str(tmp_path / f"a{n}.npy"))
+        np.save(paths[-1], np.full(4, n, dtype=np.float32))
+    first = main.load_analysis_array(paths[0])
+    main.load_analysis_array(paths[1])
+    assert main.load_analysis_array(paths[0]) is first
+    main.load_analysis_array(paths[2])
+    assert list(main._analysis_memo) == [paths[0], paths[2]]
@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    hiddenimports=['numpy'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],